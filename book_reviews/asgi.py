@@ -11,6 +11,13 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from book_reviews.db import log_connection_report
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'book_reviews.settings')
+# Under ASGI, book, review and comment reads use the async views.
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
+# Requests run in many threads, so connections are not kept open (see book_reviews/db.py).
+os.environ['DJANGO_ASGI'] = 'True'
 
 application = get_asgi_application()
+log_connection_report()
@@ -0,0 +1,15 @@
+"""
+URL configuration used when ASYNC_READ_VIEWS is enabled (the default under
+asgi.py): the routes of urls.py, with book, review and comment reads served
+by the async views of books.async_views.
+"""
+from django.urls import include, path
+
+import books.urls
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/v1/', include('books.async_urls'))
+    if getattr(pattern, 'urlconf_name', None) is books.urls else pattern
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,202 @@
+"""
+Several API calls in one round trip: ``POST /api/v1/batch/``.
+
+The body lists sub-requests, each a ``method``, a ``path`` (with an
+optional query string) under the books or users API, and an optional JSON
+``body``::
+
+    {"requests": [
+        {"method": "GET", "path": "/api/v1/books/1/"},
+        {"method": "GET", "path": "/api/v1/books/1/reviews/?page_size=5"}
+    ]}
+
+The batch request is authenticated once and every sub-request runs as the
+same user, straight into its view: no JWT decoding and no middleware per
+sub-request. Each view still checks its own permissions and throttles.
+Consecutive reads run concurrently on up to ``BATCH_CONCURRENCY`` worker
+threads. A write runs on the request's thread once the reads before it are
+done, so later sub-requests see its effect. The response holds one
+``{"status", "headers", "body"}`` per sub-request, in order.
+"""
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import serializers
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .middleware import RequestStats, current_stats
+
+BATCH_URLCONF = 'book_reviews.batch_urls'
+
+SUBREQUEST_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# Request headers that only apply to the batch request itself.
+BATCH_ONLY_META = (
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_NONE_MATCH',
+    'HTTP_IF_UNMODIFIED_SINCE', 'PATH_INFO', 'QUERY_STRING', 'REQUEST_METHOD', 'wsgi.input',
+)
+
+# Shared by all batches so worker threads are not started per batch. Each
+# sub-request on a worker opens its own database connections and closes them
+# when done: up to BATCH_CONCURRENCY connections per process at a time, on
+# top of the request threads' own.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            # Concurrent first batches would each start a pool otherwise.
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.BATCH_CONCURRENCY, thread_name_prefix='batch')
+    return _executor
+
+
+def shutdown_executor():
+    """Stop the worker threads; the next batch starts a new pool."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=SUBREQUEST_METHODS)
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f"At most {settings.BATCH_MAX_REQUESTS} requests can be batched.")
+        return value
+
+
+def subrequest(request, method, path, body=None):
+    """Return the ``HttpRequest`` of a sub-request, authenticated like ``request``."""
+    url = urlsplit(path)
+    content = b'' if body is None else json.dumps(body).encode()
+    sub = HttpRequest()
+    sub.method = method
+    sub.path = sub.path_info = url.path
+    sub.META = {key: value for key, value in request.META.items() if key not in BATCH_ONLY_META}
+    sub.META.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+    })
+    sub.GET = QueryDict(url.query)
+    sub._stream = io.BytesIO(content)
+    sub._read_started = False
+    # DRF authenticates requests carrying these with the given user and token.
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def run_subrequest(request, method, path, body=None):
+    """Dispatch a sub-request to its view and return its ``{status, headers, body}``."""
+    sub = subrequest(request, method, path, body)
+    try:
+        match = resolve(sub.path_info, urlconf=BATCH_URLCONF)
+    except Resolver404:
+        return {'status': 404, 'headers': {}, 'body': {'detail': 'Not found.'}}
+    sub.resolver_match = match
+    response = match.func(sub, *match.args, **match.kwargs)
+    if response.streaming:
+        response.close()
+        return {'status': 400, 'headers': {}, 'body': {'detail': 'Streaming responses cannot be batched.'}}
+    headers = {name: value for name, value in response.items() if name != 'Content-Type'}
+    if hasattr(response, 'data'):
+        # Left unrendered; the batch response encodes it.
+        content = response.data
+    elif response.get('Content-Type', '').startswith('application/json'):
+        content = json.loads(response.content)
+    else:
+        content = response.content.decode(response.charset) or None
+    return {'status': response.status_code, 'headers': headers, 'body': content}
+
+
+def run_measured_subrequest(*args):
+    """Return the result of ``run_subrequest()`` and its own ``RequestStats``, if measured."""
+    if current_stats.get() is None:
+        return run_subrequest(*args), None
+    # The request's stats would be updated from several threads at once.
+    stats = RequestStats()
+    current_stats.set(stats)
+    return run_subrequest(*args), stats
+
+
+def run_in_worker(context, *args):
+    # Worker threads get no request_started/finished signals and outlive
+    # requests, so a persistent connection (CONN_MAX_AGE) would stay open on
+    # an idle thread; close them all once the sub-request is done.
+    close_old_connections()
+    try:
+        return context.run(run_measured_subrequest, *args)
+    finally:
+        connections.close_all()
+
+
+class BatchView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser]
+    throttle_scope = 'batch'
+
+    def post(self, request, *args, **kwargs):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        subrequests = serializer.validated_data['requests']
+
+        responses = [None] * len(subrequests)
+        reads = []
+        for index, item in enumerate(subrequests):
+            if item['method'] in SAFE_METHODS:
+                reads.append(index)
+                continue
+            self.run_reads(request, subrequests, reads, responses)
+            reads = []
+            responses[index] = run_subrequest(request, item['method'], item['path'], item.get('body'))
+        self.run_reads(request, subrequests, reads, responses)
+        return Response({'responses': responses})
+
+    def run_reads(self, request, subrequests, indexes, responses):
+        if len(indexes) < 2 or settings.BATCH_CONCURRENCY < 2:
+            for index in indexes:
+                item = subrequests[index]
+                responses[index] = run_subrequest(request, item['method'], item['path'])
+            return
+        started = time.perf_counter()
+        futures = {
+            index: get_executor().submit(
+                run_in_worker, copy_context(), request, subrequests[index]['method'], subrequests[index]['path']
+            )
+            for index in indexes
+        }
+        worker_stats = []
+        for index, future in futures.items():
+            responses[index], stats = future.result()
+            if stats is not None:
+                worker_stats.append(stats)
+        if worker_stats:
+            current_stats.get().add_concurrent(worker_stats, time.perf_counter() - started)
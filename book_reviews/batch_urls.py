@@ -0,0 +1,10 @@
+"""
+The routes /api/v1/batch/ sub-requests can reach: the books and users APIs
+of urls.py, served by their sync views.
+"""
+from django.urls import include, path
+
+urlpatterns = [
+    path('api/v1/', include('books.urls')),
+    path('api/v1/', include('users.urls')),
+]
@@ -0,0 +1,101 @@
+"""
+Database connection settings built from the environment, and the report of
+them logged when the WSGI/ASGI application starts.
+"""
+import logging
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger("book_reviews")
+
+
+def env_flag(environ, name, default):
+    return environ.get(name, str(default)) == "True"
+
+
+def database_settings(prefix="DATABASE", environ=os.environ, fallback=None, persistent=True):
+    """Return a ``DATABASES`` entry for PostgreSQL read from ``<prefix>_*`` variables.
+
+    Connection parameters missing from the environment are taken from the
+    ``fallback`` entry, so a replica only has to set what differs from the
+    primary.
+
+    Connections are persistent by default (``<prefix>_CONN_MAX_AGE`` seconds,
+    checked before reuse when ``<prefix>_CONN_HEALTH_CHECKS`` is on). With
+    ``<prefix>_POOL=True`` each process keeps a psycopg 3 connection pool
+    instead; Django requires ``CONN_MAX_AGE = 0`` in that mode.
+
+    ``persistent=False`` (under ASGI) always closes connections at the end of
+    the request: Django keeps one connection per thread, and async requests
+    run in many threads, so persistent connections would leak. Use the pool
+    to reuse connections there.
+    """
+    fallback = fallback or {}
+    settings = {
+        "ENGINE": "django.db.backends.postgresql",
+        **{
+            key: environ.get(f"{prefix}_{key}", fallback.get(key))
+            for key in ("NAME", "USER", "PASSWORD", "HOST", "PORT")
+        },
+        "CONN_MAX_AGE": int(environ.get(f"{prefix}_CONN_MAX_AGE", "60")) if persistent else 0,
+        "CONN_HEALTH_CHECKS": env_flag(environ, f"{prefix}_CONN_HEALTH_CHECKS", True),
+        "OPTIONS": {},
+    }
+    connect_timeout = environ.get(f"{prefix}_CONNECT_TIMEOUT")
+    if connect_timeout:
+        settings["OPTIONS"]["connect_timeout"] = int(connect_timeout)
+    if env_flag(environ, f"{prefix}_POOL", False):
+        settings["CONN_MAX_AGE"] = 0
+        settings["OPTIONS"]["pool"] = {
+            "min_size": int(environ.get(f"{prefix}_POOL_MIN_SIZE", "2")),
+            "max_size": int(environ.get(f"{prefix}_POOL_MAX_SIZE", "10")),
+            "timeout": float(environ.get(f"{prefix}_POOL_TIMEOUT", "30")),
+        }
+    return settings
+
+
+def describe_connections(alias, settings):
+    """Return a one-line description of how ``alias`` connects to its database."""
+    location = settings.get("NAME") or ""
+    if settings.get("HOST"):
+        location = f"{settings['HOST']}:{settings.get('PORT') or 'default'}/{location}"
+    pool = settings.get("OPTIONS", {}).get("pool")
+    if pool:
+        if pool is True:
+            pool = {}
+        mode = "pooled (min {}, max {}, timeout {}s)".format(
+            pool.get("min_size", 4),
+            pool.get("max_size", pool.get("min_size", 4)),
+            pool.get("timeout", 30),
+        )
+    elif settings.get("CONN_MAX_AGE") is None:
+        mode = "persistent (unlimited lifetime)"
+    elif settings.get("CONN_MAX_AGE"):
+        mode = f"persistent (max age {settings['CONN_MAX_AGE']}s)"
+    else:
+        mode = "one connection per request"
+    if not pool and settings.get("CONN_MAX_AGE") != 0:
+        mode += ", health checks " + ("on" if settings.get("CONN_HEALTH_CHECKS") else "off")
+    return f"Database '{alias}' ({settings['ENGINE'].rsplit('.', 1)[-1]} {location}): {mode}"
+
+
+def check_pool_support(databases):
+    for alias, settings in databases.items():
+        if settings.get("OPTIONS", {}).get("pool"):
+            try:
+                import psycopg_pool  # noqa: F401
+            except ImportError:
+                raise ImproperlyConfigured(
+                    f"Database '{alias}' is pooled, which needs psycopg 3 with the pool extra "
+                    "(pip install 'psycopg[binary,pool]')."
+                )
+
+
+def log_connection_report():
+    """Log the connection mode of every database; called once per worker at startup."""
+    from django.conf import settings
+
+    check_pool_support(settings.DATABASES)
+    for alias, database in settings.DATABASES.items():
+        logger.info(describe_connections(alias, database))
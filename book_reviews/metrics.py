@@ -0,0 +1,100 @@
+"""
+Per-view request histograms, kept in memory and exposed in the Prometheus
+text format on /metrics.
+
+Each worker process has its own histograms; scrape every worker, or run
+one worker per metrics target. The endpoint only answers requests with
+``Authorization: Bearer <METRICS_TOKEN>`` and is off when METRICS_TOKEN is
+empty. It does not trust the client address: behind a reverse proxy every
+request comes from the proxy's.
+"""
+import bisect
+import hmac
+import threading
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labels=("view", "method")):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Count per bucket (the last one is +Inf), then the sum.
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0]
+            series[index] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), values):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines)
+
+
+REQUEST_DURATION = Histogram(
+    "bookreviews_request_duration_seconds", "Time spent handling the request.", DURATION_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    "bookreviews_request_db_queries", "Database queries run by the request.", QUERY_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    "bookreviews_request_db_seconds", "Time spent in database queries.", DURATION_BUCKETS
+)
+REQUEST_SERIALIZER_TIME = Histogram(
+    "bookreviews_request_serializer_seconds", "Time spent building representations.", DURATION_BUCKETS
+)
+REQUEST_RENDER_TIME = Histogram(
+    "bookreviews_request_render_seconds", "Time spent rendering the response body.", DURATION_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    "bookreviews_response_size_bytes", "Size of non-streaming response bodies.", SIZE_BUCKETS
+)
+
+HISTOGRAMS = (
+    REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_TIME, REQUEST_SERIALIZER_TIME, REQUEST_RENDER_TIME, RESPONSE_SIZE,
+)
+
+
+def render_metrics():
+    return "\n".join(histogram.expose() for histogram in HISTOGRAMS) + "\n"
+
+
+def metrics_view(request):
+    scheme, _, token = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if not settings.METRICS_TOKEN or scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.encode(), settings.METRICS_TOKEN.encode()
+    ):
+        raise Http404
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
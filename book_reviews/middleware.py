@@ -0,0 +1,211 @@
+"""
+Request instrumentation: where the time of each view goes.
+
+RequestMetricsMiddleware measures every request routed to a view: its
+database queries and their time, the time spent building representations
+(``.data`` of the serializers of views using SerializerTimingMixin, and
+``serializer_timer()`` blocks), the render time and the response size.
+The measurements go to the histograms of book_reviews.metrics and to a
+``Server-Timing`` header. Requests slower than SLOW_REQUEST_SECONDS are
+logged with their slowest queries.
+
+Measurements are collected in a context variable, so queries and
+serializers running in worker threads of async views are counted too.
+Work running on several threads at once, like the concurrent reads of a
+batch, is measured per thread and added with ``add_concurrent()``.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+logger = logging.getLogger("book_reviews.requests")
+
+# Queries listed in the log line of a slow request.
+SLOW_REQUEST_QUERIES = 10
+
+current_stats = ContextVar("current_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "serializer_time", "render_time", "sql")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self.sql = []
+
+    def add_concurrent(self, others, elapsed):
+        """Add the stats of work that ran concurrently for ``elapsed`` seconds.
+
+        Their times overlap, so each total counts for at most ``elapsed``.
+        """
+        for other in others:
+            self.queries += other.queries
+            self.sql.extend(other.sql)
+        self.db_time += min(sum(other.db_time for other in others), elapsed)
+        self.serializer_time += min(sum(other.serializer_time for other in others), elapsed)
+        self.render_time += min(sum(other.render_time for other in others), elapsed)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        stats.queries += 1
+        stats.db_time += duration
+        stats.sql.append((duration, sql, params))
+
+
+def install_query_recorder(connection):
+    # In front, so ``connection.execute_wrapper()`` blocks still pop their own wrapper.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@receiver(connection_created)
+def record_queries_of_new_connection(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+@contextmanager
+def serializer_timer():
+    """Count the time of the block as serializer time of the current request."""
+    stats = current_stats.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.serializer_time += time.perf_counter() - started
+
+
+@lru_cache(maxsize=None)
+def timed_serializer_class(serializer_class):
+    class TimedSerializer(serializer_class):
+        @property
+        def data(self):
+            with serializer_timer():
+                return super().data
+
+    TimedSerializer.__name__ = TimedSerializer.__qualname__ = serializer_class.__name__
+    return TimedSerializer
+
+
+class SerializerTimingMixin:
+    """Count ``.data`` of the view's serializers as serializer time; nested serializers are part of their parent's."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        # With many=True this is the ListSerializer, whose .data covers every item.
+        serializer.__class__ = timed_serializer_class(type(serializer))
+        return serializer
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None or match.func is metrics.metrics_view:
+        return None
+    view_class = getattr(match.func, "view_class", None) or getattr(match.func, "cls", None)
+    return view_class.__name__ if view_class is not None else match.view_name
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def start(self):
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        stats = RequestStats()
+        return stats, current_stats.set(stats), time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the middleware's view hooks.
+        stats = current_stats.get()
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, stats, duration):
+        view = view_name(request)
+        if view is None:
+            return response
+        labels = (view, request.method)
+        metrics.REQUEST_DURATION.observe(duration, *labels)
+        metrics.REQUEST_QUERIES.observe(stats.queries, *labels)
+        metrics.REQUEST_DB_TIME.observe(stats.db_time, *labels)
+        metrics.REQUEST_SERIALIZER_TIME.observe(stats.serializer_time, *labels)
+        metrics.REQUEST_RENDER_TIME.observe(stats.render_time, *labels)
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.observe(len(response.content), *labels)
+
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"',
+            f"serializer;dur={stats.serializer_time * 1000:.2f}",
+            f"render;dur={stats.render_time * 1000:.2f}",
+            f"total;dur={duration * 1000:.2f}",
+        ])
+
+        if settings.SLOW_REQUEST_SECONDS and duration >= settings.SLOW_REQUEST_SECONDS:
+            self.log_slow_request(request, view, stats, duration)
+        return response
+
+    def log_slow_request(self, request, view, stats, duration):
+        slowest = sorted(stats.sql, key=lambda query: query[0], reverse=True)[:SLOW_REQUEST_QUERIES]
+        logger.warning(
+            "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, serializer %.0f ms, render %.0f ms%s",
+            request.method,
+            request.get_full_path(),
+            view,
+            duration * 1000,
+            stats.queries,
+            stats.db_time * 1000,
+            stats.serializer_time * 1000,
+            stats.render_time * 1000,
+            "".join(f"\n  {query_time * 1000:8.1f} ms  {sql}  {params!r}" for query_time, sql, params in slowest),
+        )
@@ -13,8 +13,11 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from datetime import timedelta
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
+from .db import database_settings
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,7 +58,18 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = "users.User"
 
 
+# Per-view query count, DB/serializer/render time and response size, as
+# Server-Timing headers and histograms on /metrics (see book_reviews.middleware).
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "True") == "True"
+# Bearer token of the /metrics scrapers; everyone else gets a 404, and
+# /metrics is off when it is empty. Not an address check, which a reverse
+# proxy on the same host would defeat.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Requests slower than this are logged with their slowest queries; 0 disables the log.
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+
 MIDDLEWARE = [
+    *(["book_reviews.middleware.RequestMetricsMiddleware"] if REQUEST_METRICS else []),
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -65,7 +79,11 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "book_reviews.urls"
+# Serve book, review and comment reads with the async views of
+# books.async_views; enabled by default under asgi.py.
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS") == "True"
+
+ROOT_URLCONF = "book_reviews.asgi_urls" if ASYNC_READ_VIEWS else "book_reviews.urls"
 
 TEMPLATES = [
     {
@@ -88,23 +106,28 @@ WSGI_APPLICATION = "book_reviews.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
-DATABASE_NAME = os.getenv("DATABASE_NAME")
-DATABASE_USER = os.getenv("DATABASE_USER")
-DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
-DATABASE_HOST = os.getenv("DATABASE_HOST")
-DATABASE_PORT = os.getenv("DATABASE_PORT")
-
+# DATABASE_* variables, including connection persistence, health checks
+# and the optional connection pool (see book_reviews/db.py). Under ASGI
+# (set by asgi.py) connections are never persistent; use the pool instead.
+# Batch worker threads add up to BATCH_CONCURRENCY connections per process.
+ASGI = os.getenv("DJANGO_ASGI") == "True"
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": DATABASE_NAME,
-        "USER": DATABASE_USER,
-        "PASSWORD": DATABASE_PASSWORD,
-        "HOST": DATABASE_HOST,
-        "PORT": DATABASE_PORT,
-    }
+    "default": database_settings("DATABASE", persistent=not ASGI),
 }
 
+# Comma-separated aliases of read replicas, each configured by
+# DATABASE_<ALIAS>_* variables defaulting to the primary's. Safe requests
+# of the books API read from them (see books/routing.py).
+DATABASE_REPLICAS = [alias.strip() for alias in os.getenv("DATABASE_REPLICAS", "").split(",") if alias.strip()]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = database_settings(
+        f"DATABASE_{alias.upper()}", fallback=DATABASES["default"], persistent=not ASGI
+    )
+
+DATABASE_ROUTERS = ["books.routing.ReplicaRouter"]
+# How long reads stay on the primary after a write, covering replication lag.
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -145,15 +168,95 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Threads generating cover image variants in the background; 0 processes
+# covers inline once the upload is committed.
+COVER_WORKERS = int(os.getenv("COVER_WORKERS", "2"))
+
+# Multipart uploads are streamed to temporary files and refused as soon as
+# they break these limits; views may set tighter ones (see books.uploads).
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(10 * 1024 * 1024)))
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", str(40_000_000)))
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "1"))
+UPLOAD_IMAGE_FORMATS = ("JPEG", "PNG", "WEBP")
+COVER_UPLOAD_MAX_SIZE = int(os.getenv("COVER_UPLOAD_MAX_SIZE", str(5 * 1024 * 1024)))
+COVER_UPLOAD_MAX_PIXELS = int(os.getenv("COVER_UPLOAD_MAX_PIXELS", str(25_000_000)))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Set CACHE_URL (e.g. redis://localhost:6379/0) to share caches between
+# processes; otherwise every process gets its own size-bounded LRU cache.
+CACHE_URL = os.getenv("CACHE_URL")
+# Response cache versions, ETags, replica read pins and rate limits are only
+# consistent across processes in a shared cache. Per-process caches are for
+# a single process (runserver, tests): LOCAL_CACHES=True, the default with
+# DEBUG, allows them; otherwise CACHE_URL is required.
+LOCAL_CACHES = (os.getenv("LOCAL_CACHES") or str(DEBUG)) == "True"
+if not CACHE_URL and not LOCAL_CACHES:
+    raise ImproperlyConfigured(
+        "Set CACHE_URL to a cache shared by every process (e.g. redis://localhost:6379/0), "
+        "or LOCAL_CACHES=True if the application runs as a single process."
+    )
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", "300"))
+THROTTLE_CACHE_MAX_ENTRIES = int(os.getenv("THROTTLE_CACHE_MAX_ENTRIES", "50000"))
+
+
+def cache_backend(key_prefix, max_entries):
+    if CACHE_URL:
+        return {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+            "KEY_PREFIX": key_prefix,
+        }
+    return {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": key_prefix,
+        "OPTIONS": {"MAX_ENTRIES": max_entries},
+    }
+
+
+CACHES = {
+    "default": cache_backend("default", CACHE_MAX_ENTRIES),
+    "responses": cache_backend("responses", RESPONSE_CACHE_MAX_ENTRIES),
+    # Rate limit counters (see books.throttling), two small keys per client.
+    # Per-process (LOCAL_CACHES) counters multiply the rates by the number
+    # of processes.
+    "throttle": cache_backend("throttle", THROTTLE_CACHE_MAX_ENTRIES),
+}
+
+# API requests are authenticated from the JWT claims without loading the
+# user (see users.authentication); False loads the user on every request.
+JWT_STATELESS_AUTH = os.getenv("JWT_STATELESS_AUTH", "True") == "True"
+# Seconds a user loaded by full_user() stays cached; 0 disables the cache.
+USER_CACHE_TIMEOUT = int(os.getenv("USER_CACHE_TIMEOUT", "60"))
+# Seconds between reloads of the token revocations in each process.
+JWT_REVOCATION_REFRESH_SECONDS = int(os.getenv("JWT_REVOCATION_REFRESH_SECONDS", "30"))
+
+# Book, review and comment lists are built from values() rows and encoded
+# with orjson instead of going through the serializers (see books.rows).
+FAST_LIST_ROWS = os.getenv("FAST_LIST_ROWS", "True") == "True"
+
+# POST /api/v1/batch/ (see book_reviews.batch): sub-requests per batch, and
+# worker threads running consecutive reads concurrently (1 runs them in turn).
+# Each worker thread holds its own database connection, so a process opens
+# up to BATCH_CONCURRENCY connections more than its request threads; count
+# them in the server's max_connections and in DATABASE_POOL_MAX_SIZE.
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
 # Django REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.StatelessJWTAuthentication"
+        if JWT_STATELESS_AUTH
+        else "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -161,21 +264,50 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "books.throttling.AnonRateThrottle",
+        "books.throttling.UserRateThrottle",
+        "books.throttling.ScopedRateThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "100/day", "user": "1000/day"},
+    # "books", "reviews", "comments" and "batch" are the throttle_scope of those views.
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "100/day",
+        "user": "1000/day",
+        "books": "120/min",
+        "reviews": "60/min",
+        "comments": "60/min",
+        "batch": "60/min",
+    },
+    # The browsable API is only rendered, and its templates only loaded, in development.
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'books.renderers.JSONRenderer',
+        *(['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.FormParser',
-        'rest_framework.parsers.MultiPartParser'
+        'books.parsers.BoundedMultiPartParser'
     ],
 }
 
+# Book ranking
+# The Bayesian weighted rating blends every book's reviews with this many
+# virtual reviews of the prior mean.
+BOOK_RATING_PRIOR_MEAN = float(os.getenv("BOOK_RATING_PRIOR_MEAN", "3.0"))
+BOOK_RATING_PRIOR_WEIGHT = int(os.getenv("BOOK_RATING_PRIOR_WEIGHT", "10"))
+TRENDING_WINDOW_DAYS = int(os.getenv("TRENDING_WINDOW_DAYS", "30"))
+TRENDING_HALF_LIFE_DAYS = float(os.getenv("TRENDING_HALF_LIFE_DAYS", "7"))
+# Neighbours kept per book by the refresh_similar_books command.
+SIMILAR_BOOKS_COUNT = int(os.getenv("SIMILAR_BOOKS_COUNT", "20"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "book_reviews": {"handlers": ["console"], "level": os.getenv("LOG_LEVEL", "INFO")},
+    },
+}
+
 # Swagger settings
 SWAGGER_SETTINGS = {
     "SECURITY_DEFINITIONS": {"basic": {"type": "basic"}},
@@ -187,4 +319,6 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.TokenRefreshSerializer",
 }
@@ -0,0 +1,288 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from books.models import Book, Comment, Review
+from users.authentication import StatelessJWTAuthentication, UserAccessToken
+from . import batch, metrics
+from .db import check_pool_support, database_settings, describe_connections
+from .middleware import serializer_timer
+
+
+class DatabaseSettingsTest(SimpleTestCase):
+    environ = {
+        "DATABASE_NAME": "book_reviews",
+        "DATABASE_HOST": "db.internal",
+        "DATABASE_PORT": "5432",
+    }
+
+    def test_connections_are_persistent_and_health_checked_by_default(self):
+        settings = database_settings(environ=self.environ)
+        self.assertEqual(settings["CONN_MAX_AGE"], 60)
+        self.assertTrue(settings["CONN_HEALTH_CHECKS"])
+        self.assertNotIn("pool", settings["OPTIONS"])
+        self.assertEqual(
+            describe_connections("default", settings),
+            "Database 'default' (postgresql db.internal:5432/book_reviews): "
+            "persistent (max age 60s), health checks on",
+        )
+
+    def test_pooled_mode_disables_persistent_connections(self):
+        settings = database_settings(environ={
+            **self.environ,
+            "DATABASE_CONN_MAX_AGE": "600",
+            "DATABASE_POOL": "True",
+            "DATABASE_POOL_MAX_SIZE": "20",
+        })
+        self.assertEqual(settings["CONN_MAX_AGE"], 0)
+        self.assertEqual(settings["OPTIONS"]["pool"], {"min_size": 2, "max_size": 20, "timeout": 30.0})
+        self.assertIn("pooled (min 2, max 20, timeout 30.0s)", describe_connections("default", settings))
+
+    def test_prefix_selects_another_database(self):
+        settings = database_settings("REPLICA", environ={"REPLICA_HOST": "replica", "REPLICA_CONN_MAX_AGE": "0"})
+        self.assertEqual(settings["HOST"], "replica")
+        self.assertEqual(describe_connections("replica", settings).rsplit(": ", 1)[1], "one connection per request")
+
+    def test_replica_defaults_to_primary_parameters(self):
+        primary = database_settings(environ=self.environ)
+        replica = database_settings("DATABASE_REPLICA", environ={"DATABASE_REPLICA_HOST": "replica"}, fallback=primary)
+        self.assertEqual((replica["HOST"], replica["NAME"], replica["PORT"]), ("replica", "book_reviews", "5432"))
+
+    def test_connections_are_not_persistent_under_asgi(self):
+        settings = database_settings(environ={**self.environ, "DATABASE_CONN_MAX_AGE": "600"}, persistent=False)
+        self.assertEqual(settings["CONN_MAX_AGE"], 0)
+        self.assertIn("one connection per request", describe_connections("default", settings))
+        pooled = database_settings(environ={**self.environ, "DATABASE_POOL": "True"}, persistent=False)
+        self.assertIn("pool", pooled["OPTIONS"])
+
+    def test_pooled_mode_requires_psycopg_pool(self):
+        with mock.patch.dict(sys.modules, {"psycopg_pool": None}):
+            with self.assertRaises(ImproperlyConfigured):
+                check_pool_support({"default": {"OPTIONS": {"pool": True}}})
+        check_pool_support({"default": {"OPTIONS": {}}})
+
+
+class SharedCacheSettingsTest(SimpleTestCase):
+    def import_settings(self, **environ):
+        environ = {
+            **os.environ, "SECRET_KEY": "test", "ALLOWED_HOSTS": "localhost", "DEBUG": "False",
+            "CACHE_URL": "", "LOCAL_CACHES": "", **environ,
+        }
+        return subprocess.run(
+            [sys.executable, "-c", "import book_reviews.settings"], env=environ, capture_output=True, text=True
+        )
+
+    def test_per_process_caches_must_be_allowed(self):
+        result = self.import_settings()
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("ImproperlyConfigured: Set CACHE_URL", result.stderr)
+
+    def test_shared_or_allowed_local_caches(self):
+        for environ in ({"CACHE_URL": "redis://localhost:6379/0"}, {"LOCAL_CACHES": "True"}, {"DEBUG": "True"}):
+            with self.subTest(**environ):
+                self.assertEqual(self.import_settings(**environ).returncode, 0)
+
+
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="reader", password="pass", email="r@example.com")
+        Book.objects.create(title="Dune", description="Spice.", author="Herbert", publisher=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("book-list"))
+        timings = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        self.assertEqual(list(timings), ["db", "serializer", "render", "total"])
+        self.assertRegex(timings["db"], r'^dur=\d+\.\d\d;desc="[1-9]\d* queries"$')
+
+    def test_serializer_time_of_views(self):
+        book = Book.objects.get()
+        with mock.patch("book_reviews.middleware.serializer_timer", wraps=serializer_timer) as timer:
+            self.client.get(reverse("book-detail", args=[book.pk]))
+        timer.assert_called_once_with()
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_histograms_are_exposed_per_view(self):
+        self.client.get(reverse("book-list"))
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+        body = response.content.decode()
+        self.assertIn("# TYPE bookreviews_request_db_queries histogram", body)
+        self.assertRegex(
+            body, r'bookreviews_response_size_bytes_count\{view="BookListCreateView",method="GET"\} [1-9]'
+        )
+        self.assertIn('bookreviews_request_duration_seconds_bucket{view="BookListCreateView",method="GET",le="+Inf"}', body)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_metrics_endpoint_requires_the_token(self):
+        # Local addresses are not trusted: they may be a reverse proxy's.
+        for authorization in ("", "Bearer wrong", "Basic scrape-secret"):
+            with self.subTest(authorization=authorization):
+                response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION=authorization)
+                self.assertEqual(response.status_code, 404)
+
+    def test_metrics_endpoint_is_off_without_a_token(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SLOW_REQUEST_SECONDS=1e-9)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs("book_reviews.requests", "WARNING") as logs:
+            self.client.get(reverse("book-list"))
+        self.assertIn("Slow request GET /api/v1/books/ (BookListCreateView)", logs.output[0])
+        self.assertIn('FROM "books_book"', logs.output[0])
+
+
+class HistogramTest(SimpleTestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", (0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value, "View", "GET")
+        self.assertEqual(histogram.expose().splitlines()[2:], [
+            'test_seconds_bucket{view="View",method="GET",le="0.1"} 1',
+            'test_seconds_bucket{view="View",method="GET",le="1"} 3',
+            'test_seconds_bucket{view="View",method="GET",le="+Inf"} 4',
+            'test_seconds_sum{view="View",method="GET"} 6.05',
+            'test_seconds_count{view="View",method="GET"} 4',
+        ])
+
+
+class BatchTestMixin:
+    def setUp(self):
+        User = get_user_model()
+        self.publisher = User.objects.create_user(username="publisher", password="pass", email="p@example.com")
+        self.reader = User.objects.create_user(username="reader", password="pass", email="r@example.com")
+        self.book = Book.objects.create(title="Dune", description="Spice.", author="Herbert", publisher=self.publisher)
+        Comment.objects.create(book=self.book, user=self.reader, content="Nice")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {UserAccessToken.for_user(self.reader)}")
+
+    def batch(self, *requests):
+        """Post ``(method, path)`` or ``(method, path, body)`` sub-requests."""
+        requests = [dict(zip(("method", "path", "body"), request)) for request in requests]
+        return self.client.post(reverse("batch"), {"requests": requests}, format="json")
+
+    def book_page(self):
+        return [
+            reverse("book-detail", args=[self.book.pk]),
+            reverse("book-reviews", args=[self.book.pk]) + "?expand=user",
+            reverse("book-comments", args=[self.book.pk]),
+            reverse("users:user_detail"),
+        ]
+
+    def assertMatchesSeparateRequests(self, paths):
+        response = self.batch(*(("GET", path) for path in paths))
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)["responses"]
+        for path, result in zip(paths, results):
+            caches["responses"].clear()
+            expected = self.client.get(path)
+            self.assertEqual(result["status"], expected.status_code, path)
+            self.assertEqual(result["body"], expected.json(), path)
+            self.assertEqual(result["headers"].get("ETag"), expected.get("ETag"), path)
+
+
+@override_settings(BATCH_CONCURRENCY=1)
+class BatchViewTest(BatchTestMixin, TestCase):
+    def test_reads_match_separate_requests(self):
+        self.assertMatchesSeparateRequests(self.book_page())
+
+    def test_token_is_decoded_once(self):
+        authenticate = StatelessJWTAuthentication.authenticate
+        with mock.patch.object(StatelessJWTAuthentication, "authenticate", autospec=True) as patched:
+            patched.side_effect = authenticate
+            response = self.batch(*(("GET", path) for path in self.book_page()))
+        self.assertEqual([r["status"] for r in response.data["responses"]], [200] * 4)
+        self.assertEqual(patched.call_count, 1)
+
+    def test_later_requests_see_earlier_writes(self):
+        reviews = reverse("book-reviews", args=[self.book.pk])
+        response = self.batch(
+            ("POST", reviews, {"rating": 5, "content": "Great"}),
+            ("GET", reviews),
+            ("GET", reverse("book-detail", args=[self.book.pk])),
+        )
+        created, listing, book = response.data["responses"]
+        self.assertEqual(created["status"], 201)
+        self.assertEqual([review["content"] for review in listing["body"]["results"]], ["Great"])
+        self.assertEqual(book["body"]["review_count"], 1)
+        self.assertEqual(Review.objects.count(), 1)
+
+    def test_only_api_routes_can_be_batched(self):
+        response = self.batch(("GET", "/admin/"), ("GET", reverse("batch")), ("GET", reverse("metrics")))
+        self.assertEqual([r["status"] for r in response.data["responses"]], [404, 404, 404])
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_invalid_batches_are_rejected(self):
+        path = reverse("book-detail", args=[self.book.pk])
+        self.assertEqual(self.batch(("GET", path), ("GET", path), ("GET", path)).status_code, 400)
+        self.assertEqual(self.batch(("TRACE", path)).status_code, 400)
+        self.assertEqual(self.client.post(reverse("batch"), {"requests": []}, format="json").status_code, 400)
+        self.client.credentials()
+        self.assertEqual(self.batch(("GET", path)).status_code, 401)
+
+
+@override_settings(BATCH_CONCURRENCY=4)
+class ConcurrentBatchTest(BatchTestMixin, TransactionTestCase):
+    def tearDown(self):
+        batch.shutdown_executor()
+        super().tearDown()
+
+    def test_concurrent_reads_match_separate_requests(self):
+        self.assertMatchesSeparateRequests(self.book_page() * 2)
+
+    def test_concurrent_reads_count_every_query(self):
+        def timed_batch():
+            caches["responses"].clear()
+            response = self.batch(*(("GET", path) for path in self.book_page() * 2))
+            timings = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+            queries = int(timings["db"].split('desc="')[1].split()[0])
+            total = float(timings["total"].split("=")[1])
+            db_time = float(timings["db"].split(";")[0].split("=")[1])
+            return queries, db_time, total
+
+        # Leaves only the queries of the views themselves to compare.
+        timed_batch()
+        queries, db_time, total = timed_batch()
+        with override_settings(BATCH_CONCURRENCY=1):
+            sequential_queries, _, _ = timed_batch()
+        self.assertEqual(queries, sequential_queries)
+        # Overlapping database time of the workers counts once.
+        self.assertLessEqual(db_time, total)
+
+
+class BatchExecutorTest(SimpleTestCase):
+    def test_concurrent_first_batches_share_one_executor(self):
+        barrier = threading.Barrier(4)
+        executors = []
+
+        def slow_executor(**kwargs):
+            time.sleep(0.01)
+            return object()
+
+        with mock.patch.object(batch, "_executor", None), \
+                mock.patch.object(batch, "ThreadPoolExecutor", side_effect=slow_executor) as executor_class:
+            def first_batch():
+                barrier.wait()
+                executors.append(batch.get_executor())
+
+            threads = [threading.Thread(target=first_batch) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        executor_class.assert_called_once()
+        self.assertEqual(len(set(map(id, executors))), 1)
@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from book_reviews.db import log_connection_report
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'book_reviews.settings')
 
 application = get_wsgi_application()
+log_connection_report()
@@ -0,0 +1,4 @@
+from .async_views import with_async_reads
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = with_async_reads(sync_urlpatterns)
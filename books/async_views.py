@@ -0,0 +1,182 @@
+"""Async read views for the books API, served by ``asgi.py``.
+
+Each view subclasses its sync counterpart from ``books.views`` and keeps
+its queryset, serializer, pagination, permissions and caching, but loads
+rows with the async ORM so an ASGI worker can keep many requests waiting
+on the database at once. Authentication, permission and throttle checks
+still run in a worker thread because the DRF hooks are synchronous.
+
+Only GET and HEAD are async; ``with_async_reads()`` routes the other
+methods of a URL to the original sync view.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import Http404
+from django.urls import URLPattern
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+from .caching import VersionedCacheMixin
+from .rows import RowListMixin
+from .views import (
+    IdListMixin,
+    BookListCreateView,
+    BookDetailView,
+    ReviewListCreateView,
+    ReviewDetailView,
+    CommentListCreateView,
+    CommentDetailView,
+)
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+class AsyncReadMixin:
+    """Turn a DRF generic view into an async, read-only view.
+
+    Mixed into a view that also uses ``ConditionalGetMixin``; responses
+    are cached when the view uses ``VersionedCacheMixin`` as well.
+    """
+    http_method_names = ['get', 'head']
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Mirrors APIView.dispatch() with the handler awaited.
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def get(self, request, *args, **kwargs):
+        # Scope versions live in the cache, which may be a network round trip.
+        await sync_to_async(self.get_scope_states)()
+        response = self.get_not_modified_response(request)
+        if response is not None:
+            return self.set_validators(response)
+
+        cached = isinstance(self, VersionedCacheMixin)
+        if cached:
+            response = await sync_to_async(self.get_cached_response)(request)
+        if response is None:
+            response = await self.aget_response(request, *args, **kwargs)
+            if cached:
+                response = await sync_to_async(self.cache_response)(request, response)
+        if response.status_code != 200:
+            return response
+        return self.set_validators(response)
+
+    async def aget_response(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def get_representation_name(self):
+        # Same representation as the sync view, so ETags and cached
+        # responses are shared between WSGI and ASGI workers.
+        sync_view = next(cls for cls in type(self).__mro__ if not issubclass(cls, AsyncReadMixin))
+        return sync_view.__name__
+
+
+class AsyncListMixin(AsyncReadMixin):
+    async def aget_response(self, request, *args, **kwargs):
+        ids = self.get_requested_ids() if isinstance(self, IdListMixin) else None
+        if ids is not None:
+            queryset = self.get_ids_queryset(ids)
+            return self.get_ids_response(ids, [item async for item in queryset] if ids else [])
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.get_list_rows() if isinstance(self, RowListMixin) else None
+        if rows is not None:
+            queryset = rows.values(queryset)
+            def represent(objects):
+                return self.build_rows(rows, objects)
+        else:
+            def represent(objects):
+                return self.get_serializer(objects, many=True).data
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            if page is not None:
+                return self.get_paginated_response(represent(page))
+        return Response(represent([obj async for obj in queryset]))
+
+
+class AsyncRetrieveMixin(AsyncReadMixin):
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        # The object permissions of these views never query for safe methods.
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def aget_response(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+
+class AsyncBookListView(AsyncListMixin, BookListCreateView):
+    pass
+
+
+class AsyncBookDetailView(AsyncRetrieveMixin, BookDetailView):
+    pass
+
+
+class AsyncReviewListView(AsyncListMixin, ReviewListCreateView):
+    pass
+
+
+class AsyncReviewDetailView(AsyncRetrieveMixin, ReviewDetailView):
+    pass
+
+
+class AsyncCommentListView(AsyncListMixin, CommentListCreateView):
+    pass
+
+
+class AsyncCommentDetailView(AsyncRetrieveMixin, CommentDetailView):
+    pass
+
+
+ASYNC_READ_VIEWS = {
+    BookListCreateView: AsyncBookListView,
+    BookDetailView: AsyncBookDetailView,
+    ReviewListCreateView: AsyncReviewListView,
+    ReviewDetailView: AsyncReviewDetailView,
+    CommentListCreateView: AsyncCommentListView,
+    CommentDetailView: AsyncCommentDetailView,
+}
+
+
+def read_write_view(read_view, write_view):
+    """Serve GET/HEAD with the async ``read_view`` and everything else with ``write_view``."""
+    write_view = sync_to_async(write_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read_view(request, *args, **kwargs)
+        return await write_view(request, *args, **kwargs)
+
+    return csrf_exempt(view)
+
+
+def with_async_reads(urlpatterns):
+    """Return ``urlpatterns`` with the views of ``ASYNC_READ_VIEWS`` serving reads async."""
+    patterns = []
+    for pattern in urlpatterns:
+        view_class = getattr(pattern.callback, 'cls', None) if isinstance(pattern, URLPattern) else None
+        if view_class in ASYNC_READ_VIEWS:
+            view = read_write_view(ASYNC_READ_VIEWS[view_class].as_view(), pattern.callback)
+            # Lets schema generators introspect the route as the sync view.
+            view.cls = view_class
+            view.initkwargs = pattern.callback.initkwargs
+            pattern = URLPattern(pattern.pattern, view, pattern.default_args, pattern.name)
+        patterns.append(pattern)
+    return patterns
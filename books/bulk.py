@@ -0,0 +1,256 @@
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import BOOK_LIST_SCOPE, book_scope, bump_versions
+from .counters import rebuild_book_counters
+from .models import Book, Review, Comment
+from .serializers import BookSerializer, ReviewSerializer, CommentSerializer
+
+BULK_CHUNK_SIZE = 500
+
+
+def iter_chunks(items, size):
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def item_result(index, status, pk=None, errors=None):
+    result = {'index': index, 'status': status}
+    if pk is not None:
+        result['id'] = pk
+    if errors is not None:
+        result['errors'] = errors
+    return result
+
+
+class BulkWriter:
+    """Validate and write a stream of items in chunks.
+
+    Items with an ``id`` update an existing row the user owns, other items
+    create a new one. Each chunk costs a fixed number of queries: one to load
+    the rows being updated, the set-based checks of ``check_conflicts()``, a
+    ``bulk_create()`` and a ``bulk_update()``. Every chunk is written in its
+    own transaction. ``write()`` returns one result per item, in input order.
+    """
+    model = None
+    serializer_class = None
+    update_fields = ()
+
+    def __init__(self, user, context=None):
+        self.user = user
+        self.context = context or {}
+
+    def get_update_queryset(self):
+        raise NotImplementedError
+
+    def get_create_kwargs(self, item):
+        return {}
+
+    def clean_item(self, item, creating):
+        """Return field errors for parts of ``item`` the serializer does not validate."""
+        return None
+
+    def check_conflicts(self, pending):
+        """Return ``{index: (status, errors)}`` for pending items that must not be written."""
+        return {}
+
+    def after_write(self, created, updated):
+        pass
+
+    def write(self, items, chunk_size=BULK_CHUNK_SIZE):
+        results = []
+        start = 0
+        for chunk in iter_chunks(items, chunk_size):
+            results.extend(self.write_chunk(list(enumerate(chunk, start))))
+            start += len(chunk)
+        return results
+
+    def write_chunk(self, chunk):
+        results = {}
+        pending = []
+        update_ids = {}
+        for index, item in chunk:
+            if not isinstance(item, dict):
+                results[index] = item_result(index, 'invalid', errors={'non_field_errors': ['Expected an object.']})
+            elif item.get('id') is not None:
+                try:
+                    update_ids[index] = int(item['id'])
+                except (TypeError, ValueError):
+                    results[index] = item_result(index, 'invalid', errors={'id': ['A valid integer is required.']})
+
+        existing = self.get_update_queryset().in_bulk(set(update_ids.values())) if update_ids else {}
+        for index, item in chunk:
+            if index in results:
+                continue
+            if index in update_ids:
+                instance = existing.get(update_ids[index])
+                if instance is None:
+                    results[index] = item_result(index, 'not_found', pk=update_ids[index])
+                    continue
+                serializer = self.serializer_class(instance, data=item, partial=True, context=self.context)
+            else:
+                serializer = self.serializer_class(data=item, context=self.context)
+            errors = dict(serializer.errors) if not serializer.is_valid() else {}
+            errors.update(self.clean_item(item, creating=serializer.instance is None) or {})
+            if errors:
+                results[index] = item_result(index, 'invalid', errors=errors)
+                continue
+            pending.append((index, item, serializer))
+
+        for index, (status, errors) in self.check_conflicts(pending).items():
+            results[index] = item_result(index, status, errors=errors)
+
+        created, updated = [], []
+        now = timezone.now()
+        for index, item, serializer in pending:
+            if index in results:
+                continue
+            if serializer.instance is None:
+                created.append((index, self.model(**serializer.validated_data, **self.get_create_kwargs(item))))
+            else:
+                instance = serializer.instance
+                for attr, value in serializer.validated_data.items():
+                    setattr(instance, attr, value)
+                # bulk_update() bypasses save(), so auto_now is not applied.
+                instance.updated_at = now
+                updated.append((index, instance))
+
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create([instance for _, instance in created])
+                if updated:
+                    self.model.objects.bulk_update([instance for _, instance in updated], self.update_fields)
+                self.after_write([instance for _, instance in created], [instance for _, instance in updated])
+        except DatabaseError as exc:
+            for index, _ in created + updated:
+                results[index] = item_result(index, 'error', errors={'non_field_errors': [str(exc)]})
+        else:
+            for index, instance in created:
+                results[index] = item_result(index, 'created', pk=instance.pk)
+            for index, instance in updated:
+                results[index] = item_result(index, 'updated', pk=instance.pk)
+        return [results[index] for index, _ in chunk]
+
+
+class BookBulkWriter(BulkWriter):
+    model = Book
+    serializer_class = BookSerializer
+    update_fields = ('title', 'author', 'description', 'updated_at')
+
+    def get_update_queryset(self):
+        return Book.objects.filter(publisher_id=self.user.id).defer('search_vector')
+
+    def get_create_kwargs(self, item):
+        return {'publisher_id': self.user.id}
+
+    def check_conflicts(self, pending):
+        conflicts = {}
+        keys = {}
+        seen = set()
+        for index, item, serializer in pending:
+            instance = serializer.instance
+            data = serializer.validated_data
+            key = (
+                data.get('title', instance.title if instance else None),
+                data.get('author', instance.author if instance else None),
+            )
+            if key in seen:
+                conflicts[index] = ('duplicate', {'detail': 'A book with this title and author already exists.'})
+            else:
+                keys[index] = key
+                seen.add(key)
+        if not keys:
+            return conflicts
+
+        lookup = reduce(or_, (Q(title=title, author=author) for title, author in seen))
+        taken = {}
+        for pk, title, author in Book.objects.filter(lookup).values_list('id', 'title', 'author'):
+            taken.setdefault((title, author), set()).add(pk)
+        for index, item, serializer in pending:
+            if index not in keys:
+                continue
+            own_pk = serializer.instance.pk if serializer.instance else None
+            if taken.get(keys[index], set()) - {own_pk}:
+                conflicts[index] = ('duplicate', {'detail': 'A book with this title and author already exists.'})
+        return conflicts
+
+    def after_write(self, created, updated):
+        bump_versions(BOOK_LIST_SCOPE, *(book_scope(book.pk) for book in updated))
+
+
+class BookEntryBulkWriter(BulkWriter):
+    """Shared checks for reviews and comments, which belong to a book by ``book`` id."""
+    own_book_message = None
+
+    def get_update_queryset(self):
+        return self.model.objects.filter(user_id=self.user.id)
+
+    def get_create_kwargs(self, item):
+        return {'book_id': int(item['book']), 'user_id': self.user.id}
+
+    def clean_item(self, item, creating):
+        if not creating:
+            return None
+        try:
+            int(item.get('book'))
+        except (TypeError, ValueError):
+            return {'book': ['A valid book id is required.']}
+        return None
+
+    def check_conflicts(self, pending):
+        conflicts = {}
+        book_ids = {int(item['book']) for _, item, serializer in pending if serializer.instance is None}
+        publishers = dict(Book.objects.filter(pk__in=book_ids).values_list('id', 'publisher_id'))
+        for index, item, serializer in pending:
+            if serializer.instance is not None:
+                continue
+            book_id = int(item['book'])
+            if book_id not in publishers:
+                conflicts[index] = ('invalid', {'book': ['Book does not exist.']})
+            elif publishers[book_id] == self.user.id:
+                conflicts[index] = ('invalid', {'detail': self.own_book_message})
+        return conflicts
+
+    def after_write(self, created, updated):
+        book_ids = {entry.book_id for entry in created + updated}
+        if book_ids:
+            rebuild_book_counters(Book.objects.filter(pk__in=book_ids))
+            bump_versions(BOOK_LIST_SCOPE, *(book_scope(book_id) for book_id in book_ids))
+
+
+class ReviewBulkWriter(BookEntryBulkWriter):
+    model = Review
+    serializer_class = ReviewSerializer
+    update_fields = ('rating', 'content', 'updated_at')
+    own_book_message = 'You cannot review your own book.'
+
+    def check_conflicts(self, pending):
+        conflicts = super().check_conflicts(pending)
+        book_ids = {
+            int(item['book']) for index, item, serializer in pending
+            if serializer.instance is None and index not in conflicts
+        }
+        reviewed = set(
+            Review.objects.filter(user_id=self.user.id, book_id__in=book_ids).values_list('book_id', flat=True)
+        )
+        for index, item, serializer in pending:
+            if serializer.instance is not None or index in conflicts:
+                continue
+            book_id = int(item['book'])
+            if book_id in reviewed:
+                conflicts[index] = ('duplicate', {'detail': 'You have already reviewed this book.'})
+            reviewed.add(book_id)
+        return conflicts
+
+
+class CommentBulkWriter(BookEntryBulkWriter):
+    model = Comment
+    serializer_class = CommentSerializer
+    update_fields = ('content', 'updated_at')
+    own_book_message = 'You cannot comment on your own book.'
@@ -0,0 +1,225 @@
+import hashlib
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+VERSION_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_ALIAS = 'responses'
+
+# Bumped by maintenance jobs that rewrite many books at once.
+CATALOG_SCOPE = 'catalog'
+# Bumped by any write that can change a page of the book list.
+BOOK_LIST_SCOPE = 'book-list'
+
+
+def book_scope(book_id):
+    return f'book:{book_id}'
+
+
+def _version_key(scope):
+    return f'books:version:{scope}'
+
+
+def _modified_key(scope):
+    return f'books:modified:{scope}'
+
+
+def get_scope_states(scopes):
+    """Return ``(version, last_modified)`` for each scope, creating missing ones.
+
+    Missing versions start at a random value rather than 1 so that a version
+    evicted from the cache and recreated never matches entries stored under
+    its previous life. A missing modification time is taken to be now.
+    """
+    cache = caches[VERSION_CACHE_ALIAS]
+    keys = {scope: (_version_key(scope), _modified_key(scope)) for scope in scopes}
+    found = cache.get_many([key for pair in keys.values() for key in pair])
+    states = []
+    for scope in scopes:
+        version_key, modified_key = keys[scope]
+        if version_key not in found:
+            cache.add(version_key, random.getrandbits(48), timeout=None)
+            found[version_key] = cache.get(version_key)
+        if modified_key not in found:
+            cache.add(modified_key, time.time(), timeout=None)
+            found[modified_key] = cache.get(modified_key)
+        states.append((found[version_key], found[modified_key]))
+    return states
+
+
+def _bump(scopes):
+    cache = caches[VERSION_CACHE_ALIAS]
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.add(_version_key(scope), random.getrandbits(48), timeout=None)
+    cache.set_many({_modified_key(scope): time.time() for scope in scopes}, timeout=None)
+
+
+def versions_are_shared():
+    """Whether bumped versions are seen by every process, not only this one.
+
+    Only with ``LOCAL_CACHES`` (a single-process deployment) do versions live
+    in a per-process cache; management commands then cannot invalidate the
+    responses cached by the server.
+    """
+    return not isinstance(caches[VERSION_CACHE_ALIAS], LocMemCache)
+
+
+LOCAL_VERSIONS_NOTICE = (
+    "Responses cached by other processes were not invalidated: caches are local to each process "
+    "(set CACHE_URL to share them)."
+)
+
+
+def bump_versions(*scopes):
+    """Invalidate every cached response depending on ``scopes``.
+
+    The versions are bumped right away and once more after the surrounding
+    transaction commits, so a concurrent read that cached the pre-commit
+    state under the first bump is invalidated as well.
+    """
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+class CacheMetrics:
+    """Process-wide hit/miss counters of the response cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+response_cache_metrics = CacheMetrics()
+
+
+class VersionedViewMixin:
+    """Expose the versions of the scopes a view's GET responses depend on.
+
+    ``CATALOG_SCOPE`` is always included; views add their own scopes through
+    ``get_version_scopes()``. The states are read once per request.
+    """
+
+    def get_version_scopes(self):
+        raise NotImplementedError
+
+    def get_scope_states(self):
+        if getattr(self, '_scope_states', None) is None:
+            scopes = [CATALOG_SCOPE, *self.get_version_scopes()]
+            self._scope_states = dict(zip(scopes, get_scope_states(scopes)))
+        return self._scope_states
+
+    def get_representation_name(self):
+        return type(self).__name__
+
+    def get_representation_fingerprint(self, request):
+        parts = [
+            self.get_representation_name(),
+            request.get_host(),
+            request.path,
+            '&'.join(sorted(f'{key}={value}' for key, value in request.query_params.lists())),
+            *(f'{scope}={version}' for scope, (version, _) in self.get_scope_states().items()),
+        ]
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+class VersionedCacheMixin(VersionedViewMixin):
+    """Serve GET responses from the response cache.
+
+    Entries are keyed on the URL (path and query string) and the versions of
+    ``get_version_scopes()``; any write bumping one of those versions makes
+    the old entries unreachable, so they are never served stale. Responses
+    carry an ``X-Cache: HIT|MISS`` header.
+    """
+    cache_timeout = None
+
+    def get_response_cache_key(self, request):
+        return f'books:response:{self.get_representation_fingerprint(request)}'
+
+    def get_cached_response(self, request):
+        """Return the cached response for ``request``, or ``None`` on a miss."""
+        data = caches[RESPONSE_CACHE_ALIAS].get(self.get_response_cache_key(request))
+        response_cache_metrics.record(hit=data is not None)
+        if data is None:
+            return None
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def cache_response(self, request, response):
+        if response.status_code == 200:
+            timeout = self.cache_timeout or settings.RESPONSE_CACHE_TIMEOUT
+            caches[RESPONSE_CACHE_ALIAS].set(self.get_response_cache_key(request), response.data, timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def get(self, request, *args, **kwargs):
+        response = self.get_cached_response(request)
+        if response is None:
+            response = self.cache_response(request, super().get(request, *args, **kwargs))
+        return response
+
+
+class ConditionalGetMixin(VersionedViewMixin):
+    """Answer GET/HEAD with ``304 Not Modified`` when the client is up to date.
+
+    The strong ETag is derived from the URL, the negotiated format and the
+    scope versions, and ``Last-Modified`` from the time those scopes were
+    last written, so the check needs no database query and the serializer
+    never runs for a 304.
+    """
+
+    def get_etag(self, request):
+        fingerprint = self.get_representation_fingerprint(request)
+        renderer_format = getattr(request, 'accepted_renderer', None)
+        renderer_format = renderer_format.format if renderer_format else ''
+        return quote_etag(hashlib.sha256(f'{fingerprint}|{renderer_format}'.encode()).hexdigest()[:40])
+
+    def get_last_modified(self):
+        return max(modified for _, modified in self.get_scope_states().values())
+
+    def get_not_modified_response(self, request):
+        """Return a 304 response if the client's copy is current, otherwise ``None``."""
+        return get_conditional_response(
+            request, etag=self.get_etag(request), last_modified=int(self.get_last_modified())
+        )
+
+    def set_validators(self, response):
+        response.headers.setdefault('ETag', self.get_etag(self.request))
+        response.headers.setdefault('Last-Modified', http_date(int(self.get_last_modified())))
+        return response
+
+    def get(self, request, *args, **kwargs):
+        response = self.get_not_modified_response(request)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return self.set_validators(response)
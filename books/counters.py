@@ -0,0 +1,113 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .models import Book, Review, Comment, RATING_VALUES
+
+
+def rating_histogram_field(rating):
+    return f'rating_{rating}_count'
+
+
+def rating_aggregates(review_count, rating_sum):
+    """Build the ``average_rating`` and ``weighted_rating`` update expressions.
+
+    ``weighted_rating`` is the Bayesian average: the book's ratings plus
+    ``BOOK_RATING_PRIOR_WEIGHT`` virtual ratings of ``BOOK_RATING_PRIOR_MEAN``,
+    so a single 5-star review does not outrank hundreds of 4-star ones. Both
+    are 0 for books without reviews.
+    """
+    prior_weight = float(settings.BOOK_RATING_PRIOR_WEIGHT)
+    prior_total = settings.BOOK_RATING_PRIOR_MEAN * prior_weight
+    has_reviews = GreaterThan(review_count, 0)
+    total = Cast(rating_sum, FloatField())
+    count = Cast(review_count, FloatField())
+    return {
+        'average_rating': Case(
+            When(has_reviews, then=total / count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        'weighted_rating': Case(
+            When(has_reviews, then=(total + Value(prior_total)) / (count + Value(prior_weight))),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    }
+
+
+def adjust_book_counters(book_id, comments=0, ratings=None):
+    """Apply a relative change to the denormalized counters of one book.
+
+    ``ratings`` maps a rating value to the number of reviews with that rating
+    added (positive) or removed (negative). The counters, the rating
+    histogram and the derived averages are all changed by a single
+    ``UPDATE ... SET x = x + n`` statement, so concurrent writers never
+    overwrite each other's changes.
+    """
+    updates = {}
+    if comments:
+        updates['comment_count'] = F('comment_count') + comments
+    ratings = {rating: delta for rating, delta in (ratings or {}).items() if delta}
+    if ratings:
+        reviews = sum(ratings.values())
+        rating_total = sum(rating * delta for rating, delta in ratings.items())
+        for rating, delta in ratings.items():
+            field = rating_histogram_field(rating)
+            updates[field] = F(field) + delta
+        updates['review_count'] = F('review_count') + reviews
+        updates['rating_sum'] = F('rating_sum') + rating_total
+        # SET expressions read the row as it was before the update, so the
+        # averages are computed from the old values plus the same deltas.
+        updates.update(rating_aggregates(F('review_count') + reviews, F('rating_sum') + rating_total))
+    if updates:
+        # update() skips auto_now; the counters are exported, so incremental
+        # exports must see the book as changed.
+        Book.objects.filter(pk=book_id).update(**updates, updated_at=timezone.now())
+
+
+def rating_change(old=None, new=None):
+    """Return the ``ratings`` argument of ``adjust_book_counters`` for a review change."""
+    change = Counter()
+    if old is not None:
+        change[old] -= 1
+    if new is not None:
+        change[new] += 1
+    return change
+
+
+def _aggregate_subquery(model, aggregate, **filters):
+    subquery = (
+        model.objects.filter(book=OuterRef('pk'), **filters)
+        .order_by()
+        .values('book')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+
+def rebuild_book_counters(queryset=None):
+    """Recompute the counters of ``queryset`` (all books by default) from scratch.
+
+    Returns the number of books updated.
+    """
+    if queryset is None:
+        queryset = Book.objects.all()
+    review_count = _aggregate_subquery(Review, Count('id'))
+    rating_sum = _aggregate_subquery(Review, Sum('rating'))
+    return queryset.update(
+        review_count=review_count,
+        comment_count=_aggregate_subquery(Comment, Count('id')),
+        rating_sum=rating_sum,
+        **{
+            rating_histogram_field(rating): _aggregate_subquery(Review, Count('id'), rating=rating)
+            for rating in RATING_VALUES
+        },
+        **rating_aggregates(review_count, rating_sum),
+        updated_at=timezone.now(),
+    )
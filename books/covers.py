@@ -0,0 +1,161 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+from .caching import BOOK_LIST_SCOPE, book_scope, bump_versions
+from .models import Book
+
+logger = logging.getLogger(__name__)
+
+COVER_VARIANT_DIR = 'book_covers/variants'
+# Variants are fitted inside these boxes, keeping the aspect ratio.
+COVER_SIZES = {
+    'thumbnail': (160, 240),
+    'medium': (480, 720),
+}
+COVER_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def cover_digest(file):
+    """Return the SHA-256 hex digest of ``file``, read in chunks."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def cover_variant_name(digest, size, cover_format):
+    return f'{COVER_VARIANT_DIR}/{digest[:2]}/{digest}/{size}.{cover_format}'
+
+
+def cover_variant_urls(digest):
+    """Return ``{size: {format: url}}`` for the variants of the cover ``digest``."""
+    return {
+        size: {
+            cover_format: default_storage.url(cover_variant_name(digest, size, cover_format))
+            for cover_format in COVER_FORMATS
+        }
+        for size in COVER_SIZES
+    }
+
+
+def absolute_cover_urls(digest, request=None):
+    """Return ``cover_variant_urls()`` as absolute URLs, or ``None`` without a ``digest``."""
+    if not digest:
+        return None
+    urls = cover_variant_urls(digest)
+    if request is not None:
+        urls = {
+            size: {cover_format: request.build_absolute_uri(url) for cover_format, url in formats.items()}
+            for size, formats in urls.items()
+        }
+    return urls
+
+
+def absolute_cover_image_url(name, request=None):
+    """Return the URL of the original upload ``name`` as ``ImageField`` renders it, or ``None``."""
+    if not name:
+        return None
+    url = Book._meta.get_field('cover_image').storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def render_cover_variants(image):
+    """Yield ``(size, format, bytes)`` for every variant of a Pillow ``image``."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten transparent covers onto white.
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    for size, box in COVER_SIZES.items():
+        variant = image.copy()
+        variant.thumbnail(box, Image.Resampling.LANCZOS)
+        for cover_format, (pillow_format, options) in COVER_FORMATS.items():
+            output = io.BytesIO()
+            variant.save(output, pillow_format, **options)
+            yield size, cover_format, output.getvalue()
+
+
+def generate_cover_variants(file, force=False):
+    """Store the variants of the cover in ``file`` and return its digest.
+
+    Variants are keyed on the digest of the original, so a cover uploaded
+    for several books is decoded and stored once, and running this again
+    for the same file does nothing unless ``force`` is set.
+    """
+    digest = cover_digest(file)
+    names = {
+        (size, cover_format): cover_variant_name(digest, size, cover_format)
+        for size in COVER_SIZES for cover_format in COVER_FORMATS
+    }
+    if not force and all(default_storage.exists(name) for name in names.values()):
+        return digest
+    with Image.open(file) as image:
+        for size, cover_format, content in render_cover_variants(image):
+            name = names[size, cover_format]
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(content))
+    return digest
+
+
+def process_book_cover(book_id, cover_name, force=False):
+    """Generate the variants of a book's cover and record its digest on the book.
+
+    The digest is only stored if the book still has the same cover, so a
+    slow job never overwrites the result of a newer upload.
+    """
+    with default_storage.open(cover_name, 'rb') as file:
+        digest = generate_cover_variants(file, force=force)
+    updated = Book.objects.filter(pk=book_id, cover_image=cover_name).update(cover_hash=digest)
+    if updated:
+        bump_versions(BOOK_LIST_SCOPE, book_scope(book_id))
+    return digest
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_cover_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.COVER_WORKERS, thread_name_prefix='book-covers'
+            )
+        return _executor
+
+
+def _run_cover_job(book_id, cover_name):
+    try:
+        process_book_cover(book_id, cover_name)
+    except Exception:
+        logger.exception("Processing the cover %s of book %s failed.", cover_name, book_id)
+    finally:
+        # Worker threads open their own connections; do not leak them.
+        connections.close_all()
+
+
+def schedule_cover_processing(book_id, cover_name):
+    """Process a cover on the worker pool, or inline when ``COVER_WORKERS`` is 0."""
+    if settings.COVER_WORKERS:
+        get_cover_executor().submit(_run_cover_job, book_id, cover_name)
+    else:
+        process_book_cover(book_id, cover_name)
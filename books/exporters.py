@@ -0,0 +1,105 @@
+import csv
+import datetime
+import json
+import zlib
+
+from .models import Book, Review, Comment
+
+EXPORT_CHUNK_SIZE = 2000
+# Rows are joined into blocks of roughly this many characters before being
+# handed to the response or file, instead of writing one row at a time.
+EXPORT_BLOCK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+DATASETS = {
+    'books': (Book, (
+        'id', 'title', 'author', 'description', 'publisher_id',
+        'review_count', 'comment_count', 'rating_sum', 'created_at', 'updated_at',
+    )),
+    'reviews': (Review, ('id', 'book_id', 'user_id', 'rating', 'content', 'created_at', 'updated_at')),
+    'comments': (Comment, ('id', 'book_id', 'user_id', 'content', 'created_at', 'updated_at')),
+}
+
+
+def iter_rows(dataset, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the rows of ``dataset`` as tuples, reading ``chunk_size`` rows at a time.
+
+    ``iterator()`` streams from a server-side cursor on PostgreSQL, so memory
+    use does not depend on the size of the table. ``since`` restricts the
+    export to rows updated after that moment, read through the ``updated_at``
+    indexes. Changes of the exported book counters count as updates; changes
+    of columns that are not exported (covers, rankings) do not. Deleted rows
+    are not in incremental exports: compare the ids with a full export to
+    find them.
+    """
+    model, fields = DATASETS[dataset]
+    queryset = model.objects.order_by('id')
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    datetime_columns = [
+        index for index, name in enumerate(fields)
+        if name in ('created_at', 'updated_at')
+    ]
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        if datetime_columns:
+            row = list(row)
+            for index in datetime_columns:
+                row[index] = row[index].isoformat()
+        yield row
+
+
+def iter_ndjson(dataset, rows):
+    fields = DATASETS[dataset][1]
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class _LineBuffer:
+    def write(self, value):
+        return value
+
+
+def iter_csv(dataset, rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(DATASETS[dataset][1])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_blocks(lines, block_size=EXPORT_BLOCK_SIZE):
+    block = []
+    size = 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= block_size:
+            yield ''.join(block).encode()
+            block = []
+            size = 0
+    if block:
+        yield ''.join(block).encode()
+
+
+def iter_gzip(blocks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export(dataset, export_format='ndjson', compress=False, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Return an iterator of encoded blocks holding the whole ``dataset``."""
+    rows = iter_rows(dataset, since=since, chunk_size=chunk_size)
+    lines = iter_csv(dataset, rows) if export_format == 'csv' else iter_ndjson(dataset, rows)
+    blocks = iter_blocks(lines)
+    return iter_gzip(blocks) if compress else blocks
+
+
+def export_filename(dataset, export_format='ndjson', compress=False, since=None):
+    name = dataset
+    if since is not None:
+        name += f'-since-{since.astimezone(datetime.timezone.utc):%Y%m%dT%H%M%SZ}'
+    return f'{name}.{export_format}' + ('.gz' if compress else '')
@@ -0,0 +1,87 @@
+"""Sparse fieldsets: ``?fields=id,title`` and ``?omit=description``.
+
+On safe requests, the fields of the representation can be limited to a
+comma-separated list (``fields``), and some can be dropped (``omit``). The
+serializer leaves out the other fields, and the views load only the model
+columns the selected fields are rendered from. Serializers map their fields
+to those columns with ``field_columns``. A field missing from the mapping is
+read from the model field of the same name.
+"""
+from functools import lru_cache
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_QUERY_PARAM = 'fields'
+OMIT_QUERY_PARAM = 'omit'
+
+
+@lru_cache(maxsize=None)
+def readable_fields(serializer_class):
+    return tuple(name for name, field in serializer_class().fields.items() if not field.write_only)
+
+
+def _field_names(request, param):
+    return [name for name in request.query_params.get(param, '').split(',') if name]
+
+
+def requested_fields(request, serializer_class):
+    """Return the fields of ``serializer_class`` selected by the request, in serializer order.
+
+    Returns ``None`` when the request selects no sparse fieldset.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    fields = _field_names(request, FIELDS_QUERY_PARAM)
+    omit = _field_names(request, OMIT_QUERY_PARAM)
+    if not fields and not omit:
+        return None
+    available = readable_fields(serializer_class)
+    for param, names in ((FIELDS_QUERY_PARAM, fields), (OMIT_QUERY_PARAM, omit)):
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValidationError({param: [
+                f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}."
+            ]})
+    return [name for name in available if (not fields or name in fields) and name not in omit]
+
+
+def columns_for(serializer_class, fields, always=()):
+    """Return the model columns ``fields`` are rendered from, plus ``always``."""
+    field_columns = getattr(serializer_class, 'field_columns', {})
+    columns = dict.fromkeys(always)
+    for name in fields:
+        columns.update(dict.fromkeys(field_columns.get(name, (name,))))
+    return list(columns)
+
+
+class SparseFieldsetMixin:
+    """Leave the fields not selected by ``?fields=``/``?omit=`` out of the representation."""
+    field_columns = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = requested_fields(self.context.get('request'), type(self))
+        if selected is not None:
+            for name in [name for name, field in fields.items() if not field.write_only and name not in selected]:
+                del fields[name]
+        return fields
+
+
+class SparseFieldsetViewMixin:
+    """Load only the columns of the fields selected by ``?fields=``/``?omit=``."""
+    # Loaded whatever the fields: the key and the position of cursor pagination.
+    always_loaded_columns = ('id', 'created_at')
+
+    def narrow_to_fields(self, queryset):
+        serializer_class = self.get_serializer_class()
+        fields = requested_fields(self.request, serializer_class)
+        if fields is None:
+            return queryset
+        columns = columns_for(serializer_class, fields, self.always_loaded_columns)
+        relations = list(dict.fromkeys(column.rsplit('__', 1)[0] for column in columns if '__' in column))
+        # select_related() without arguments would follow every foreign key.
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns)
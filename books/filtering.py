@@ -0,0 +1,151 @@
+"""Filters and orderings of the list views, served from indexes only.
+
+A list view declares its filters (``filter_params``, one query parameter
+each) and its named orderings (``orderings``, picked with ``?ordering=``).
+A request's filters and ordering are only accepted when one of the model's
+``Meta.indexes`` answers them without a sort or a scan: the equality
+filters (and the view's ``scope_fields``, filtered on by the URL) are the
+leading columns of the index, the ordering follows in the index order (or
+exactly reversed), and range filters only apply to the first column of the
+ordering. Other combinations are rejected with a 400 rather than run as
+table scans.
+"""
+import datetime
+import math
+from functools import lru_cache
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+ORDERING_QUERY_PARAM = 'ordering'
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte')
+
+
+def parse_moment(value):
+    """Parse an ISO 8601 date or date and time; naive values are taken as UTC."""
+    moment = parse_datetime(value)
+    if moment is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(value)
+        moment = datetime.datetime.combine(date, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return moment
+
+
+def parse_number(value):
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(value)
+    return number
+
+
+class FilterParam:
+    """A query parameter filtering ``field`` with ``lookup`` on its value parsed by ``parse``."""
+
+    def __init__(self, field, lookup='exact', parse=str, expected='a value'):
+        self.field = field
+        self.lookup = lookup
+        self.parse = parse
+        self.expected = expected
+
+    @property
+    def is_range(self):
+        return self.lookup in RANGE_LOOKUPS
+
+
+EXPECTED_MOMENT = 'an ISO 8601 date or date and time'
+
+CREATED_AT_FILTER_PARAMS = {
+    'created_after': FilterParam('created_at', 'gte', parse_moment, EXPECTED_MOMENT),
+    'created_before': FilterParam('created_at', 'lt', parse_moment, EXPECTED_MOMENT),
+}
+
+
+def _columns(names):
+    return tuple((name.lstrip('-'), name.startswith('-')) for name in names)
+
+
+def _follows(columns, ordering):
+    """Whether ``columns`` start with ``ordering``, all in the same or all in the opposite direction."""
+    head = columns[:len(ordering)]
+    if [name for name, _ in head] != [name for name, _ in ordering]:
+        return False
+    # An index is read forwards or backwards, never both in one scan.
+    reversed_ = {descending != index_descending for (_, descending), (_, index_descending) in zip(ordering, head)}
+    return len(reversed_) == 1
+
+
+@lru_cache(maxsize=None)
+def indexed_by(model, equal, ranged, ordering):
+    """Return the name of an index of ``model`` answering the query, or ``None``.
+
+    ``equal`` and ``ranged`` are frozensets of the fields filtered by equality
+    and by range, ``ordering`` an ``order_by()`` tuple.
+    """
+    # Columns filtered by equality are constant; they do not order anything.
+    ordering = tuple(column for column in _columns(ordering) if column[0] not in equal)
+    if ranged and (not ordering or ranged != {ordering[0][0]}):
+        return None
+    for index in model._meta.indexes:
+        columns = _columns(index.fields)
+        if {name for name, _ in columns[:len(equal)]} == equal and _follows(columns[len(equal):], ordering):
+            return index.name
+    return None
+
+
+class IndexedFilterMixin:
+    """Filter and order a list view on ``filter_params`` and ``orderings``, when an index allows."""
+    filter_params = {}
+    orderings = {
+        'oldest': ('created_at', 'id'),
+        'newest': ('-created_at', '-id'),
+    }
+    default_ordering = 'oldest'
+    ordering_query_param = ORDERING_QUERY_PARAM
+    # Fields the queryset of the view is always filtered on by equality.
+    scope_fields = ()
+
+    def get_filter_values(self):
+        """Return the parsed value of each filter parameter of the request."""
+        values = {}
+        for param, filter_param in self.filter_params.items():
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                values[param] = filter_param.parse(value)
+            except (TypeError, ValueError):
+                raise ValidationError({param: [f"Expected {filter_param.expected}."]})
+        return values
+
+    def get_ordering_name(self):
+        name = self.request.query_params.get(self.ordering_query_param, self.default_ordering)
+        if name not in self.orderings:
+            raise ValidationError({self.ordering_query_param: [f"Must be one of: {', '.join(self.orderings)}."]})
+        return name
+
+    def get_ordering(self):
+        return self.orderings[self.get_ordering_name()]
+
+    def has_filter_params(self):
+        return any(param in self.request.query_params for param in (*self.filter_params, self.ordering_query_param))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        values = self.get_filter_values()
+        ordering = self.get_ordering()
+        filters = [self.filter_params[param] for param in values]
+        equal = frozenset(self.scope_fields).union(f.field for f in filters if not f.is_range)
+        ranged = frozenset(f.field for f in filters if f.is_range)
+        if indexed_by(queryset.model, equal, ranged, ordering) is None:
+            raise ValidationError({"detail": (
+                f"Filtering on {', '.join(values) or 'nothing'} with "
+                f"{self.ordering_query_param}={self.get_ordering_name()} is not supported."
+            )})
+        for param, value in values.items():
+            filter_param = self.filter_params[param]
+            queryset = queryset.filter(**{f'{filter_param.field}__{filter_param.lookup}': value})
+        return queryset.order_by(*ordering)
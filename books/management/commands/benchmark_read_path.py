@@ -0,0 +1,203 @@
+import asyncio
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.views import APIView
+
+from book_reviews.db import describe_connections
+from books.models import Book, Review, Comment
+from users.authentication import UserAccessToken
+
+DEPLOYMENTS = {
+    'wsgi': 'book_reviews.urls',
+    'asgi': 'book_reviews.asgi_urls',
+}
+
+
+def summarize(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status >= 400),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second of the WSGI (sync views) and ASGI (async views) "
+        "read paths under concurrent load, in-process against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help="User the requests authenticate as.")
+        parser.add_argument('--concurrency', type=int, default=32, help="Requests in flight at once.")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per deployment.")
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help="Path to request, may be repeated (default: review and comment reads of the busiest book).",
+        )
+        parser.add_argument('--host', default='localhost', help="Host header, must be in ALLOWED_HOSTS.")
+        parser.add_argument('--report', help="Also write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}.")
+        self.authorization = f'Bearer {UserAccessToken.for_user(user)}'
+        self.host = options['host']
+        paths = options['paths'] or self.default_paths()
+        workload = [paths[i % len(paths)] for i in range(options['requests'])]
+
+        # Compare runs with and without persistent/pooled connections by p99.
+        databases = [describe_connections(alias, database) for alias, database in settings.DATABASES.items()]
+        for line in databases:
+            self.stdout.write(line)
+
+        results = {}
+        for deployment, urlconf in DEPLOYMENTS.items():
+            # Views copy DEFAULT_THROTTLE_CLASSES when they are defined, so
+            # overriding REST_FRAMEWORK would not reach them.
+            with override_settings(ROOT_URLCONF=urlconf), mock.patch.object(APIView, 'throttle_classes', []):
+                if deployment == 'wsgi':
+                    results[deployment] = self.run_wsgi(workload, options['concurrency'])
+                else:
+                    results[deployment] = asyncio.run(self.run_asgi(workload, options['concurrency']))
+            self.stdout.write(f"{deployment}: " + ', '.join(f'{k}={v}' for k, v in results[deployment].items()))
+
+        report = {
+            'concurrency': options['concurrency'],
+            'databases': databases,
+            'paths': paths,
+            'results': results,
+        }
+        if options['report']:
+            with open(options['report'], 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+        failed = {deployment: result['errors'] for deployment, result in results.items() if result['errors']}
+        if failed:
+            raise CommandError(
+                "Requests failed, throughput is not comparable: "
+                + ', '.join(f'{deployment}={errors} errors' for deployment, errors in failed.items())
+            )
+        speedup = results['asgi']['rps'] / results['wsgi']['rps'] if results['wsgi']['rps'] else 0
+        self.stdout.write(self.style.SUCCESS(f"ASGI/WSGI throughput: {speedup:.2f}x"))
+
+    def default_paths(self):
+        book = Book.objects.annotate(entries=Count('book_reviews')).order_by('-entries').first()
+        if book is None:
+            raise CommandError("There are no books to benchmark with.")
+        review = Review.objects.filter(book=book).first()
+        comment = Comment.objects.filter(book=book).first()
+        paths = [
+            reverse('book-reviews', args=[book.pk]) + '?count=false',
+            reverse('book-comments', args=[book.pk]) + '?count=false',
+        ]
+        if review is not None:
+            paths.append(reverse('review-detail', args=[book.pk, review.pk]))
+        if comment is not None:
+            paths.append(reverse('comment-detail', args=[book.pk, comment.pk]))
+        return paths
+
+    def run_wsgi(self, workload, concurrency):
+        # One thread per in-flight request, like a threaded WSGI server.
+        handler = WSGIHandler()
+
+        def send(path):
+            url = urlsplit(path)
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': url.path,
+                'QUERY_STRING': url.query,
+                'SERVER_NAME': self.host,
+                'SERVER_PORT': '80',
+                'HTTP_HOST': self.host,
+                'HTTP_AUTHORIZATION': self.authorization,
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': io.BytesIO(),
+                'wsgi.errors': io.StringIO(),
+            }
+            status = []
+            started = time.perf_counter()
+            body = handler(environ, lambda code, headers, exc_info=None: status.append(int(code[:3])))
+            for _ in body:
+                pass
+            body.close()
+            return time.perf_counter() - started, status[0]
+
+        def worker(paths):
+            try:
+                return [send(path) for path in paths]
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            timings = [
+                timing
+                for batch in executor.map(worker, [workload[i::concurrency] for i in range(concurrency)])
+                for timing in batch
+            ]
+        elapsed = time.perf_counter() - started
+        return summarize([latency for latency, _ in timings], [status for _, status in timings], elapsed)
+
+    async def run_asgi(self, workload, concurrency):
+        # One event loop, as in a single ASGI worker process.
+        handler = ASGIHandler()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(path):
+            url = urlsplit(path)
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': url.path,
+                'query_string': url.query.encode(),
+                'headers': [(b'host', self.host.encode()), (b'authorization', self.authorization.encode())],
+                'server': (self.host, 80),
+                'client': ('127.0.0.1', 0),
+            }
+            status = []
+            body_sent = False
+
+            async def receive():
+                nonlocal body_sent
+                if body_sent:
+                    # The client stays connected; Django cancels this wait once it has responded.
+                    await asyncio.Event().wait()
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def respond(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(scope, receive, respond)
+                return time.perf_counter() - started, status[0]
+
+        started = time.perf_counter()
+        timings = await asyncio.gather(*(send(path) for path in workload))
+        elapsed = time.perf_counter() - started
+        return summarize([latency for latency, _ in timings], [status for _, status in timings], elapsed)
@@ -0,0 +1,69 @@
+import datetime
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from books.exporters import DATASETS, EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export, export_filename
+
+
+class Command(BaseCommand):
+    help = "Dump books, reviews and comments as NDJSON or CSV with constant memory use."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'datasets', nargs='*',
+            help=f"Datasets to export, among {', '.join(DATASETS)} (default: all of them).",
+        )
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help="Compress the output with gzip.")
+        parser.add_argument(
+            '--since',
+            help=(
+                "Only export rows updated after this ISO 8601 date and time (incremental dump). "
+                "Deleted rows are not listed; a full export gives the current set of ids."
+            ),
+        )
+        parser.add_argument(
+            '--output-dir',
+            help="Write one file per dataset into this directory instead of standard output.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_datetime(options['since'])
+            except ValueError:
+                # Well formed, but out of range (e.g. month 13).
+                since = None
+            if since is None:
+                raise CommandError("--since must be an ISO 8601 date and time.")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, datetime.timezone.utc)
+        datasets = options['datasets'] or list(DATASETS)
+        unknown = set(datasets) - set(DATASETS)
+        if unknown:
+            raise CommandError(f"Unknown dataset(s): {', '.join(sorted(unknown))}.")
+        output_dir = Path(options['output_dir']) if options['output_dir'] else None
+        if output_dir is None and len(datasets) > 1:
+            raise CommandError("Pass --output-dir to export more than one dataset.")
+
+        for dataset in datasets:
+            blocks = export(
+                dataset, options['export_format'], compress=options['gzip'],
+                since=since, chunk_size=options['chunk_size'],
+            )
+            if output_dir is None:
+                for block in blocks:
+                    sys.stdout.buffer.write(block)
+                continue
+            output_dir.mkdir(parents=True, exist_ok=True)
+            path = output_dir / export_filename(dataset, options['export_format'], options['gzip'], since)
+            with open(path, 'wb') as output:
+                for block in blocks:
+                    output.write(block)
+            self.stderr.write(self.style.SUCCESS(f"Exported {dataset} to {path}"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from books.caching import CATALOG_SCOPE, LOCAL_VERSIONS_NOTICE, bump_versions, versions_are_shared
+from books.counters import rebuild_book_counters
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized review, comment and rating counters on books."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'book_ids', nargs='*', type=int,
+            help="Only rebuild the counters of these books (default: all books).",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Book.objects.all()
+        if options['book_ids']:
+            queryset = queryset.filter(pk__in=options['book_ids'])
+        updated = rebuild_book_counters(queryset)
+        bump_versions(CATALOG_SCOPE)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {updated} book(s)."))
+        if not versions_are_shared():
+            self.stdout.write(self.style.WARNING(LOCAL_VERSIONS_NOTICE))
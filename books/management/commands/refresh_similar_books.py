@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from books.caching import BOOK_LIST_SCOPE, LOCAL_VERSIONS_NOTICE, bump_versions, versions_are_shared
+from books.similarity import refresh_similar_books
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the most similar books of every book from review ratings; "
+        "after the first run, only the books affected by reviews changed since the last run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, help="Similar books kept per book.")
+        parser.add_argument('--full', action='store_true', help="Recompute every book.")
+
+    def handle(self, *args, **options):
+        refreshed = refresh_similar_books(k=options['k'], full=options['full'])
+        if refreshed:
+            bump_versions(BOOK_LIST_SCOPE)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed the similar books of {refreshed} book(s)."))
+        if refreshed and not versions_are_shared():
+            self.stdout.write(self.style.WARNING(LOCAL_VERSIONS_NOTICE))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from books.caching import BOOK_LIST_SCOPE, LOCAL_VERSIONS_NOTICE, bump_versions, versions_are_shared
+from books.ranking import refresh_trending_scores
+
+
+class Command(BaseCommand):
+    help = "Recompute the time-decayed trending score of every book."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-days', type=int, help="Only count reviews from this many days back.")
+        parser.add_argument('--half-life-days', type=float, help="Age at which a review counts half as much.")
+
+    def handle(self, *args, **options):
+        scored = refresh_trending_scores(
+            window_days=options['window_days'], half_life_days=options['half_life_days']
+        )
+        bump_versions(BOOK_LIST_SCOPE)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed trending scores, {scored} book(s) trending."))
+        if not versions_are_shared():
+            self.stdout.write(self.style.WARNING(LOCAL_VERSIONS_NOTICE))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from books.covers import process_book_cover
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Generate the resized cover image variants of books."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'book_ids', nargs='*', type=int,
+            help="Only process the covers of these books (default: every book with a cover).",
+        )
+        parser.add_argument(
+            '--missing', action='store_true',
+            help="Skip books whose variants have already been generated.",
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Re-encode variants even if they already exist, e.g. after changing the sizes.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Book.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+        if options['book_ids']:
+            queryset = queryset.filter(pk__in=options['book_ids'])
+        if options['missing']:
+            queryset = queryset.filter(cover_hash='')
+        processed = failed = 0
+        for book_id, cover_name in queryset.order_by('id').values_list('id', 'cover_image').iterator():
+            try:
+                process_book_cover(book_id, cover_name, force=options['force'])
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stderr.write(f"Book {book_id}: cannot process {cover_name}: {exc}")
+            else:
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} cover(s), {failed} failed."))
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:30
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Review = apps.get_model('books', 'Review')
+    Comment = apps.get_model('books', 'Comment')
+
+    def aggregate(model, expression):
+        subquery = (
+            model.objects.filter(book=OuterRef('pk'))
+            .order_by()
+            .values('book')
+            .annotate(value=expression)
+            .values('value')
+        )
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+    Book.objects.update(
+        review_count=aggregate(Review, Count('id')),
+        comment_count=aggregate(Comment, Count('id')),
+        rating_sum=aggregate(Review, Sum('rating')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Comment Count'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Rating Sum'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='review_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Review Count'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
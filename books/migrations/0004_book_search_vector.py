@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:29
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The trigger keeps Book.search_vector in sync on every INSERT and on UPDATEs
+# touching the searchable columns, including bulk_create() and queryset
+# updates that bypass Model.save(). Weights mirror books.search.SEARCH_WEIGHTS.
+CREATE_SEARCH_SQL = """
+CREATE FUNCTION books_book_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.author, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER books_book_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, author, description, search_vector ON books_book
+    FOR EACH ROW EXECUTE FUNCTION books_book_search_vector_update();
+
+UPDATE books_book SET search_vector = NULL;
+
+CREATE INDEX books_book_search_vector_idx ON books_book USING gin (search_vector);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS books_book_search_vector_idx;
+DROP TRIGGER IF EXISTS books_book_search_vector_trigger ON books_book;
+DROP FUNCTION IF EXISTS books_book_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Search Vector'),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
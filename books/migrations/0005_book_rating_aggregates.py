@@ -0,0 +1,95 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:39
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce
+
+# The defaults of BOOK_RATING_PRIOR_MEAN and BOOK_RATING_PRIOR_WEIGHT when
+# this migration was written; rebuild_book_counters recomputes the weighted
+# ratings with the configured prior.
+PRIOR_MEAN = 3.0
+PRIOR_WEIGHT = 10.0
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Review = apps.get_model('books', 'Review')
+
+    def rating_count(rating):
+        subquery = (
+            Review.objects.filter(book=OuterRef('pk'), rating=rating)
+            .order_by()
+            .values('book')
+            .annotate(value=Count('id'))
+            .values('value')
+        )
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+    Book.objects.update(**{f'rating_{rating}_count': rating_count(rating) for rating in range(1, 6)})
+    total = Cast(F('rating_sum'), FloatField())
+    count = Cast(F('review_count'), FloatField())
+    Book.objects.filter(review_count__gt=0).update(
+        average_rating=total / count,
+        weighted_rating=(total + Value(PRIOR_MEAN * PRIOR_WEIGHT)) / (count + Value(PRIOR_WEIGHT)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='average_rating',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Average Rating'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_1_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='1 Star Reviews'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_2_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='2 Star Reviews'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_3_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='3 Star Reviews'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_4_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='4 Star Reviews'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_5_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='5 Star Reviews'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='trending_score',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Trending Score'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='weighted_rating',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Weighted Rating'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-weighted_rating', 'id'], name='books_book_weighted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-trending_score', 'id'], name='books_book_trending_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Cover Hash'),
+        ),
+    ]
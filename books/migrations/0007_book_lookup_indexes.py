@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:14
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_books(apps, schema_editor):
+    # Books created before the API refused duplicates would make the
+    # unique constraint fail with a bare IntegrityError.
+    Book = apps.get_model('books', 'Book')
+    duplicates = (
+        Book.objects.values('title', 'author').annotate(copies=Count('id')).filter(copies__gt=1).order_by()
+    )
+    examples = [f"{row['title']!r} by {row['author']!r}" for row in duplicates[:5]]
+    if examples:
+        raise RuntimeError(
+            "Books must be unique by title and author before migrating; duplicates include "
+            + ", ".join(examples) + ". Rename or delete them and migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_cover_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['publisher', 'created_at', 'id'], name='books_book_publisher_idx'),
+        ),
+        migrations.RunPython(check_duplicate_books, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(fields=('title', 'author'), name='books_book_title_author_uniq'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_book_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSimilarity',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbours', serialize=False, to='books.book', verbose_name='Book')),
+                ('similar_ids', models.JSONField(default=list, verbose_name='Similar Books')),
+                ('scores', models.JSONField(default=list, verbose_name='Scores')),
+                ('review_count', models.IntegerField(default=0, verbose_name='Review Count')),
+                ('computed_at', models.DateTimeField(db_index=True, verbose_name='Computed At')),
+            ],
+        ),
+    ]
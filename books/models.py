@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
@@ -6,25 +7,72 @@ from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
 
+RATING_VALUES = range(1, 6)
+
 
 class Book(models.Model):
     title = models.CharField(max_length=200, verbose_name=_('Title'))
     author = models.CharField(max_length=200, verbose_name=_('Author'))
     description = models.TextField(verbose_name=_('Description'))
     cover_image = models.ImageField(upload_to='book_covers/', null=True, blank=True, verbose_name=_('Cover Image'))
+    # SHA-256 of the cover, set once its resized variants exist (see books.covers).
+    cover_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name=_('Cover Hash'))
     publisher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='published_books', verbose_name=_('Publisher'))
+    review_count = models.IntegerField(default=0, editable=False, verbose_name=_('Review Count'))
+    comment_count = models.IntegerField(default=0, editable=False, verbose_name=_('Comment Count'))
+    rating_sum = models.IntegerField(default=0, editable=False, verbose_name=_('Rating Sum'))
+    rating_1_count = models.IntegerField(default=0, editable=False, verbose_name=_('1 Star Reviews'))
+    rating_2_count = models.IntegerField(default=0, editable=False, verbose_name=_('2 Star Reviews'))
+    rating_3_count = models.IntegerField(default=0, editable=False, verbose_name=_('3 Star Reviews'))
+    rating_4_count = models.IntegerField(default=0, editable=False, verbose_name=_('4 Star Reviews'))
+    rating_5_count = models.IntegerField(default=0, editable=False, verbose_name=_('5 Star Reviews'))
+    average_rating = models.FloatField(default=0.0, editable=False, verbose_name=_('Average Rating'))
+    weighted_rating = models.FloatField(default=0.0, editable=False, verbose_name=_('Weighted Rating'))
+    # Refreshed periodically by the refresh_trending_books command.
+    trending_score = models.FloatField(default=0.0, editable=False, verbose_name=_('Trending Score'))
+    # Maintained by a database trigger on PostgreSQL (see migration 0004),
+    # always NULL on other backends.
+    search_vector = SearchVectorField(null=True, editable=False, verbose_name=_('Search Vector'))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
+    class Meta:
+        constraints = [
+            # Also the index of the duplicate checks on (title, author).
+            models.UniqueConstraint(fields=['title', 'author'], name='books_book_title_author_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='books_book_created_id_idx'),
+            models.Index(fields=['publisher', 'created_at', 'id'], name='books_book_publisher_idx'),
+            models.Index(fields=['author', 'created_at', 'id'], name='books_book_author_idx'),
+            models.Index(fields=['-average_rating', 'id'], name='books_book_average_idx'),
+            models.Index(fields=['-weighted_rating', 'id'], name='books_book_weighted_idx'),
+            models.Index(fields=['-trending_score', 'id'], name='books_book_trending_idx'),
+            # Incremental exports (books.exporters).
+            models.Index(fields=['updated_at'], name='books_book_updated_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'cover_image' in field_names:
+            # Lets the cover pipeline tell whether a save replaced the cover.
+            instance._loaded_cover = instance.cover_image.name or ''
+        return instance
+
     def __str__(self):
         return self.title
 
+    @property
+    def rating_histogram(self):
+        return {str(rating): getattr(self, f'rating_{rating}_count') for rating in RATING_VALUES}
+
 
 class Review(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='book_reviews', verbose_name=_('Book'))
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_reviews', verbose_name=_('User'))
     rating = models.IntegerField(
-        validators=[MinValueValidator(1), MaxValueValidator(5)],
+        validators=[MinValueValidator(RATING_VALUES[0]), MaxValueValidator(RATING_VALUES[-1])],
         verbose_name=_('Rating')
     )
     content = models.TextField(verbose_name=_('Content'))
@@ -33,9 +81,24 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('book', 'user')
+        indexes = [
+            models.Index(fields=['book', 'created_at', 'id'], name='books_review_book_created_idx'),
+            models.Index(fields=['book', 'rating', 'created_at', 'id'], name='books_review_book_rating_idx'),
+            models.Index(fields=['updated_at'], name='books_review_updated_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so the counters on Book can be adjusted
+        # by the difference when the review is saved again.
+        instance._loaded_values = {
+            name: getattr(instance, name) for name in ('book_id', 'rating') if name in field_names
+        }
+        return instance
 
     def clean(self):
-        if self.book.publisher == self.user:
+        if self.book.publisher_id == self.user_id:
             raise ValidationError("You cannot review your own book.")
 
     def save(self, *args, **kwargs):
@@ -53,8 +116,14 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['book', 'created_at', 'id'], name='books_comment_book_created_idx'),
+            models.Index(fields=['updated_at'], name='books_comment_updated_idx'),
+        ]
+
     def clean(self):
-        if self.book.publisher == self.user:
+        if self.book.publisher_id == self.user_id:
             raise ValidationError("You cannot comment on your own book.")
 
     def save(self, *args, **kwargs):
@@ -62,4 +131,21 @@ class Comment(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f'Comment by {self.user.username} on {self.book.title}'
\ No newline at end of file
+        return f'Comment by {self.user.username} on {self.book.title}'
+
+
+class BookSimilarity(models.Model):
+    """The books rated most like ``book``, written by the refresh_similar_books command."""
+    book = models.OneToOneField(
+        Book, on_delete=models.CASCADE, primary_key=True, related_name='neighbours', verbose_name=_('Book')
+    )
+    # Most similar first, with the cosine similarity of each.
+    similar_ids = models.JSONField(default=list, verbose_name=_('Similar Books'))
+    scores = models.JSONField(default=list, verbose_name=_('Scores'))
+    # The book's review_count when computed; a different count means reviews
+    # were added or deleted since.
+    review_count = models.IntegerField(default=0, verbose_name=_('Review Count'))
+    computed_at = models.DateTimeField(db_index=True, verbose_name=_('Computed At'))
+
+    def __str__(self):
+        return f'Books similar to {self.book_id}'
@@ -1,19 +1,182 @@
-from rest_framework.pagination import PageNumberPagination
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Page
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
-class BookPagination(PageNumberPagination):
+class CreatedAtCursorPagination(CursorPagination):
+    # Keyset pagination: each page is a ``created_at > <position>`` range scan
+    # over the (created_at, id) indexes, so deep pages cost the same as the
+    # first one and no COUNT(*) is ever run.
+    ordering = ('created_at', 'id')
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class ReviewPagination(PageNumberPagination):
+class OptionalCursorPagination(PageNumberPagination):
+    """Page number pagination with an opt-in cursor mode.
+
+    Passing ``?cursor=`` (empty for the first page) switches to keyset
+    pagination ordered on ``(created_at, id)``, or on the view's
+    ``get_ordering()`` when it leads with ``created_at``. In page number mode
+    ``?count=false`` skips the ``COUNT(*)`` query; the response then has no
+    ``count`` and ``next`` is derived from fetching one extra row. Views whose
+    ordering is not ``(created_at, id)`` set ``allow_cursor = False``.
+    """
+    allow_cursor = True
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_pagination_class = CreatedAtCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        self.counted = True
+        if self.allow_cursor and self.cursor_query_param in request.query_params:
+            self.cursor_paginator = self.get_cursor_paginator(view)
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        if request.query_params.get(self.count_query_param, '').lower() in ('0', 'false'):
+            self.counted = False
+            return self.paginate_queryset_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of ``paginate_queryset()`` using the async ORM.
+
+        Cursor mode reuses DRF's ``CursorPagination`` in a worker thread,
+        the page number modes run their queries on the event loop.
+        """
+        self.cursor_paginator = None
+        self.counted = True
+        if self.allow_cursor and self.cursor_query_param in request.query_params:
+            self.cursor_paginator = self.get_cursor_paginator(view)
+            return await sync_to_async(self.cursor_paginator.paginate_queryset)(queryset, request, view)
+        if request.query_params.get(self.count_query_param, '').lower() in ('0', 'false'):
+            self.counted = False
+            queryset, window = self.get_uncounted_window(queryset, request)
+            if window is None:
+                return None
+            rows = [row async for row in queryset[window]]
+            return self.finish_uncounted_page(rows, request)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property; fill it in without a sync query.
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        bottom = (number - 1) * page_size
+        rows = [row async for row in queryset[bottom:bottom + page_size]]
+        self.page = Page(rows, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return rows
+
+    def get_cursor_paginator(self, view=None):
+        paginator = self.cursor_pagination_class()
+        if hasattr(view, 'get_ordering'):
+            ordering = view.get_ordering()
+            # The cursor holds a position in the first column of the ordering;
+            # only created_at is close enough to unique and always loaded.
+            if ordering[0].lstrip('-') != 'created_at':
+                raise ValidationError({self.cursor_query_param: ["Cursors only page through orderings by date."]})
+            paginator.ordering = ordering
+        paginator.page_size = self.page_size
+        paginator.page_size_query_param = self.page_size_query_param
+        paginator.max_page_size = self.max_page_size
+        paginator.cursor_query_param = self.cursor_query_param
+        return paginator
+
+    def paginate_queryset_without_count(self, queryset, request):
+        queryset, window = self.get_uncounted_window(queryset, request)
+        if window is None:
+            return None
+        return self.finish_uncounted_page(list(queryset[window]), request)
+
+    def get_uncounted_window(self, queryset, request):
+        """Return the ordered queryset and the slice of the page plus one extra row."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return queryset, None
+        page_number = request.query_params.get(self.page_query_param) or 1
+        try:
+            self.page_number = int(page_number)
+            if self.page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='That page number is not a positive integer'
+            ))
+        if not queryset.ordered:
+            queryset = queryset.order_by(*self.cursor_pagination_class.ordering)
+        offset = (self.page_number - 1) * page_size
+        return queryset, slice(offset, offset + page_size + 1)
+
+    def finish_uncounted_page(self, rows, request):
+        page_size = self.get_page_size(request)
+        self.has_next = len(rows) > page_size
+        self.request = request
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        if not self.counted:
+            return Response({
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data,
+            })
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.counted:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.counted:
+            return super().get_previous_link()
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+class BookPagination(OptionalCursorPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ReviewPagination(OptionalCursorPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CommentPagination(OptionalCursorPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class CommentPagination(PageNumberPagination):
+class TopBookPagination(OptionalCursorPagination):
+    # Ranked by score, so the created_at cursor does not apply.
+    allow_cursor = False
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -0,0 +1,48 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, MultiPartParser
+
+from .uploads import BoundedImageUploadHandler, UploadLimits
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline-delimited JSON into a lazy iterator of objects.
+
+    Lines are decoded one at a time as the view consumes them, so a large
+    upload is never held in memory as a whole. Blank lines are ignored.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if stream is None:
+            return iter(())
+        return self.iter_objects(stream, encoding)
+
+    def iter_objects(self, stream, encoding):
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line.decode(encoding))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {line_number} - {exc}')
+
+
+class BoundedMultiPartParser(MultiPartParser):
+    """Multipart parser streaming files through ``BoundedImageUploadHandler``.
+
+    The limits come from the view (see ``UploadLimits``), so each endpoint
+    can accept a different upload size.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context['request']
+        limits = UploadLimits.for_view(parser_context.get('view'))
+        request.upload_handlers = [BoundedImageUploadHandler(request, limits)]
+        return super().parse(stream, media_type, parser_context)
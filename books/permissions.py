@@ -7,7 +7,7 @@ class IsBookPublisherOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         # Write permissions only for the book publisher
-        return obj.publisher == request.user
+        return obj.publisher_id == request.user.pk
 
     def has_permission(self, request, view):
         # Allow read permissions for any request
@@ -21,4 +21,4 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in ['GET', 'HEAD', 'OPTIONS']:
             return True
-        return obj.user == request.user
\ No newline at end of file
+        return obj.user_id == request.user.pk
\ No newline at end of file
@@ -0,0 +1,45 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Book, Review
+
+TRENDING_UPDATE_BATCH_SIZE = 1000
+
+
+def trending_scores(now=None, window_days=None, half_life_days=None):
+    """Return ``{book_id: score}`` for books reviewed within the trending window.
+
+    Every review in the window contributes ``rating / 5`` decayed by its age
+    with the configured half-life, so recent, well-rated activity dominates.
+    """
+    now = now or timezone.now()
+    window_days = window_days or settings.TRENDING_WINDOW_DAYS
+    half_life = timedelta(days=half_life_days or settings.TRENDING_HALF_LIFE_DAYS).total_seconds()
+    reviews = (
+        Review.objects.filter(created_at__gte=now - timedelta(days=window_days))
+        .order_by()
+        .values_list('book_id', 'rating', 'created_at')
+    )
+    scores = defaultdict(float)
+    for book_id, rating, created_at in reviews.iterator(chunk_size=2000):
+        age = max((now - created_at).total_seconds(), 0.0)
+        scores[book_id] += rating / 5 * math.pow(0.5, age / half_life)
+    return scores
+
+
+def refresh_trending_scores(now=None, window_days=None, half_life_days=None):
+    """Store fresh trending scores on every book; returns the number of scored books."""
+    scores = trending_scores(now, window_days, half_life_days)
+    with transaction.atomic():
+        Book.objects.filter(trending_score__gt=0).exclude(pk__in=list(scores)).update(trending_score=0.0)
+        Book.objects.bulk_update(
+            [Book(pk=book_id, trending_score=score) for book_id, score in scores.items()],
+            ['trending_score'],
+            batch_size=TRENDING_UPDATE_BATCH_SIZE,
+        )
+    return len(scores)
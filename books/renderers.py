@@ -0,0 +1,35 @@
+import orjson
+from rest_framework import renderers
+
+from .rows import Rows
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+def is_rows_payload(data):
+    return isinstance(data, Rows) or (isinstance(data, dict) and isinstance(data.get('results'), Rows))
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """DRF's JSON renderer, encoding the list pages of ``books.rows`` with orjson.
+
+    Rows and the pagination envelope around them hold only strings,
+    integers, ``None`` and dicts of those. For such data orjson produces the
+    same bytes as DRF's compact, non-ASCII output, except for U+2028 and
+    U+2029, which DRF escapes for JavaScript.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            is_rows_payload(data)
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        ):
+            return (
+                orjson.dumps(data)
+                .replace(LINE_SEPARATOR, b'\\u2028')
+                .replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+            )
+        return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,82 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+
+from .caching import VERSION_CACHE_ALIAS, VersionedViewMixin
+
+# Database alias the reads of the current request go to; None means the
+# primary. Set by ReplicaReadMixin, read by ReplicaRouter.
+read_alias = ContextVar('read_alias', default=None)
+
+
+def _pin_key(user_id):
+    return f'books:primary-pin:{user_id}'
+
+
+def pin_to_primary(user):
+    """Send ``user``'s reads to the primary for ``REPLICA_STICKY_SECONDS``.
+
+    The pin is kept in the default cache, which the settings require to be
+    shared by every process (``CACHE_URL``) unless the application runs as a
+    single process, so whichever worker serves the user's next read sees it.
+    """
+    if user.is_authenticated and settings.DATABASE_REPLICAS:
+        caches[VERSION_CACHE_ALIAS].set(_pin_key(user.pk), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return user.is_authenticated and caches[VERSION_CACHE_ALIAS].get(_pin_key(user.pk)) is not None
+
+
+class ReplicaRouter:
+    """Route reads to the replica chosen for the current request, everything else to ``default``."""
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """Serve the queries of safe requests from a read replica when that cannot be stale.
+
+    A request stays on the primary if its user wrote within the last
+    ``REPLICA_STICKY_SECONDS`` (read-your-writes), or if one of the view's
+    version scopes changed in that window, so replication lag never leaks
+    into responses or into the response cache. Authentication runs before
+    the choice is made, so any query it makes goes to the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        read_alias.set(None)
+        super().initial(request, *args, **kwargs)
+        if self.can_read_from_replica(request):
+            read_alias.set(random.choice(settings.DATABASE_REPLICAS))
+
+    def can_read_from_replica(self, request):
+        if request.method not in SAFE_METHODS or not settings.DATABASE_REPLICAS:
+            return False
+        if is_pinned_to_primary(request.user):
+            return False
+        if isinstance(self, VersionedViewMixin):
+            last_write = max(modified for _, modified in self.get_scope_states().values())
+            if time.time() - last_write < settings.REPLICA_STICKY_SECONDS:
+                return False
+        return True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        read_alias.set(None)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
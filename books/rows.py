@@ -0,0 +1,200 @@
+"""List pages built from ``values()`` rows instead of the serializers.
+
+Most of the time of a list request goes to the per-field
+``to_representation()`` calls of DRF serializers. With ``FAST_LIST_ROWS``
+on, ``RowListMixin`` loads the page with ``values()`` and a row class maps
+each row straight to the representation the view's serializer would give,
+which ``books.renderers.JSONRenderer`` encodes with orjson. The serializers
+remain the reference: a row class changes along with its serializer, and
+the tests compare both byte for byte.
+"""
+import datetime
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from book_reviews.middleware import serializer_timer
+
+from .covers import absolute_cover_image_url, absolute_cover_urls
+from .fieldsets import columns_for, requested_fields
+from .serializers import BookSerializer, CommentSerializer, ReviewSerializer, expands_user
+
+format_datetime = serializers.DateTimeField().to_representation
+
+
+def format_utc_datetime(value):
+    if value.tzinfo is not datetime.timezone.utc:
+        return format_datetime(value)
+    return value.isoformat()[:-6] + 'Z'
+
+
+def datetime_formatter():
+    """Return ``DateTimeField().to_representation`` for the active time zone.
+
+    Datetimes come from the database in UTC; when the active time zone is
+    UTC too they are formatted without DRF's per-value time zone conversion.
+    """
+    if (
+        settings.USE_TZ
+        and api_settings.DATETIME_FORMAT == ISO_8601
+        and timezone.get_current_timezone_name() == 'UTC'
+    ):
+        return format_utc_datetime
+    return format_datetime
+
+
+class Rows(list):
+    """Representations built by a row class; holds only JSON-native values."""
+
+
+class BookRows:
+    """Rows of ``BookSerializer``.
+
+    With ``fields`` (a sparse fieldset, see books.fieldsets) only those
+    fields are loaded and built; the full representation keeps its unrolled
+    ``build()``.
+    """
+    serializer_class = BookSerializer
+    # ``created_at`` is only loaded for the position of cursor pagination.
+    columns = (
+        'id', 'title', 'description', 'author', 'publisher__username',
+        'review_count', 'comment_count', 'cover_image', 'cover_hash', 'created_at',
+    )
+    always_loaded_columns = ('id', 'created_at')
+
+    def __init__(self, request, fields=None):
+        self.request = request
+        self.fields = fields
+
+    def values(self, queryset):
+        if self.fields is None:
+            return queryset.values(*self.columns)
+        return queryset.values(*columns_for(self.serializer_class, self.fields, self.always_loaded_columns))
+
+    def build(self, rows):
+        if self.fields is not None:
+            return self.build_fields(rows)
+        request = self.request
+        return Rows(
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'description': row['description'],
+                'author': row['author'],
+                # StringRelatedField, and User.__str__() is the username.
+                'publisher': row['publisher__username'],
+                'review_count': row['review_count'],
+                'comment_count': row['comment_count'],
+                'cover_image': absolute_cover_image_url(row['cover_image'], request),
+                'covers': absolute_cover_urls(row['cover_hash'], request),
+            }
+            for row in rows
+        )
+
+    def build_fields(self, rows):
+        getters = self.field_getters()
+        getters = [(name, getters[name]) for name in self.fields]
+        return Rows({name: get(row) for name, get in getters} for row in rows)
+
+    def field_getters(self):
+        request = self.request
+        return {
+            **{name: itemgetter(name) for name in (
+                'id', 'title', 'description', 'author', 'review_count', 'comment_count',
+            )},
+            'publisher': itemgetter('publisher__username'),
+            'cover_image': lambda row: absolute_cover_image_url(row['cover_image'], request),
+            'covers': lambda row: absolute_cover_urls(row['cover_hash'], request),
+        }
+
+
+class CommentRows(BookRows):
+    """Rows of ``CommentSerializer``, with ``?expand=user`` support."""
+    serializer_class = CommentSerializer
+    columns = ('id', 'book__title', 'user__id', 'user__username', 'content', 'created_at', 'updated_at')
+
+    def build(self, rows):
+        if self.fields is not None:
+            return self.build_fields(rows)
+        expand_user = expands_user(self.request)
+        format_datetime = datetime_formatter()
+        return Rows(self.build_row(row, expand_user, format_datetime) for row in rows)
+
+    def build_row(self, row, expand_user, format_datetime):
+        return {
+            'id': row['id'],
+            'book': row['book__title'],
+            'user': (
+                {'id': row['user__id'], 'username': row['user__username']} if expand_user
+                else row['user__username']
+            ),
+            'content': row['content'],
+            'created_at': format_datetime(row['created_at']),
+            'updated_at': format_datetime(row['updated_at']),
+        }
+
+    def field_getters(self):
+        format_datetime = datetime_formatter()
+        if expands_user(self.request):
+            def user(row):
+                return {'id': row['user__id'], 'username': row['user__username']}
+        else:
+            user = itemgetter('user__username')
+        return {
+            'id': itemgetter('id'),
+            'book': itemgetter('book__title'),
+            'user': user,
+            # Only ever selected on reviews.
+            'rating': itemgetter('rating'),
+            'content': itemgetter('content'),
+            'created_at': lambda row: format_datetime(row['created_at']),
+            'updated_at': lambda row: format_datetime(row['updated_at']),
+        }
+
+
+class ReviewRows(CommentRows):
+    """Rows of ``ReviewSerializer``, with ``?expand=user`` support."""
+    serializer_class = ReviewSerializer
+    columns = CommentRows.columns + ('rating',)
+
+    def build_row(self, row, expand_user, format_datetime):
+        return {
+            'id': row['id'],
+            'book': row['book__title'],
+            'user': (
+                {'id': row['user__id'], 'username': row['user__username']} if expand_user
+                else row['user__username']
+            ),
+            'rating': row['rating'],
+            'content': row['content'],
+            'created_at': format_datetime(row['created_at']),
+            'updated_at': format_datetime(row['updated_at']),
+        }
+
+
+class RowListMixin:
+    """Serve ``list()`` with ``row_class`` rows when ``FAST_LIST_ROWS`` is on."""
+    row_class = None
+
+    def get_list_rows(self):
+        if self.row_class is None or not settings.FAST_LIST_ROWS:
+            return None
+        return self.row_class(self.request, requested_fields(self.request, self.get_serializer_class()))
+
+    def build_rows(self, rows, objects):
+        with serializer_timer():
+            return rows.build(objects)
+
+    def list(self, request, *args, **kwargs):
+        rows = self.get_list_rows()
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+        queryset = rows.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.build_rows(rows, page))
+        return Response(self.build_rows(rows, queryset))
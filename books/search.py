@@ -0,0 +1,61 @@
+from functools import reduce
+from operator import add, and_, or_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+SEARCH_CONFIG = 'english'
+
+# Relative weight of each searchable column, matching the A/B weights the
+# PostgreSQL trigger assigns when it builds Book.search_vector.
+SEARCH_WEIGHTS = {
+    'title': 1.0,
+    'author': 1.0,
+    'description': 0.4,
+}
+
+MAX_FALLBACK_TERMS = 8
+
+
+def search_books(queryset, query):
+    """Filter ``queryset`` to books matching ``query``, best matches first.
+
+    On PostgreSQL this is a full-text match against the GIN-indexed
+    ``search_vector`` column ranked with ``ts_rank``. Other backends fall back
+    to requiring every term in one of the searchable columns and ranking by
+    the weights of the columns that matched.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        return _full_text_search(queryset, query)
+    return _fallback_search(queryset, query)
+
+
+def _full_text_search(queryset, query):
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset.filter(search_vector=search_query)
+        .annotate(search_rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-search_rank', 'id')
+    )
+
+
+def _fallback_search(queryset, query):
+    terms = query.split()[:MAX_FALLBACK_TERMS]
+    matches = [
+        reduce(or_, (Q(**{f'{field}__icontains': term}) for field in SEARCH_WEIGHTS))
+        for term in terms
+    ]
+    rank = reduce(add, (
+        Case(When(**{f'{field}__icontains': term}, then=Value(weight)), default=Value(0.0))
+        for term in terms
+        for field, weight in SEARCH_WEIGHTS.items()
+    ))
+    return (
+        queryset.filter(reduce(and_, matches))
+        .annotate(search_rank=rank)
+        .order_by('-search_rank', 'id')
+    )
@@ -1,22 +1,33 @@
 from rest_framework import serializers
-from .models import Book, Review, Comment
+from users.serializers import UserSummarySerializer
+from .covers import absolute_cover_urls
+from .fieldsets import SparseFieldsetMixin
+from .models import RATING_VALUES, Book, Review, Comment
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     publisher = serializers.StringRelatedField(read_only=True)
-    review_count = serializers.SerializerMethodField()
-    comment_count = serializers.SerializerMethodField()
+    review_count = serializers.IntegerField(read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+    # The original upload; ``covers`` has its resized variants once generated.
+    cover_image = serializers.ImageField(required=False, allow_null=True)
+    covers = serializers.SerializerMethodField()
+    field_columns = {'publisher': ('publisher__username',), 'covers': ('cover_hash',)}
 
     class Meta:
         model = Book
-        fields = ['id', 'title', 'description', 'author', 'publisher', 'review_count', 'comment_count']
+        fields = [
+            'id', 'title', 'description', 'author', 'publisher', 'review_count', 'comment_count',
+            'cover_image', 'covers',
+        ]
         read_only_fields = ['publisher']
+        # The views and the bulk writer check (title, author) uniqueness
+        # themselves, the bulk writer once per chunk rather than per item.
+        validators = []
 
-    def get_review_count(self, obj):
-        return obj.book_reviews.count()
-
-    def get_comment_count(self, obj):
-        return obj.book_comments.count()
+    def get_covers(self, obj):
+        """Return ``{size: {format: url}}``, or ``None`` until the variants are generated."""
+        return absolute_cover_urls(obj.cover_hash, self.context.get('request'))
 
     def validate_title(self, value):
         if len(value.strip()) < 3:
@@ -29,9 +40,55 @@ class BookSerializer(serializers.ModelSerializer):
         return value
 
 
-class ReviewSerializer(serializers.ModelSerializer):
-    user = serializers.StringRelatedField(read_only=True)
-    book = serializers.StringRelatedField(read_only=True)
+class TopBookSerializer(BookSerializer):
+    average_rating = serializers.FloatField(read_only=True)
+    weighted_rating = serializers.FloatField(read_only=True)
+    trending_score = serializers.FloatField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    field_columns = {
+        **BookSerializer.field_columns,
+        'rating_histogram': tuple(f'rating_{rating}_count' for rating in RATING_VALUES),
+    }
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + [
+            'average_rating', 'weighted_rating', 'rating_histogram', 'trending_score',
+        ]
+
+
+class SimilarBookSerializer(BookSerializer):
+    similarity = serializers.FloatField(read_only=True)
+    # Set by the view from the precomputed neighbours, not a column.
+    field_columns = {**BookSerializer.field_columns, 'similarity': ()}
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + ['similarity']
+
+
+def expands_user(request):
+    return request is not None and 'user' in request.query_params.get('expand', '').split(',')
+
+
+class ExpandUserMixin:
+    """Render ``user`` as ``{id, username}`` when the request asks for ``?expand=user``."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if expands_user(self.context.get('request')):
+            fields['user'] = UserSummarySerializer(read_only=True)
+        return fields
+
+
+# Columns of the user and book of reviews and comments, also for ``?expand=user``.
+ENTRY_FIELD_COLUMNS = {'book': ('book__title',), 'user': ('user__id', 'user__username')}
+
+
+class ReviewSerializer(SparseFieldsetMixin, ExpandUserMixin, serializers.ModelSerializer):
+    # Read straight from the related rows instead of going through __str__,
+    # so the views can select_related() and load only these columns.
+    user = serializers.CharField(source='user.username', read_only=True)
+    book = serializers.CharField(source='book.title', read_only=True)
+    field_columns = ENTRY_FIELD_COLUMNS
 
     class Meta:
         model = Review
@@ -39,9 +96,10 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ["user", "book"]
 
 
-class CommentSerializer(serializers.ModelSerializer):
-    user = serializers.StringRelatedField(read_only=True)
-    book = serializers.StringRelatedField(read_only=True)
+class CommentSerializer(SparseFieldsetMixin, ExpandUserMixin, serializers.ModelSerializer):
+    user = serializers.CharField(source='user.username', read_only=True)
+    book = serializers.CharField(source='book.title', read_only=True)
+    field_columns = ENTRY_FIELD_COLUMNS
 
     class Meta:
         model = Comment
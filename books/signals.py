@@ -0,0 +1,97 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import BOOK_LIST_SCOPE, CATALOG_SCOPE, book_scope, bump_versions
+from .covers import schedule_cover_processing
+from .counters import adjust_book_counters, rating_change, rebuild_book_counters
+from .models import Book, Review, Comment
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_cached_book(sender, instance, **kwargs):
+    bump_versions(BOOK_LIST_SCOPE, book_scope(instance.pk))
+
+
+@receiver(post_save, sender=Book)
+def process_changed_cover(sender, instance, created, **kwargs):
+    name = instance.cover_image.name or ''
+    previous = getattr(instance, '_loaded_cover', '' if created else None)
+    instance._loaded_cover = name
+    if previous is None:
+        # Not loaded from the database; only pick up covers never processed.
+        changed = bool(name) and not instance.cover_hash
+    else:
+        changed = previous != name
+    if not changed:
+        return
+    if instance.cover_hash:
+        # The variants of the previous cover no longer apply.
+        Book.objects.filter(pk=instance.pk).update(cover_hash='')
+        instance.cover_hash = ''
+    if name:
+        transaction.on_commit(partial(schedule_cover_processing, instance.pk, name))
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_cached_usernames(sender, instance, created, **kwargs):
+    # Usernames are embedded in book, review and comment responses.
+    loaded = getattr(instance, '_loaded_username', None)
+    if not created and loaded is not None and loaded != instance.username:
+        bump_versions(CATALOG_SCOPE)
+        instance._loaded_username = instance.username
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_cached_book_of_entry(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Book):
+        return
+    # Book responses embed the review and comment counters.
+    book_ids = {instance.book_id, getattr(instance, '_loaded_values', {}).get('book_id', instance.book_id)}
+    bump_versions(BOOK_LIST_SCOPE, *(book_scope(book_id) for book_id in book_ids))
+
+
+@receiver(post_save, sender=Review)
+def update_counters_on_review_save(sender, instance, created, **kwargs):
+    if created:
+        adjust_book_counters(instance.book_id, ratings=rating_change(new=instance.rating))
+    else:
+        loaded = getattr(instance, '_loaded_values', None)
+        if loaded is None or len(loaded) < 2:
+            # The review was not loaded from the database (or only partially),
+            # so the previous values are unknown; recount the book instead.
+            rebuild_book_counters(Book.objects.filter(pk=instance.book_id))
+        elif loaded['book_id'] != instance.book_id:
+            adjust_book_counters(loaded['book_id'], ratings=rating_change(old=loaded['rating']))
+            adjust_book_counters(instance.book_id, ratings=rating_change(new=instance.rating))
+        else:
+            adjust_book_counters(instance.book_id, ratings=rating_change(loaded['rating'], instance.rating))
+    instance._loaded_values = {'book_id': instance.book_id, 'rating': instance.rating}
+
+
+@receiver(post_delete, sender=Review)
+def update_counters_on_review_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Book):
+        # The book itself is being deleted, there is nothing left to update.
+        return
+    adjust_book_counters(instance.book_id, ratings=rating_change(old=instance.rating))
+
+
+@receiver(post_save, sender=Comment)
+def update_counters_on_comment_save(sender, instance, created, **kwargs):
+    if created:
+        adjust_book_counters(instance.book_id, comments=1)
+
+
+@receiver(post_delete, sender=Comment)
+def update_counters_on_comment_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Book):
+        return
+    adjust_book_counters(instance.book_id, comments=-1)
@@ -0,0 +1,197 @@
+"""Item-to-item "readers also liked" neighbours from review ratings.
+
+Every reviewed book is a vector of the ratings its readers gave it, and two
+books are as similar as the cosine of their vectors. All reviews are loaded
+into a sparse book×user matrix with L2-normalized rows; multiplying a block
+of rows by the transposed matrix gives the similarities of those books to
+every other book at once, and ``numpy.argpartition`` picks the top ``k`` of
+each row. The neighbours are stored as ``BookSimilarity`` rows, read by the
+similar books endpoint with a single primary key lookup.
+"""
+import itertools
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Book, BookSimilarity, Review
+
+# Cells of the dense block of similarities computed at once (float32, 64 MB).
+SIMILARITY_BLOCK_CELLS = 2 ** 24
+SIMILARITY_WRITE_BATCH_SIZE = 1000
+REVIEW_CHUNK_SIZE = 10000
+
+
+class RatingMatrix:
+    """Normalized rating vectors of the reviewed books, one row per book.
+
+    ``book_ids`` holds the id of each row, in ascending order.
+    """
+
+    def __init__(self, user_ids, book_ids, ratings):
+        self.book_ids, rows = np.unique(book_ids, return_inverse=True)
+        user_ids, columns = np.unique(user_ids, return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.asarray(ratings, dtype=np.float32), (rows, columns)),
+            shape=(len(self.book_ids), len(user_ids)),
+        )
+        # Ratings are 1 to 5, so every reviewed book has a non-zero norm.
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        self.rows = sparse.diags(1 / norms).astype(np.float32) @ matrix
+        self.columns = self.rows.T.tocsr()
+
+    @classmethod
+    def from_reviews(cls, reviews=None):
+        reviews = (reviews if reviews is not None else Review.objects.all()).order_by()
+        values = np.fromiter(
+            itertools.chain.from_iterable(
+                reviews.values_list('user_id', 'book_id', 'rating').iterator(chunk_size=REVIEW_CHUNK_SIZE)
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        return cls(values[:, 0], values[:, 1], values[:, 2])
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def rows_of(self, book_ids):
+        """Return the rows of those of ``book_ids`` that have reviews."""
+        book_ids = np.fromiter(book_ids, dtype=np.int64)
+        rows = np.searchsorted(self.book_ids, book_ids)
+        found = rows < len(self.book_ids)
+        found[found] = self.book_ids[rows[found]] == book_ids[found]
+        return np.unique(rows[found])
+
+    def similarities(self, rows):
+        """Yield ``(rows, block)`` where ``block[i, j]`` is the similarity of row ``rows[i]`` to row ``j``.
+
+        A book is given a similarity of 0 to itself.
+        """
+        block_size = max(1, SIMILARITY_BLOCK_CELLS // max(len(self), 1))
+        for start in range(0, len(rows), block_size):
+            block_rows = rows[start:start + block_size]
+            block = (self.rows[block_rows] @ self.columns).toarray()
+            block[np.arange(len(block_rows)), block_rows] = 0
+            yield block_rows, block
+
+
+def top_k(block, k):
+    """Return the columns and values of the ``k`` largest values of each row, largest first."""
+    k = min(k, block.shape[1])
+    if k == 0:
+        empty = np.empty((block.shape[0], 0))
+        return empty.astype(np.int64), empty
+    columns = np.argpartition(block, -k, axis=1)[:, -k:]
+    values = np.take_along_axis(block, columns, axis=1)
+    order = np.argsort(-values, axis=1, kind='stable')
+    return np.take_along_axis(columns, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+def neighbours(matrix, block_rows, block, k):
+    """Yield ``(book_id, similar_ids, scores)`` for the rows of a block; books sharing no reader are left out."""
+    columns, values = top_k(block, k)
+    for row, row_columns, row_values in zip(block_rows, columns, values):
+        similar = row_values > 0
+        yield (
+            int(matrix.book_ids[row]),
+            matrix.book_ids[row_columns[similar]].tolist(),
+            np.round(row_values[similar].astype(np.float64), 6).tolist(),
+        )
+
+
+def changed_books(since):
+    """Return the ids of books whose reviews were written, edited or deleted after ``since``.
+
+    Deletions leave no row behind; they show as a ``review_count`` differing
+    from the one recorded with the neighbours.
+    """
+    changed = set(
+        Review.objects.filter(updated_at__gte=since).order_by().values_list('book_id', flat=True).distinct()
+    )
+    changed.update(
+        BookSimilarity.objects.exclude(review_count=F('book__review_count')).values_list('book_id', flat=True)
+    )
+    changed.update(Book.objects.filter(review_count__gt=0, neighbours=None).values_list('id', flat=True))
+    return changed
+
+
+def affected_rows(matrix, changed, stored, k):
+    """Return the rows whose neighbours can differ now that the books in ``changed`` did.
+
+    That is the changed books themselves, the books listing one of them (or a
+    book deleted or without reviews since), and the books to which a changed book is
+    now more similar than their current k-th neighbour. Returns the rows
+    other than the changed ones, and the neighbours of the changed ones,
+    computed on the way.
+    """
+    changed_rows = matrix.rows_of(changed)
+    row_of = dict(zip(matrix.book_ids.tolist(), range(len(matrix))))
+
+    affected = np.zeros(len(matrix), dtype=bool)
+    # Similarity a changed book must exceed to enter each book's neighbours.
+    thresholds = np.zeros(len(matrix), dtype=np.float32)
+    for book_id, (similar_ids, scores) in stored.items():
+        row = row_of.get(book_id)
+        if row is None:
+            continue
+        if len(scores) >= k:
+            thresholds[row] = scores[k - 1]
+        if any(similar_id in changed or similar_id not in row_of for similar_id in similar_ids):
+            affected[row] = True
+
+    computed = []
+    for block_rows, block in matrix.similarities(changed_rows):
+        affected |= (block > thresholds).any(axis=0)
+        computed.extend(neighbours(matrix, block_rows, block, k))
+    affected[changed_rows] = False
+    return np.flatnonzero(affected), computed
+
+
+def refresh_similar_books(k=None, full=False):
+    """Recompute the stored neighbours; returns the number of books refreshed.
+
+    Unless ``full`` is set (or nothing was computed yet), only books whose
+    neighbours can have changed since the last run are recomputed, which
+    gives the same neighbours as a full run.
+    """
+    k = k or settings.SIMILAR_BOOKS_COUNT
+    started = timezone.now()
+    last_run = BookSimilarity.objects.aggregate(last=Max('computed_at'))['last']
+    matrix = RatingMatrix.from_reviews()
+
+    if full or last_run is None:
+        rows, computed = np.arange(len(matrix)), []
+        stale = BookSimilarity.objects.filter(book__review_count=0)
+    else:
+        changed = changed_books(last_run)
+        stored = {
+            book_id: (similar_ids, scores)
+            for book_id, similar_ids, scores in BookSimilarity.objects.values_list('book_id', 'similar_ids', 'scores')
+        }
+        rows, computed = affected_rows(matrix, changed, stored, k)
+        stale = BookSimilarity.objects.filter(book_id__in=changed - set(matrix.book_ids.tolist()))
+
+    for block_rows, block in matrix.similarities(rows):
+        computed.extend(neighbours(matrix, block_rows, block, k))
+
+    review_counts = dict(Book.objects.filter(review_count__gt=0).values_list('id', 'review_count'))
+    with transaction.atomic():
+        removed, _ = stale.delete()
+        BookSimilarity.objects.bulk_create(
+            [
+                BookSimilarity(
+                    book_id=book_id, similar_ids=similar_ids, scores=scores,
+                    review_count=review_counts[book_id], computed_at=started,
+                )
+                for book_id, similar_ids, scores in computed
+                if book_id in review_counts
+            ],
+            update_conflicts=True,
+            unique_fields=['book'],
+            update_fields=['similar_ids', 'scores', 'review_count', 'computed_at'],
+            batch_size=SIMILARITY_WRITE_BATCH_SIZE,
+        )
+    return len(computed) + removed
@@ -0,0 +1,393 @@
+"""Query budgets and latency/memory benchmarks for every API endpoint.
+
+Every route in ``books/urls.py`` and ``users/urls.py`` is exercised against a
+seeded dataset and fails if it runs more queries than its budget allows. The
+dataset is small by default so the suite stays fast; set ``BENCHMARK_BOOKS``
+(e.g. ``BENCHMARK_BOOKS=20000``) for a realistic catalog,
+``BENCHMARK_SIMILARITY_REVIEWS`` (e.g. 1000000) for the size of the synthetic
+ratings of the similar books computation, and ``BENCHMARK_REPORT=<path>`` to
+write the measurements as JSON. Timings are only reported; set
+``BENCHMARK_STRICT=1`` to also fail when a fast path is not faster.
+"""
+import itertools
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from ..counters import rebuild_book_counters
+from ..models import Book, Review, Comment
+from ..renderers import JSONRenderer as RowsJSONRenderer
+from ..rows import BookRows, ReviewRows
+from ..serializers import BookSerializer, ReviewSerializer
+from ..similarity import RatingMatrix, affected_rows, neighbours, refresh_similar_books
+
+User = get_user_model()
+
+BENCHMARK_BOOKS = int(os.getenv('BENCHMARK_BOOKS', '200'))
+BENCHMARK_READERS = int(os.getenv('BENCHMARK_READERS', '50'))
+BENCHMARK_REVIEWS_PER_BOOK = int(os.getenv('BENCHMARK_REVIEWS_PER_BOOK', '5'))
+BENCHMARK_COMMENTS_PER_BOOK = int(os.getenv('BENCHMARK_COMMENTS_PER_BOOK', '5'))
+BENCHMARK_ITERATIONS = int(os.getenv('BENCHMARK_ITERATIONS', '5'))
+BENCHMARK_SIMILARITY_REVIEWS = int(os.getenv('BENCHMARK_SIMILARITY_REVIEWS', '5000'))
+BENCHMARK_REPORT = os.getenv('BENCHMARK_REPORT')
+# Wall-clock comparisons flake on loaded machines, so they are opt-in.
+BENCHMARK_STRICT = os.getenv('BENCHMARK_STRICT', '').lower() in ('1', 'true', 'yes')
+
+PASSWORD = 'benchpass123'
+
+
+def percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EndpointBenchmarkTest(TestCase):
+    """Each entry of ``endpoints`` is ``(name, request factory, expected status, query budget)``.
+
+    The factory receives the iteration number and returns ``(method, url, data)``
+    so that writes never collide with each other. Requests run against cold
+    caches unless the endpoint name ends in ``(cached)``, in which case the
+    response cache is warmed by an unmeasured request first.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password(PASSWORD)
+        cls.user = User.objects.create(
+            username='benchuser', email='benchuser@example.com', password=password, is_staff=True
+        )
+        cls.publisher = User.objects.create(
+            username='benchpublisher', email='benchpublisher@example.com', password=password
+        )
+        cls.readers = User.objects.bulk_create(
+            User(username=f'reader{i}', email=f'reader{i}@example.com', password=password)
+            for i in range(BENCHMARK_READERS)
+        )
+        Book.objects.bulk_create(
+            (
+                Book(
+                    title=f'Book {i}',
+                    author=f'Author {i % 500}',
+                    description=f'Description of book number {i}.',
+                    publisher=cls.user if i % 2 else cls.publisher,
+                )
+                for i in range(BENCHMARK_BOOKS)
+            ),
+            batch_size=1000,
+        )
+        book_ids = cls.book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+        reviewers = cls.readers[:BENCHMARK_REVIEWS_PER_BOOK]
+        Review.objects.bulk_create(
+            (
+                Review(book_id=book_id, user=reader, rating=(book_id + n) % 5 + 1, content='A review.')
+                for book_id in book_ids
+                for n, reader in enumerate(reviewers)
+            ),
+            batch_size=1000,
+        )
+        Comment.objects.bulk_create(
+            (
+                Comment(book_id=book_id, user=cls.readers[n % len(cls.readers)], content='A comment.')
+                for book_id in book_ids
+                for n in range(BENCHMARK_COMMENTS_PER_BOOK)
+            ),
+            batch_size=1000,
+        )
+        rebuild_book_counters()
+        refresh_similar_books()
+        cls.book = Book.objects.filter(publisher=cls.publisher).order_by('id').first()
+        cls.review = Review.objects.filter(book=cls.book).order_by('id').first()
+        cls.comment = Comment.objects.filter(book=cls.book).order_by('id').first()
+        cls.results = []
+        # Books are unique by title and author.
+        cls.scratch_numbers = itertools.count()
+
+    @classmethod
+    def tearDownClass(cls):
+        if BENCHMARK_REPORT and cls.results:
+            with open(BENCHMARK_REPORT, 'w') as report:
+                json.dump(cls.results, report, indent=2)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def new_book(self, publisher=None):
+        return Book.objects.create(
+            title=f'Scratch Book {next(self.scratch_numbers)}',
+            author='Scratch Author',
+            description='A book created by the benchmark.',
+            publisher=publisher or self.user,
+        )
+
+    def endpoints(self):
+        book, review, comment = self.book, self.review, self.comment
+        own_book = Book.objects.filter(publisher=self.user).order_by('id').first()
+        refresh = APIClient().post(
+            reverse('users:token_obtain_pair'),
+            {'email': self.user.email, 'password': PASSWORD},
+        ).data['refresh']
+
+        deep_cursor = self.client.get(
+            reverse('book-list'), {'cursor': '', 'page_size': 100}
+        ).data['next']
+
+        def book_payload(i):
+            return {
+                'title': f'Benchmark Book {i}',
+                'author': 'Benchmark Author',
+                'description': 'Created while benchmarking the API.',
+            }
+
+        return [
+            ('book-list GET', lambda i: ('get', reverse('book-list'), None), 200, 2),
+            ('book-list GET cursor', lambda i: ('get', reverse('book-list') + '?cursor=', None), 200, 1),
+            ('book-list GET deep cursor', lambda i: ('get', deep_cursor, None), 200, 1),
+            ('book-list GET uncounted', lambda i: ('get', reverse('book-list') + '?count=false', None), 200, 1),
+            ('book-list GET sparse', lambda i: ('get', reverse('book-list') + '?fields=id,title', None), 200, 2),
+            ('book-list GET ids', lambda i: (
+                'get', reverse('book-list') + '?ids=' + ','.join(str(pk) for pk in self.book_ids[:50]), None
+            ), 200, 1),
+            ('book-list GET search', lambda i: ('get', reverse('book-list') + '?q=book', None), 200, 2),
+            ('book-list GET filtered', lambda i: (
+                'get', reverse('book-list') + f'?publisher={self.user.id}&ordering=newest&count=false', None
+            ), 200, 1),
+            ('book-list GET highest rated', lambda i: (
+                'get', reverse('book-list') + '?ordering=highest_rated&min_rating=3', None
+            ), 200, 2),
+            # Book writes include the SAVEPOINT and RELEASE around the save
+            # that keeps a duplicate (title, author) from aborting an
+            # enclosing transaction.
+            ('book-list POST', lambda i: ('post', reverse('book-list'), book_payload(i)), 201, 3),
+            ('book-list GET (cached)', lambda i: ('get', reverse('book-list'), None), 200, 0),
+            ('book-top GET', lambda i: ('get', reverse('book-top'), None), 200, 2),
+            ('book-top GET trending', lambda i: ('get', reverse('book-top') + '?ranking=trending', None), 200, 2),
+            ('book-similar GET', lambda i: ('get', reverse('book-similar', args=[book.id]), None), 200, 2),
+            ('book-detail GET', lambda i: ('get', reverse('book-detail', args=[book.id]), None), 200, 1),
+            ('book-detail GET (cached)', lambda i: (
+                'get', reverse('book-detail', args=[book.id]), None
+            ), 200, 0),
+            ('book-detail PUT', lambda i: (
+                'put', reverse('book-detail', args=[own_book.id]), book_payload(f'updated-{i}')
+            ), 200, 4),
+            ('book-detail PATCH', lambda i: (
+                'patch', reverse('book-detail', args=[own_book.id]), {'title': f'Patched {i}'}
+            ), 200, 4),
+            # Includes the cascade to the book's similar books.
+            ('book-detail DELETE', lambda i: (
+                'delete', reverse('book-detail', args=[self.new_book().id]), None
+            ), 204, 5),
+            ('book-reviews GET', lambda i: (
+                'get', reverse('book-reviews', args=[book.id]), None
+            ), 200, 2),
+            ('book-reviews GET sparse', lambda i: (
+                'get', reverse('book-reviews', args=[book.id]) + '?fields=rating', None
+            ), 200, 2),
+            ('book-reviews GET highest rated', lambda i: (
+                'get', reverse('book-reviews', args=[book.id]) + '?ordering=highest_rated&rating=5', None
+            ), 200, 2),
+            ('book-reviews GET expand=user', lambda i: (
+                'get', reverse('book-reviews', args=[book.id]) + '?expand=user', None
+            ), 200, 2),
+            ('book-reviews POST', lambda i: (
+                'post', reverse('book-reviews', args=[self.new_book(self.publisher).id]),
+                {'rating': 4, 'content': 'Benchmark review.'},
+            ), 201, 4),
+            ('review-detail GET', lambda i: (
+                'get', reverse('review-detail', args=[book.id, review.id]), None
+            ), 200, 1),
+            ('book-comments GET', lambda i: (
+                'get', reverse('book-comments', args=[book.id]), None
+            ), 200, 2),
+            ('book-comments POST', lambda i: (
+                'post', reverse('book-comments', args=[self.new_book(self.publisher).id]),
+                {'content': 'Benchmark comment.'},
+            ), 201, 4),
+            ('comment-detail GET', lambda i: (
+                'get', reverse('comment-detail', args=[book.id, comment.id]), None
+            ), 200, 1),
+            # Kept under SQLite's bulk_create batch size (999 parameters per
+            # statement) so the budget holds on both backends.
+            ('book-bulk POST', lambda i: (
+                'post', reverse('book-bulk'), [book_payload(f'{i}-{n}') for n in range(40)]
+            ), 200, 4),
+            ('review-bulk POST', lambda i: ('post', reverse('review-bulk'), [
+                {'book': self.new_book(self.publisher).id, 'rating': 3, 'content': 'Bulk review.'}
+                for _ in range(20)
+            ]), 200, 6),
+            ('comment-bulk POST', lambda i: ('post', reverse('comment-bulk'), [
+                {'book': book.id, 'content': 'Bulk comment.'} for _ in range(20)
+            ]), 200, 5),
+            ('export GET reviews', lambda i: ('get', reverse('export', args=['reviews']), None), 200, 1),
+            ('export GET books csv.gz', lambda i: (
+                'get', reverse('export', args=['books']) + '?output=csv&compress=gzip', None
+            ), 200, 1),
+            ('users:register POST', lambda i: ('post', reverse('users:register'), {
+                'email': f'new{i}@example.com', 'username': f'new{i}',
+                'password': 'Complex-pass-123', 'password2': 'Complex-pass-123',
+            }), 201, 3),
+            ('users:token_obtain_pair POST', lambda i: (
+                'post', reverse('users:token_obtain_pair'),
+                {'email': self.user.email, 'password': PASSWORD},
+            ), 200, 1),
+            # Includes the periodic reload of token revocations.
+            ('users:token_refresh POST', lambda i: (
+                'post', reverse('users:token_refresh'), {'refresh': refresh}
+            ), 200, 2),
+            ('users:user_detail GET', lambda i: ('get', reverse('users:user_detail'), None), 200, 0),
+        ]
+
+    def send(self, method, url, data, warm=False):
+        if not warm:
+            # Also resets the throttle history so that repeated benchmark
+            # requests are never rate limited.
+            for cache in caches.all():
+                cache.clear()
+        response = getattr(self.client, method)(url, data, format='json' if data is not None else None)
+        if response.streaming:
+            # Streaming responses only hit the database while being consumed.
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    def measure(self, name, factory, expected_status, budget):
+        warm = name.endswith('(cached)')
+        latencies = []
+        query_counts = []
+        for i in range(BENCHMARK_ITERATIONS):
+            method, url, data = factory(i)
+            if warm:
+                self.send(method, url, data)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = self.send(method, url, data, warm=warm)
+                latencies.append(time.perf_counter() - start)
+            self.assertEqual(response.status_code, expected_status, f'{name}: {getattr(response, "data", "")}')
+            query_counts.append(len(queries))
+
+        # Memory is sampled on a separate request so tracing does not skew latency.
+        method, url, data = factory(BENCHMARK_ITERATIONS)
+        if warm:
+            self.send(method, url, data)
+        tracemalloc.start()
+        try:
+            self.send(method, url, data, warm=warm)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'endpoint': name,
+            'queries': max(query_counts),
+            'budget': budget,
+            'p50_ms': round(statistics.median(latencies) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
+
+    def test_endpoints_stay_within_query_budget(self):
+        for name, factory, expected_status, budget in self.endpoints():
+            with self.subTest(endpoint=name):
+                result = self.measure(name, factory, expected_status, budget)
+                type(self).results.append(result)
+                self.assertLessEqual(
+                    result['queries'], budget,
+                    f"{name} ran {result['queries']} queries, budget is {budget}",
+                )
+
+    def test_list_rows_outpace_serializers(self):
+        """Microbenchmark: load and render a page of 100 items with the serializer or from rows."""
+        request = Request(APIRequestFactory().get('/'))
+        cases = [
+            ('books', BookSerializer, BookRows, Book.objects.select_related('publisher').defer('search_vector')),
+            ('reviews', ReviewSerializer, ReviewRows, Review.objects.select_related('user', 'book')),
+        ]
+        for name, serializer_class, row_class, queryset in cases:
+            queryset = queryset.order_by('id')
+
+            def serialized():
+                data = serializer_class(queryset[:100], many=True, context={'request': request}).data
+                return JSONRenderer().render(data)
+
+            def from_rows():
+                rows = row_class(request)
+                return RowsJSONRenderer().render(rows.build(rows.values(queryset)[:100]))
+
+            with self.subTest(items=name):
+                self.assertEqual(serialized(), from_rows())
+                timings = {}
+                for label, render in (('serializer', serialized), ('rows', from_rows)):
+                    samples = []
+                    for _ in range(BENCHMARK_ITERATIONS * 4):
+                        start = time.perf_counter()
+                        render()
+                        samples.append(time.perf_counter() - start)
+                    timings[label] = statistics.median(samples)
+                type(self).results.append({
+                    'benchmark': f'render 100 {name}',
+                    'serializer_ms': round(timings['serializer'] * 1000, 3),
+                    'rows_ms': round(timings['rows'] * 1000, 3),
+                    'speedup': round(timings['serializer'] / timings['rows'], 2),
+                })
+                if BENCHMARK_STRICT:
+                    self.assertLess(timings['rows'], timings['serializer'])
+
+    def test_similar_books_refresh_at_scale(self):
+        """Full and incremental neighbour computation on synthetic ratings, without the database."""
+        rng = np.random.default_rng(0)
+        book_count = max(BENCHMARK_SIMILARITY_REVIEWS // 50, 10)
+        user_count = max(BENCHMARK_SIMILARITY_REVIEWS // 10, 10)
+        # A few popular books get most of the reviews.
+        book_ids = (book_count * rng.random(BENCHMARK_SIMILARITY_REVIEWS) ** 2).astype(np.int64)
+        user_ids = rng.integers(user_count, size=BENCHMARK_SIMILARITY_REVIEWS)
+        ratings = rng.integers(1, 6, size=BENCHMARK_SIMILARITY_REVIEWS)
+        # One review per reader and book.
+        _, unique = np.unique(user_ids * book_count + book_ids, return_index=True)
+
+        start = time.perf_counter()
+        matrix = RatingMatrix(user_ids[unique], book_ids[unique], ratings[unique])
+        built = time.perf_counter()
+        computed = []
+        for block_rows, block in matrix.similarities(np.arange(len(matrix))):
+            computed.extend(neighbours(matrix, block_rows, block, 20))
+        full = time.perf_counter()
+
+        stored = {book_id: (similar_ids, scores) for book_id, similar_ids, scores in computed}
+        changed = set(rng.choice(matrix.book_ids, max(len(matrix) // 100, 1), replace=False).tolist())
+        rows, recomputed = affected_rows(matrix, changed, stored, 20)
+        for block_rows, block in matrix.similarities(rows):
+            recomputed.extend(neighbours(matrix, block_rows, block, 20))
+        incremental = time.perf_counter()
+
+        self.assertEqual(len(computed), len(matrix))
+        self.assertEqual(len(recomputed), len(changed) + len(rows))
+        for _, similar_ids, scores in computed[:100]:
+            self.assertLessEqual(len(similar_ids), 20)
+            self.assertEqual(scores, sorted(scores, reverse=True))
+        type(self).results.append({
+            'benchmark': f'similar books of {len(matrix)} books from {len(unique)} reviews',
+            'matrix_s': round(built - start, 3),
+            'full_refresh_s': round(full - built, 3),
+            'incremental_refresh_s': round(incremental - full, 3),
+            'incremental_books': len(recomputed),
+        })
+        if BENCHMARK_STRICT:
+            self.assertLess(incremental - full, full - built)
@@ -1,7 +1,16 @@
+import math
+import random
+from io import StringIO
+
+from unittest import skipUnless
+
 from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
-from books.models import Book, Review, Comment
+from books.models import Book, BookSimilarity, Review, Comment
+from books.similarity import refresh_similar_books
 
 User = get_user_model()
 
@@ -129,3 +138,273 @@ class CommentModelTest(TestCase):
                 user=self.publisher,  # Publisher trying to comment on their own book
                 content="Great book",
             )
+
+
+class BookCountersTest(TestCase):
+    def setUp(self):
+        self.publisher = User.objects.create_user(
+            username="publisher", email="publisher@example.com", password="testpass123"
+        )
+        self.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="testpass123"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            description="Test Description",
+            publisher=self.publisher,
+        )
+
+    def test_counters_follow_review_lifecycle(self):
+        review = Review.objects.create(
+            book=self.book, user=self.reader, rating=4, content="Good book"
+        )
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.review_count, self.book.rating_sum), (1, 4))
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 2
+        review.save()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.review_count, self.book.rating_sum), (1, 2))
+
+        review.delete()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.review_count, self.book.rating_sum), (0, 0))
+
+    def test_rating_aggregates_follow_review_lifecycle(self):
+        other = User.objects.create_user(
+            username="other", email="other@example.com", password="testpass123"
+        )
+        Review.objects.create(book=self.book, user=self.reader, rating=5, content="Great")
+        review = Review.objects.create(book=self.book, user=other, rating=4, content="Good")
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_histogram, {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1})
+        self.assertAlmostEqual(self.book.average_rating, 4.5)
+        # Two real ratings (sum 9) plus ten virtual ratings of 3.
+        self.assertAlmostEqual(self.book.weighted_rating, 39 / 12)
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 1
+        review.save()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_histogram, {"1": 1, "2": 0, "3": 0, "4": 0, "5": 1})
+        self.assertAlmostEqual(self.book.average_rating, 3.0)
+
+        Review.objects.filter(book=self.book).delete()
+        self.book.refresh_from_db()
+        self.assertEqual(sum(self.book.rating_histogram.values()), 0)
+        self.assertEqual((self.book.average_rating, self.book.weighted_rating), (0.0, 0.0))
+
+    def test_counters_follow_comment_lifecycle(self):
+        comment = Comment.objects.create(
+            book=self.book, user=self.reader, content="Nice"
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.comment_count, 1)
+
+        comment.delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.comment_count, 0)
+
+    def test_rebuild_book_counters_command(self):
+        Review.objects.create(book=self.book, user=self.reader, rating=3, content="Okay")
+        Comment.objects.create(book=self.book, user=self.reader, content="Nice")
+        Book.objects.update(review_count=0, comment_count=0, rating_sum=0, rating_3_count=0, average_rating=0.0)
+
+        out = StringIO()
+        call_command("rebuild_book_counters", stdout=out)
+        # The tests run with per-process caches.
+        self.assertIn("were not invalidated", out.getvalue())
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.review_count, 1)
+        self.assertEqual(self.book.comment_count, 1)
+        self.assertEqual(self.book.rating_sum, 3)
+        self.assertEqual(self.book.rating_3_count, 1)
+        self.assertAlmostEqual(self.book.average_rating, 3.0)
+
+
+@skipUnless(connection.vendor == "postgresql", "search_vector is maintained by a PostgreSQL trigger")
+class BookSearchVectorTest(TestCase):
+    def test_trigger_maintains_search_vector(self):
+        user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        book = Book.objects.create(
+            title="The Hobbit", author="Tolkien", description="Dragons", publisher=user
+        )
+        self.assertTrue(Book.objects.filter(pk=book.pk, search_vector="hobbit").exists())
+
+        Book.objects.filter(pk=book.pk).update(title="Silmarillion")
+        self.assertFalse(Book.objects.filter(pk=book.pk, search_vector="hobbit").exists())
+        self.assertTrue(Book.objects.filter(pk=book.pk, search_vector="silmarillion").exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "checks PostgreSQL query plans")
+class QueryPlanTest(TestCase):
+    """The hot lookups must be answered from their composite indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Spread over several publishers so filtering on one is selective.
+        publishers = [
+            User.objects.create_user(
+                username=f"publisher{i}", email=f"publisher{i}@example.com", password="testpass123"
+            )
+            for i in range(10)
+        ]
+        cls.publisher = publishers[0]
+        cls.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="testpass123"
+        )
+        Book.objects.bulk_create(
+            Book(
+                title=f"Book {i}", author=f"Author {i % 50}", description="Text",
+                publisher=publishers[i % len(publishers)],
+            )
+            for i in range(500)
+        )
+        cls.book = Book.objects.order_by("id").first()
+        Review.objects.create(book=cls.book, user=cls.reader, rating=4, content="Good")
+        Comment.objects.create(book=cls.book, user=cls.reader, content="Nice")
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            # The tables are small; make any sequential or bitmap scan (and
+            # the sort that follows it) stand out.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_bitmapscan = off")
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_duplicate_check(self):
+        self.assertUsesIndex(
+            Book.objects.filter(title="Book 7", author="Author 7").values("id")[:1],
+            "books_book_title_author_uniq",
+        )
+
+    def test_publisher_books_by_creation(self):
+        self.assertUsesIndex(
+            Book.objects.filter(publisher=self.publisher).order_by("created_at").values("id")[:10],
+            "books_book_publisher_idx",
+        )
+
+    def test_review_and_comment_pages(self):
+        self.assertUsesIndex(
+            Review.objects.filter(book=self.book).order_by("created_at", "id").values("id")[:10],
+            "books_review_book_created_idx",
+        )
+        self.assertUsesIndex(
+            Comment.objects.filter(book=self.book).order_by("created_at", "id").values("id")[:10],
+            "books_comment_book_created_idx",
+        )
+
+    def test_list_filters_and_orderings(self):
+        self.assertUsesIndex(
+            Book.objects.filter(author="Author 7").order_by("-created_at", "-id").values("id")[:10],
+            "books_book_author_idx",
+        )
+        self.assertUsesIndex(
+            Book.objects.filter(average_rating__gte=3).order_by("-average_rating", "id").values("id")[:10],
+            "books_book_average_idx",
+        )
+        self.assertUsesIndex(
+            Review.objects.filter(book=self.book, rating=4).order_by("-created_at", "-id").values("id")[:10],
+            "books_review_book_rating_idx",
+        )
+        self.assertUsesIndex(
+            Review.objects.filter(book=self.book).order_by("-rating", "-created_at", "-id").values("id")[:10],
+            "books_review_book_rating_idx",
+        )
+
+
+class SimilarBooksTest(TestCase):
+    def setUp(self):
+        publisher = User.objects.create_user(
+            username="publisher", email="publisher@example.com", password="testpass123"
+        )
+        self.readers = User.objects.bulk_create(
+            User(username=f"reader{i}", email=f"reader{i}@example.com") for i in range(15)
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", author="Author", description="Description", publisher=publisher
+            )
+            for i in range(12)
+        ]
+        rng = random.Random(7)
+        for book in self.books:
+            for reader in rng.sample(self.readers, 7):
+                Review.objects.create(book=book, user=reader, rating=rng.randint(1, 5), content="Review")
+
+    def expected_neighbours(self, k):
+        ratings = {}
+        for book_id, user_id, rating in Review.objects.values_list("book_id", "user_id", "rating"):
+            ratings.setdefault(book_id, {})[user_id] = rating
+
+        def cosine(a, b):
+            dot = sum(rating * b.get(user_id, 0) for user_id, rating in a.items())
+            return dot / math.sqrt(sum(r * r for r in a.values()) * sum(r * r for r in b.values()))
+
+        expected = {}
+        for book_id, vector in ratings.items():
+            scores = sorted(
+                ((cosine(vector, other), other_id) for other_id, other in ratings.items() if other_id != book_id),
+                reverse=True,
+            )
+            expected[book_id] = [(other_id, score) for score, other_id in scores[:k] if score > 0]
+        return expected
+
+    def stored_neighbours(self):
+        return {
+            book_id: list(zip(similar_ids, scores))
+            for book_id, similar_ids, scores in BookSimilarity.objects.values_list("book_id", "similar_ids", "scores")
+        }
+
+    def assertNeighboursEqual(self, actual, expected):
+        self.assertEqual(actual.keys(), expected.keys())
+        for book_id, neighbours in expected.items():
+            self.assertEqual([i for i, _ in actual[book_id]], [i for i, _ in neighbours], f"book {book_id}")
+            for (_, score), (_, expected_score) in zip(actual[book_id], neighbours):
+                self.assertAlmostEqual(score, expected_score, places=5)
+
+    def test_neighbours_are_top_k_by_cosine_similarity(self):
+        self.assertEqual(refresh_similar_books(k=3), len(self.books))
+        self.assertNeighboursEqual(self.stored_neighbours(), self.expected_neighbours(3))
+
+    def test_incremental_refresh_matches_full_refresh(self):
+        refresh_similar_books(k=3)
+        review = Review.objects.filter(book=self.books[0]).first()
+        review.rating = 6 - review.rating
+        review.save()
+        Review.objects.filter(book=self.books[1]).first().delete()
+        reviewed = Review.objects.filter(book=self.books[2]).values_list("user_id", flat=True)
+        reader = next(reader for reader in self.readers if reader.pk not in reviewed)
+        Review.objects.create(book=self.books[2], user=reader, rating=5, content="Review")
+        Review.objects.filter(book=self.books[3]).delete()
+        self.books[4].delete()
+
+        refreshed = refresh_similar_books(k=3)
+        self.assertLess(refreshed, len(self.books))
+        incremental = self.stored_neighbours()
+        self.assertNotIn(self.books[3].pk, incremental)
+        self.assertNeighboursEqual(incremental, self.expected_neighbours(3))
+
+        refresh_similar_books(k=3, full=True)
+        self.assertEqual(self.stored_neighbours(), incremental)
+
+    def test_refresh_command(self):
+        out = StringIO()
+        call_command("refresh_similar_books", "--k", "2", stdout=out)
+        self.assertIn(f"Refreshed the similar books of {len(self.books)} book(s).", out.getvalue())
+        # The tests run with per-process caches.
+        self.assertIn("were not invalidated", out.getvalue())
+        out = StringIO()
+        call_command("refresh_similar_books", stdout=out)
+        self.assertIn("Refreshed the similar books of 0 book(s).", out.getvalue())
+        self.assertNotIn("were not invalidated", out.getvalue())
@@ -1,9 +1,34 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.utils import timezone
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
+from PIL import Image
+from ..covers import COVER_FORMATS, COVER_SIZES, cover_variant_name
 from ..models import Book, Review, Comment
+from ..serializers import BookSerializer
+from ..throttling import ScopedRateThrottle, SlidingWindowRateThrottle
+from ..views import BookBulkView, BookListCreateView
 
 User = get_user_model()
 
@@ -51,6 +76,20 @@ class BookViewsTest(TestCase):
         response = self.client.post(url, self.book_data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_update_book_into_duplicate(self):
+        url = reverse("book-detail", kwargs={"pk": self.book.id})
+        Book.objects.create(publisher=self.other_user, **self.book_data)
+        response = self.client.patch(url, {"title": "Test Book", "author": "Test Author"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "Existing Book")
+
+    def test_other_integrity_errors_are_not_duplicates(self):
+        url = reverse("book-detail", kwargs={"pk": self.book.id})
+        with mock.patch.object(BookSerializer, "save", side_effect=IntegrityError("foreign key violation")):
+            with self.assertRaises(IntegrityError):
+                self.client.patch(url, {"title": "Renamed Book"})
+
     def test_update_book(self):
         url = reverse("book-detail", kwargs={"pk": self.book.id})
         updated_data = {
@@ -147,3 +186,1186 @@ class CommentViewsTest(TestCase):
         url = reverse('book-comments', kwargs={'book_id': self.book.id})
         response = self.client.post(url, self.comment_data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookListQueryCountTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            email='testuser@example.com'
+        )
+        self.reader = User.objects.create_user(
+            username='reader',
+            password='testpass123',
+            email='reader@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create_books(self, count):
+        offset = Book.objects.count()
+        for i in range(offset, offset + count):
+            book = Book.objects.create(
+                title=f"Book {i}",
+                description="Some Description",
+                author="Some Author",
+                publisher=self.user,
+            )
+            Review.objects.create(book=book, user=self.reader, rating=4, content="Good")
+            Comment.objects.create(book=book, user=self.reader, content="Nice")
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        url = reverse('book-list')
+        self.create_books(2)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.create_books(8)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertTrue(all(book['review_count'] == 1 for book in response.data['results']))
+        self.assertTrue(all(book['comment_count'] == 1 for book in response.data['results']))
+
+
+class BookPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            email='testuser@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+        for i in range(15):
+            Book.objects.create(
+                title=f"Book {i}",
+                description="Some Description",
+                author="Some Author",
+                publisher=self.user,
+            )
+
+    def test_cursor_mode_walks_all_books_without_count(self):
+        url = reverse('book-list')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'cursor': ''})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        first_page = [book['title'] for book in response.data['results']]
+        self.assertEqual(first_page, [f"Book {i}" for i in range(10)])
+
+        response = self.client.get(response.data['next'])
+        second_page = [book['title'] for book in response.data['results']]
+        self.assertEqual(second_page, [f"Book {i}" for i in range(10, 15)])
+        self.assertIsNone(response.data['next'])
+
+    def test_page_mode_can_skip_count(self):
+        url = reverse('book-list')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'count': 'false', 'page': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+
+    def test_page_mode_counts_by_default(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(response.data['count'], 15)
+
+
+class ReviewListRepresentationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = User.objects.create_user(
+            username='publisher',
+            password='testpass123',
+            email='publisher@example.com'
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            description="Test Description",
+            author="Test Author",
+            publisher=self.publisher,
+        )
+        for i in range(5):
+            reader = User.objects.create_user(
+                username=f'reader{i}',
+                password='testpass123',
+                email=f'reader{i}@example.com'
+            )
+            Review.objects.create(book=self.book, user=reader, rating=4, content='Good')
+            Comment.objects.create(book=self.book, user=reader, content='Nice')
+        self.client.force_authenticate(user=reader)
+
+    def test_review_list_renders_related_names_without_extra_queries(self):
+        url = reverse('book-reviews', kwargs={'book_id': self.book.id})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        first = response.data['results'][0]
+        self.assertEqual(first['book'], 'Test Book')
+        self.assertEqual(first['user'], 'reader0')
+
+    def test_comment_list_expands_user(self):
+        url = reverse('book-comments', kwargs={'book_id': self.book.id})
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'expand': 'user'})
+        first = response.data['results'][0]
+        self.assertEqual(first['user'], {'id': first['user']['id'], 'username': 'reader0'})
+        self.assertEqual(first['book'], 'Test Book')
+
+
+class BookSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            email='testuser@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+        for title, author, description in [
+            ("The Hobbit", "J. R. R. Tolkien", "A fantasy adventure in Middle-earth."),
+            ("Dune", "Frank Herbert", "Desert planet politics and a fantasy of power."),
+            ("Neuromancer", "William Gibson", "A cyberpunk heist."),
+        ]:
+            Book.objects.create(title=title, author=author, description=description, publisher=self.user)
+
+    def search(self, query):
+        response = self.client.get(reverse('book-list'), {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book['title'] for book in response.data['results']]
+
+    def test_search_matches_title_author_and_description(self):
+        self.assertEqual(self.search('hobbit'), ['The Hobbit'])
+        self.assertEqual(self.search('gibson'), ['Neuromancer'])
+        self.assertEqual(self.search('cyberpunk heist'), ['Neuromancer'])
+        self.assertEqual(self.search('dragons'), [])
+
+    def test_search_ranks_title_matches_first(self):
+        Book.objects.create(
+            title="Fantasy Atlas",
+            author="Someone",
+            description="Maps.",
+            publisher=self.user,
+        )
+        self.assertEqual(self.search('fantasy')[0], 'Fantasy Atlas')
+
+    def test_blank_query_lists_everything(self):
+        self.assertEqual(len(self.search(' ')), 3)
+
+
+class ListRowsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = User.objects.create_user(
+            username='publisher', password='testpass123', email='publisher@example.com'
+        )
+        self.reader = User.objects.create_user(
+            username='lecteur', password='testpass123', email='reader@example.com'
+        )
+        self.client.force_authenticate(user=self.reader)
+        self.books = [
+            Book.objects.create(
+                title=f"Café {i} \u2028 \"quoted\"",
+                description="Ünïcode, tabs\tand\nnewlines \u2029 \x01",
+                author="Some Author",
+                publisher=self.publisher,
+            )
+            for i in range(3)
+        ]
+        Book.objects.filter(pk=self.books[0].pk).update(cover_image='book_covers/café cover.png', cover_hash='ab' * 32)
+        Review.objects.create(book=self.books[0], user=self.reader, rating=4, content='Très bien')
+        Comment.objects.create(book=self.books[0], user=self.reader, content='Nice \u2028 line')
+
+    def render(self, url, **settings_overrides):
+        caches['responses'].clear()
+        with override_settings(**settings_overrides):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content
+
+    def test_rows_render_like_the_serializers(self):
+        book = self.books[0]
+        urls = [
+            reverse('book-list'),
+            reverse('book-list') + '?count=false&page_size=2',
+            reverse('book-list') + '?cursor=&page_size=2',
+            reverse('book-list') + '?q=quoted',
+            reverse('book-reviews', args=[book.pk]),
+            reverse('book-reviews', args=[book.pk]) + '?expand=user',
+            reverse('book-comments', args=[book.pk]) + '?cursor=',
+            reverse('book-comments', args=[book.pk]) + '?expand=user&count=false',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.render(url, FAST_LIST_ROWS=True), self.render(url, FAST_LIST_ROWS=False))
+
+    def test_rows_skip_the_serializer(self):
+        with mock.patch.object(BookListCreateView, 'get_serializer') as get_serializer:
+            content = self.render(reverse('book-list'), FAST_LIST_ROWS=True)
+        get_serializer.assert_not_called()
+        self.assertIn('\\u2028'.encode(), content)
+        self.assertIn('"covers":{"thumbnail"'.encode(), content)
+
+
+class SparseFieldsetTest(TestCase):
+    setUp = ListRowsTest.setUp
+    render = ListRowsTest.render
+
+    def test_sparse_rows_render_like_the_serializers(self):
+        book, review = self.books[0], Review.objects.first()
+        urls = [
+            reverse('book-list') + '?fields=id,title',
+            reverse('book-list') + '?fields=covers,publisher&cursor=',
+            reverse('book-list') + '?fields=id,cover_image',
+            reverse('book-list') + '?omit=description,covers&count=false',
+            reverse('book-reviews', args=[book.pk]) + '?fields=user,rating&expand=user',
+            reverse('book-comments', args=[book.pk]) + '?omit=book,user',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.render(url, FAST_LIST_ROWS=True), self.render(url, FAST_LIST_ROWS=False))
+        response = self.client.get(reverse('review-detail', args=[book.pk, review.pk]), {'fields': 'rating,user'})
+        self.assertEqual(response.data, {'user': 'lecteur', 'rating': 4})
+
+    def test_only_the_selected_columns_are_loaded(self):
+        for fast_list_rows in (True, False):
+            with self.subTest(FAST_LIST_ROWS=fast_list_rows), override_settings(FAST_LIST_ROWS=fast_list_rows):
+                caches['responses'].clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(reverse('book-list'), {'fields': 'id,title', 'count': 'false'})
+                self.assertEqual(list(response.data['results'][0]), ['id', 'title'])
+                (sql,) = [query['sql'] for query in queries]
+                self.assertNotIn('description', sql)
+                self.assertNotIn('JOIN', sql)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-detail', args=[self.books[0].pk]), {'omit': 'publisher'})
+        self.assertNotIn('publisher', response.data)
+        self.assertNotIn('JOIN', queries[-1]['sql'])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('book-list'), {'fields': 'id,rating'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('rating', response.data['fields'][0])
+        response = self.client.get(reverse('book-list'), {'omit': 'cover'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_ignore_fieldsets(self):
+        self.client.force_authenticate(user=self.publisher)
+        response = self.client.patch(
+            reverse('book-detail', args=[self.books[1].pk]) + '?fields=id', {'title': 'Renamed'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Renamed')
+
+
+class IdListTest(TestCase):
+    setUp = ListRowsTest.setUp
+    render = ListRowsTest.render
+
+    def test_items_come_in_request_order(self):
+        first, second, third = self.books
+        ids = f'{third.pk},{first.pk},999,{third.pk}'
+        caches['responses'].clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('book-list'), {'ids': ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['id'] for book in response.data['results']], [third.pk, first.pk])
+        self.assertEqual(response.data['missing'], [999])
+
+        url = reverse('book-list') + f'?ids={ids}&fields=id,title'
+        self.assertEqual(self.render(url, FAST_LIST_ROWS=True), self.render(url, FAST_LIST_ROWS=False))
+
+    def test_reviews_and_comments_of_other_books_are_missing(self):
+        review, comment = Review.objects.get(), Comment.objects.get()
+        for name, item in (('book-reviews', review), ('book-comments', comment)):
+            with self.subTest(name):
+                response = self.client.get(reverse(name, args=[self.books[0].pk]), {'ids': f'{item.pk},0'})
+                self.assertEqual([entry['id'] for entry in response.data['results']], [item.pk])
+                self.assertEqual(response.data['missing'], [0])
+                response = self.client.get(reverse(name, args=[self.books[1].pk]), {'ids': str(item.pk)})
+                self.assertEqual(response.data, {'results': [], 'missing': [item.pk]})
+
+    def test_invalid_and_oversized_id_lists_are_rejected(self):
+        for ids in ('1,two', ','.join(str(i) for i in range(101))):
+            with self.subTest(ids=ids[:10]):
+                response = self.client.get(reverse('book-list'), {'ids': ids})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('ids', response.data)
+
+
+class ListFilterTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher, self.other_publisher, *self.readers = [
+            User.objects.create_user(username=f'user{i}', password='testpass123', email=f'user{i}@example.com')
+            for i in range(5)
+        ]
+        self.client.force_authenticate(user=self.readers[0])
+        now = timezone.now()
+        self.old, self.middle, self.new = [
+            Book.objects.create(
+                title=f'Book {i}', description='Some description', author=author, publisher=publisher
+            )
+            for i, (author, publisher) in enumerate((
+                ('Tolkien', self.publisher), ('Herbert', self.publisher), ('Tolkien', self.other_publisher),
+            ))
+        ]
+        for days, book in ((30, self.old), (20, self.middle), (10, self.new)):
+            Book.objects.filter(pk=book.pk).update(created_at=now - timedelta(days=days))
+        self.reviews = [
+            Review.objects.create(book=self.old, user=reader, rating=rating, content='Text')
+            for reader, rating in zip(self.readers, (2, 5, 5))
+        ]
+        Review.objects.create(book=self.middle, user=self.readers[0], rating=5, content='Text')
+        self.cutoff = (now - timedelta(days=25)).isoformat()
+        caches['responses'].clear()
+
+    def ids(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [item['id'] for item in response.data['results']]
+
+    def test_book_filters_and_orderings(self):
+        url = reverse('book-list')
+        cases = [
+            ({}, [self.old, self.middle, self.new]),
+            ({'ordering': 'newest'}, [self.new, self.middle, self.old]),
+            ({'author': 'Tolkien', 'ordering': 'newest'}, [self.new, self.old]),
+            ({'publisher': self.publisher.pk}, [self.old, self.middle]),
+            ({'publisher': self.publisher.pk, 'created_before': self.cutoff}, [self.old]),
+            ({'created_after': self.cutoff}, [self.middle, self.new]),
+            ({'ordering': 'highest_rated'}, [self.middle, self.old, self.new]),
+            ({'ordering': 'highest_rated', 'min_rating': 4}, [self.middle, self.old]),
+        ]
+        for params, books in cases:
+            with self.subTest(params=params):
+                self.assertEqual(self.ids(url, params), [book.pk for book in books])
+
+    def test_review_and_comment_filters_and_orderings(self):
+        low, first_five, second_five = self.reviews
+        url = reverse('book-reviews', args=[self.old.pk])
+        self.assertEqual(self.ids(url, {'ordering': 'newest'}), [second_five.pk, first_five.pk, low.pk])
+        self.assertEqual(self.ids(url, {'ordering': 'highest_rated'}), [second_five.pk, first_five.pk, low.pk])
+        self.assertEqual(self.ids(url, {'rating': 5}), [first_five.pk, second_five.pk])
+        self.assertEqual(self.ids(url, {'rating': 2, 'ordering': 'highest_rated'}), [low.pk])
+        self.assertEqual(self.ids(url, {'created_after': self.cutoff}), [low.pk, first_five.pk, second_five.pk])
+
+        comments = [Comment.objects.create(book=self.old, user=reader, content='Text') for reader in self.readers]
+        url = reverse('book-comments', args=[self.old.pk])
+        self.assertEqual(self.ids(url, {'ordering': 'newest'}), [comment.pk for comment in reversed(comments)])
+        self.assertEqual(self.ids(url, {'created_before': self.cutoff}), [])
+
+    def test_unindexed_combinations_are_rejected(self):
+        cases = [
+            (reverse('book-list'), {'min_rating': 3}),
+            (reverse('book-list'), {'author': 'Tolkien', 'publisher': self.publisher.pk}),
+            (reverse('book-list'), {'author': 'Tolkien', 'ordering': 'highest_rated'}),
+            (reverse('book-list'), {'created_after': self.cutoff, 'ordering': 'highest_rated'}),
+            (reverse('book-reviews', args=[self.old.pk]), {'created_after': self.cutoff, 'ordering': 'highest_rated'}),
+        ]
+        for url, params in cases:
+            with self.subTest(params=params), self.assertNumQueries(0):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('not supported', response.data['detail'])
+
+    def test_invalid_values_are_rejected(self):
+        url = reverse('book-list')
+        cases = [
+            {'ordering': 'title'},
+            {'publisher': 'me'},
+            {'created_after': 'yesterday'},
+            {'ordering': 'highest_rated', 'min_rating': 'nan'},
+            {'q': 'Book', 'author': 'Tolkien'},
+            {'q': 'Book', 'cursor': ''},
+            {'ordering': 'highest_rated', 'cursor': ''},
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_follows_the_ordering(self):
+        url = reverse('book-list')
+        response = self.client.get(url, {'ordering': 'newest', 'cursor': '', 'page_size': 2})
+        self.assertEqual([book['id'] for book in response.data['results']], [self.new.pk, self.middle.pk])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([book['id'] for book in response.data['results']], [self.old.pk])
+
+
+class BookResponseCacheTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = User.objects.create_user(
+            username='publisher',
+            password='testpass123',
+            email='publisher@example.com'
+        )
+        self.reader = User.objects.create_user(
+            username='reader',
+            password='testpass123',
+            email='reader@example.com'
+        )
+        self.client.force_authenticate(user=self.reader)
+        self.book = Book.objects.create(
+            title="Test Book",
+            description="Test Description",
+            author="Test Author",
+            publisher=self.publisher,
+        )
+
+    def test_list_is_served_from_cache_until_a_review_is_written(self):
+        url = reverse('book-list')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        Review.objects.create(book=self.book, user=self.reader, rating=5, content='Great')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['review_count'], 1)
+
+    def test_detail_is_invalidated_when_the_book_changes(self):
+        url = reverse('book-detail', kwargs={'pk': self.book.id})
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        self.book.title = "Renamed Book"
+        self.book.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['title'], "Renamed Book")
+
+    def test_query_parameters_are_part_of_the_key(self):
+        url = reverse('book-list')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url, {'q': 'test'})['X-Cache'], 'MISS')
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = User.objects.create_user(
+            username='publisher',
+            password='testpass123',
+            email='publisher@example.com'
+        )
+        self.reader = User.objects.create_user(
+            username='reader',
+            password='testpass123',
+            email='reader@example.com'
+        )
+        self.client.force_authenticate(user=self.reader)
+        self.book = Book.objects.create(
+            title="Test Book",
+            description="Test Description",
+            author="Test Author",
+            publisher=self.publisher,
+        )
+
+    def test_unchanged_reviews_return_not_modified(self):
+        url = reverse('book-reviews', kwargs={'book_id': self.book.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        Review.objects.create(book=self.book, user=self.reader, rating=4, content='Good')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_book_detail_honours_if_modified_since(self):
+        url = reverse('book-detail', kwargs={'pk': self.book.id})
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_depends_on_query_parameters(self):
+        url = reverse('book-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, {'page_size': 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_username_change_invalidates_cached_reviews(self):
+        Review.objects.create(book=self.book, user=self.reader, rating=4, content='Good')
+        url = reverse('book-reviews', kwargs={'book_id': self.book.id})
+        etag = self.client.get(url)['ETag']
+
+        reader = User.objects.get(pk=self.reader.pk)
+        reader.username = 'renamed'
+        reader.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['user'], 'renamed')
+
+
+class BulkViewsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            email='testuser@example.com'
+        )
+        self.publisher = User.objects.create_user(
+            username='publisher',
+            password='testpass123',
+            email='publisher@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Existing Book",
+            description="Existing Description",
+            author="Existing Author",
+            publisher=self.publisher,
+        )
+
+    def book_item(self, i):
+        return {"title": f"Bulk Book {i}", "description": "Bulk Description", "author": "Bulk Author"}
+
+    def test_bulk_create_books_reports_each_item(self):
+        items = [
+            self.book_item(1),
+            {"title": "Existing Book", "description": "Existing Description", "author": "Existing Author"},
+            self.book_item(1),
+            {"title": "No", "description": "Bulk Description", "author": "Bulk Author"},
+        ]
+        response = self.client.post(reverse('book-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['created', 'duplicate', 'duplicate', 'invalid'])
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['failed'], 3)
+        created = Book.objects.get(pk=response.data['results'][0]['id'])
+        self.assertEqual(created.publisher, self.user)
+
+    def test_bulk_query_count_is_per_chunk(self):
+        url = reverse('book-bulk')
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(url, [self.book_item(i) for i in range(5)], format='json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(url, [self.book_item(i) for i in range(5, 45)], format='json')
+        self.assertEqual(len(few), len(many))
+
+    def test_bulk_update_only_touches_own_books(self):
+        own = Book.objects.create(
+            title="Own Book", description="Own Description", author="Own Author", publisher=self.user
+        )
+        items = [{"id": own.id, "title": "Renamed Book"}, {"id": self.book.id, "title": "Stolen Book"}]
+        response = self.client.post(reverse('book-bulk'), items, format='json')
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['updated', 'not_found'])
+        own.refresh_from_db()
+        self.assertEqual(own.title, "Renamed Book")
+
+    def test_bulk_reviews_from_ndjson_stream_update_counters(self):
+        other = Book.objects.create(
+            title="Own Book", description="Own Description", author="Own Author", publisher=self.user
+        )
+        lines = [
+            {"book": self.book.id, "rating": 4, "content": "Good"},
+            {"book": self.book.id, "rating": 5, "content": "Again"},
+            {"book": other.id, "rating": 5, "content": "Mine"},
+            {"book": 0, "rating": 5, "content": "Missing"},
+        ]
+        body = "\n".join(json.dumps(line) for line in lines)
+        response = self.client.post(
+            reverse('review-bulk'), body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['created', 'duplicate', 'invalid', 'invalid'])
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.review_count, self.book.rating_sum), (1, 4))
+
+    def post_ndjson(self, lines):
+        return self.client.post(reverse('book-bulk'), "\n".join(lines), content_type='application/x-ndjson')
+
+    @mock.patch.object(BookBulkView, 'chunk_size', 2)
+    def test_bulk_stream_failing_after_a_chunk_reports_the_written_items(self):
+        lines = [json.dumps(self.book_item(i)) for i in range(3)] + ['{"title": ', json.dumps(self.book_item(4))]
+        response = self.post_ndjson(lines)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['created', 'created', 'created', 'stopped'])
+        stopped = response.data['results'][3]
+        self.assertEqual(stopped['index'], 3)
+        self.assertIn('NDJSON parse error on line 4', stopped['errors']['non_field_errors'][0])
+        self.assertEqual((response.data['created'], response.data['failed']), (3, 1))
+        self.assertEqual(Book.objects.filter(title__startswith='Bulk Book').count(), 3)
+
+    @mock.patch.object(BookBulkView, 'chunk_size', 2)
+    @mock.patch.object(BookBulkView, 'max_items', 3)
+    def test_bulk_stream_over_the_limit_stops_at_the_first_extra_item(self):
+        response = self.post_ndjson([json.dumps(self.book_item(i)) for i in range(5)])
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['created', 'created', 'created', 'stopped'])
+        self.assertEqual(
+            response.data['results'][3]['errors'], {'non_field_errors': ['At most 3 items can be sent at once.']}
+        )
+
+    def test_bulk_rejects_non_list_payload(self):
+        response = self.client.post(reverse('comment-bulk'), {"content": "x"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            email='admin@example.com',
+            is_staff=True,
+        )
+        self.reader = User.objects.create_user(
+            username='reader',
+            password='testpass123',
+            email='reader@example.com'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                description="Some, \"quoted\" description",
+                author="Some Author",
+                publisher=self.admin,
+            )
+            for i in range(3)
+        ]
+        Review.objects.create(book=self.books[0], user=self.reader, rating=4, content='Good')
+
+    def test_export_reviews_as_ndjson(self):
+        response = self.client.get(reverse('export', kwargs={'dataset': 'reviews'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['rating'], 4)
+        self.assertEqual(rows[0]['book_id'], self.books[0].id)
+
+    def test_export_books_as_gzipped_csv(self):
+        response = self.client.get(
+            reverse('export', kwargs={'dataset': 'books'}), {'output': 'csv', 'compress': 'gzip'}
+        )
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['title'] for row in rows], ['Book 0', 'Book 1', 'Book 2'])
+        self.assertEqual(rows[0]['description'], 'Some, "quoted" description')
+        self.assertEqual(rows[0]['review_count'], '1')
+
+    def test_incremental_export(self):
+        cutoff = timezone.now()
+        Book.objects.filter(pk=self.books[1].pk).update(updated_at=cutoff + timedelta(seconds=1))
+        response = self.client.get(
+            reverse('export', kwargs={'dataset': 'books'}), {'since': cutoff.isoformat()}
+        )
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.books[1].id])
+
+    def test_incremental_export_includes_counter_changes(self):
+        cutoff = timezone.now()
+        Review.objects.create(book=self.books[2], user=self.reader, rating=5, content='Great')
+        response = self.client.get(
+            reverse('export', kwargs={'dataset': 'books'}), {'since': cutoff.isoformat()}
+        )
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(row['id'], row['review_count']) for row in rows], [(self.books[2].id, 1)])
+
+    def test_out_of_range_since_is_rejected(self):
+        response = self.client.get(reverse('export', kwargs={'dataset': 'books'}), {'since': '2024-13-01T00:00:00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', response.data)
+
+    def test_export_requires_staff(self):
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse('export', kwargs={'dataset': 'books'}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_catalog_command(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            call_command('export_catalog', '--output-dir', output_dir, stderr=io.StringIO())
+            with open(os.path.join(output_dir, 'comments.ndjson')) as comments:
+                self.assertEqual(comments.read(), '')
+            with open(os.path.join(output_dir, 'books.ndjson')) as books:
+                self.assertEqual(len(books.readlines()), 3)
+
+    def test_export_catalog_command_rejects_out_of_range_since(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            with self.assertRaisesMessage(CommandError, '--since must be an ISO 8601 date and time.'):
+                call_command('export_catalog', '--output-dir', output_dir, '--since', '2024-13-01T00:00:00')
+
+
+class TopBooksViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = User.objects.create_user(
+            username='publisher', password='testpass123', email='publisher@example.com'
+        )
+        self.readers = [
+            User.objects.create_user(
+                username=f'reader{i}', password='testpass123', email=f'reader{i}@example.com'
+            )
+            for i in range(5)
+        ]
+        self.client.force_authenticate(user=self.publisher)
+        self.lucky, self.solid, self.unrated = [
+            Book.objects.create(
+                title=f"Book {i}",
+                description="Some description",
+                author="Some Author",
+                publisher=self.publisher,
+            )
+            for i in range(3)
+        ]
+        # One 5-star review must not outrank five 4-star ones.
+        Review.objects.create(book=self.lucky, user=self.readers[0], rating=5, content='Great')
+        for reader in self.readers:
+            Review.objects.create(book=self.solid, user=reader, rating=4, content='Good')
+
+    def test_books_are_ranked_by_weighted_rating(self):
+        response = self.client.get(reverse('book-top'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([book['id'] for book in results], [self.solid.id, self.lucky.id])
+        self.assertEqual(results[0]['rating_histogram']['4'], 5)
+        self.assertAlmostEqual(results[1]['average_rating'], 5.0)
+
+    def test_trending_ranking_uses_refreshed_scores(self):
+        Review.objects.filter(book=self.solid).update(created_at=timezone.now() - timedelta(days=60))
+        out = io.StringIO()
+        call_command('refresh_trending_books', stdout=out)
+        # The tests run with per-process caches.
+        self.assertIn("were not invalidated", out.getvalue())
+
+        response = self.client.get(reverse('book-top'), {'ranking': 'trending'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['id'] for book in response.data['results']], [self.lucky.id])
+        self.assertGreater(response.data['results'][0]['trending_score'], 0)
+
+    def test_unknown_ranking_is_rejected(self):
+        response = self.client.get(reverse('book-top'), {'ranking': 'random'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_only_the_selected_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-top'), {'fields': 'id,rating_histogram'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'rating_histogram'])
+        self.assertEqual(response.data['results'][0]['rating_histogram']['4'], 5)
+        sql = queries[-1]['sql']
+        self.assertNotIn('description', sql)
+        self.assertNotIn('JOIN', sql)
+
+
+class SimilarBooksViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = User.objects.create_user(
+            username='publisher', password='testpass123', email='publisher@example.com'
+        )
+        self.readers = User.objects.bulk_create(
+            User(username=f'reader{i}', email=f'reader{i}@example.com') for i in range(3)
+        )
+        self.client.force_authenticate(user=self.publisher)
+        self.book, self.close, self.far, self.unrelated = [
+            Book.objects.create(
+                title=f"Book {i}",
+                description="Some description",
+                author="Some Author",
+                publisher=self.publisher,
+            )
+            for i in range(4)
+        ]
+        ratings = {
+            self.book: (5, 4, 0),
+            self.close: (5, 3, 0),
+            self.far: (1, 0, 5),
+            self.unrelated: (0, 0, 0),
+        }
+        for book, book_ratings in ratings.items():
+            for reader, rating in zip(self.readers, book_ratings):
+                if rating:
+                    Review.objects.create(book=book, user=reader, rating=rating, content='Review')
+        call_command('refresh_similar_books', stdout=io.StringIO())
+
+    def test_similar_books_are_ordered_by_similarity(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('book-similar', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['id'] for book in response.data], [self.close.id, self.far.id])
+        self.assertEqual(response.data[0]['title'], 'Book 1')
+        self.assertGreater(response.data[0]['similarity'], response.data[1]['similarity'])
+
+    def test_only_the_selected_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-similar', args=[self.book.id]), {'fields': 'id,similarity'})
+        self.assertEqual([list(book) for book in response.data], [['id', 'similarity']] * 2)
+        sql = queries[-1]['sql']
+        self.assertNotIn('description', sql)
+        self.assertNotIn('JOIN', sql)
+
+    def test_deleted_neighbours_are_skipped(self):
+        self.close.delete()
+        response = self.client.get(reverse('book-similar', args=[self.book.id]))
+        self.assertEqual([book['id'] for book in response.data], [self.far.id])
+
+    def test_books_without_neighbours(self):
+        response = self.client.get(reverse('book-similar', args=[self.unrelated.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+        response = self.client.get(reverse('book-similar', args=[self.unrelated.id + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+def make_image_file(name='cover.png', size=(1200, 1800), color='red', image_format='PNG'):
+    output = io.BytesIO()
+    Image.new('RGBA', size, color).save(output, image_format)
+    return SimpleUploadedFile(name, output.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+class BookCoverTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, COVER_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass123', email='testuser@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create_book(self, title, cover):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('book-list'), {
+                'title': title,
+                'description': 'Some description',
+                'author': 'Some Author',
+                'cover_image': cover,
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Book.objects.get(pk=response.data['id'])
+
+    def test_upload_generates_resized_variants(self):
+        book = self.create_book('Covered Book', make_image_file())
+        self.assertEqual(len(book.cover_hash), 64)
+        for size, box in COVER_SIZES.items():
+            for cover_format in COVER_FORMATS:
+                with default_storage.open(cover_variant_name(book.cover_hash, size, cover_format)) as file:
+                    with Image.open(file) as image:
+                        self.assertEqual(image.format.lower(), cover_format)
+                        self.assertLessEqual(image.size, box)
+
+        response = self.client.get(reverse('book-detail', kwargs={'pk': book.pk}))
+        self.assertTrue(response.data['cover_image'].startswith('http://testserver/'))
+        self.assertTrue(response.data['covers']['thumbnail']['webp'].endswith(
+            cover_variant_name(book.cover_hash, 'thumbnail', 'webp')
+        ))
+
+    def test_duplicate_covers_share_variants(self):
+        first = self.create_book('First Book', make_image_file())
+        variants = default_storage.listdir(f'book_covers/variants/{first.cover_hash[:2]}/{first.cover_hash}')[1]
+        second = self.create_book('Second Book', make_image_file(name='same.png'))
+        self.assertEqual(first.cover_hash, second.cover_hash)
+        self.assertEqual(
+            default_storage.listdir(f'book_covers/variants/{first.cover_hash[:2]}/{first.cover_hash}')[1],
+            variants,
+        )
+
+    def test_replacing_cover_resets_variants_until_processed(self):
+        book = self.create_book('Covered Book', make_image_file())
+        old_hash = book.cover_hash
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.patch(
+                reverse('book-detail', kwargs={'pk': book.pk}),
+                {'cover_image': make_image_file(color='blue')},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        book.refresh_from_db()
+        self.assertEqual(book.cover_hash, '')
+        for callback in callbacks:
+            callback()
+        book.refresh_from_db()
+        self.assertNotIn(book.cover_hash, ('', old_hash))
+
+    def test_regenerate_book_covers_command(self):
+        book = self.create_book('Covered Book', make_image_file())
+        Book.objects.filter(pk=book.pk).update(cover_hash='')
+        call_command('regenerate_book_covers', '--missing', stdout=io.StringIO())
+        book.refresh_from_db()
+        self.assertEqual(len(book.cover_hash), 64)
+
+
+class BoundedUploadTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, COVER_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass123', email='testuser@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def post_cover(self, cover):
+        return self.client.post(reverse('book-list'), {
+            'title': 'Covered Book',
+            'description': 'Some description',
+            'author': 'Some Author',
+            'cover_image': cover,
+        })
+
+    def noise_image(self, size=(200, 200)):
+        output = io.BytesIO()
+        Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(output, 'PNG')
+        return SimpleUploadedFile('noise.png', output.getvalue(), content_type='image/png')
+
+    def test_request_over_announced_limit_is_refused(self):
+        with mock.patch.object(BookListCreateView, 'upload_max_size', 1000):
+            response = self.post_cover(self.noise_image())
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Book.objects.exists())
+
+    def test_file_over_limit_is_refused_while_streaming(self):
+        # The request fits the Content-Length allowance, the file does not.
+        with mock.patch.object(BookListCreateView, 'upload_max_size', 100_000):
+            response = self.post_cover(self.noise_image())
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn('Files may not exceed', response.data['detail'])
+        self.assertFalse(Book.objects.exists())
+
+    def test_non_image_is_rejected(self):
+        response = self.post_cover(SimpleUploadedFile('cover.png', b'not an image' * 100, content_type='image/png'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cover_image', response.data)
+
+    def test_unsupported_format_is_rejected(self):
+        response = self.post_cover(make_image_file(name='cover.gif', image_format='GIF'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('GIF', str(response.data['cover_image']))
+
+    def test_decompression_bomb_is_rejected_from_header(self):
+        output = io.BytesIO()
+        Image.new('1', (6000, 6000)).save(output, 'PNG')
+        response = self.post_cover(SimpleUploadedFile('bomb.png', output.getvalue(), content_type='image/png'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', str(response.data['cover_image']))
+
+    def test_valid_cover_is_accepted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_cover(make_image_file(size=(300, 450)))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Book.objects.get(pk=response.data['id']).cover_hash)
+
+
+class AsyncReadViewsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = User.objects.create_user(
+            username='publisher', password='testpass123', email='publisher@example.com'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', password='testpass123', email='reader@example.com'
+        )
+        self.client.force_authenticate(user=self.reader)
+        self.async_client = AsyncClient()
+        self.auth_headers = {'Authorization': f'Bearer {AccessToken.for_user(self.reader)}'}
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                description="Some description",
+                author="Some Author",
+                publisher=self.publisher,
+            )
+            for i in range(12)
+        ]
+        self.review = Review.objects.create(book=self.books[0], user=self.reader, rating=4, content='Good')
+        self.comment = Comment.objects.create(book=self.books[0], user=self.reader, content='Nice')
+
+    def urls(self):
+        book = self.books[0]
+        return [
+            reverse('book-list'),
+            reverse('book-list') + '?page=2',
+            reverse('book-list') + '?count=false&page=2',
+            reverse('book-list') + '?cursor=',
+            reverse('book-list') + '?q=book',
+            reverse('book-list') + f'?ids={self.books[3].pk},{book.pk},0&fields=id,title',
+            reverse('book-detail', kwargs={'pk': book.pk}),
+            reverse('book-reviews', kwargs={'book_id': book.pk}) + '?expand=user',
+            reverse('review-detail', kwargs={'book_id': book.pk, 'pk': self.review.pk}),
+            reverse('book-comments', kwargs={'book_id': book.pk}),
+            reverse('book-comments', kwargs={'book_id': book.pk}) + f'?ids={self.comment.pk}',
+            reverse('comment-detail', kwargs={'book_id': book.pk, 'pk': self.comment.pk}),
+        ]
+
+    async def test_async_views_match_sync_views(self):
+        for url in await sync_to_async(self.urls)():
+            with self.subTest(url=url):
+                expected = await sync_to_async(self.client.get)(url)
+                with override_settings(ROOT_URLCONF='book_reviews.asgi_urls'):
+                    response = await self.async_client.get(url, headers=self.auth_headers)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.json(), expected.json())
+                self.assertEqual(response['ETag'], expected['ETag'])
+
+    @override_settings(ROOT_URLCONF='book_reviews.asgi_urls')
+    async def test_async_views_answer_not_modified_and_not_found(self):
+        url = reverse('book-detail', kwargs={'pk': self.books[0].pk})
+        response = await self.async_client.get(url, headers=self.auth_headers)
+        response = await self.async_client.get(url, headers={**self.auth_headers, 'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await self.async_client.get(reverse('book-detail', kwargs={'pk': 0}), headers=self.auth_headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(ROOT_URLCONF='book_reviews.asgi_urls')
+    async def test_writes_fall_through_to_sync_views(self):
+        response = await self.async_client.post(
+            reverse('book-comments', kwargs={'book_id': self.books[1].pk}),
+            {'content': 'Async route'},
+            content_type='application/json',
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(await Comment.objects.filter(content='Async route').acount(), 1)
+
+
+@skipUnless('replica' in settings.DATABASE_REPLICAS, "needs a 'replica' alias (DATABASE_REPLICAS=replica)")
+class ReplicaRoutingTest(TestCase):
+    """The replica is a separate, empty test database: reads served from it find nothing."""
+    # Only aliases that exist: the runner collects this even when the class is skipped.
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.publisher = User.objects.create_user(
+            username='publisher', password='testpass123', email='publisher@example.com'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', password='testpass123', email='reader@example.com'
+        )
+        self.client.force_authenticate(user=self.reader)
+        self.book = Book.objects.create(
+            title="Primary Book",
+            description="Some description",
+            author="Some Author",
+            publisher=self.publisher,
+        )
+
+    def later(self, seconds=60):
+        """Make every version scope look last written ``seconds`` ago to the router."""
+        clock = mock.Mock(time=mock.Mock(return_value=time.time() + seconds))
+        return mock.patch('books.routing.time', clock)
+
+    def list_count(self):
+        return self.client.get(reverse('book-reviews', kwargs={'book_id': self.book.pk})).data['count']
+
+    def test_reads_stay_on_primary_right_after_a_write(self):
+        Review.objects.create(book=self.book, user=self.reader, rating=4, content='Good')
+        self.assertEqual(self.list_count(), 1)
+
+    def test_reads_of_settled_scopes_go_to_a_replica(self):
+        Review.objects.create(book=self.book, user=self.reader, rating=4, content='Good')
+        with self.later():
+            self.assertEqual(self.list_count(), 0)
+            response = self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_writer_is_pinned_to_primary(self):
+        response = self.client.post(
+            reverse('book-comments', kwargs={'book_id': self.book.pk}), {'content': 'Nice'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        other = APIClient()
+        other.force_authenticate(user=self.publisher)
+        with self.later():
+            response = self.client.get(reverse('book-comments', kwargs={'book_id': self.book.pk}))
+            self.assertEqual(response.data['count'], 1)
+            response = other.get(reverse('book-comments', kwargs={'book_id': self.book.pk}))
+            self.assertEqual(response.data['count'], 0)
+
+    @override_settings(ROOT_URLCONF='book_reviews.asgi_urls')
+    async def test_async_reads_follow_the_same_routing(self):
+        await Comment.objects.acreate(book=self.book, user=self.reader, content='Nice')
+        url = reverse('book-comments', kwargs={'book_id': self.book.pk})
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.reader)}'}
+        response = await AsyncClient().get(url, headers=headers)
+        self.assertEqual(response.json()['count'], 1)
+        with self.later():
+            response = await AsyncClient().get(url, headers=headers)
+        self.assertEqual(response.json()['count'], 0)
+
+
+class SlidingWindowThrottleTest(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='reader', password='testpass123', email='reader@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title='Book', description='Some description', author='Some Author', publisher=self.user
+        )
+        self.clock = [6000.0]
+        timer = mock.patch.object(SlidingWindowRateThrottle, 'timer', lambda throttle: self.clock[0])
+        rates = mock.patch.object(
+            ScopedRateThrottle, 'THROTTLE_RATES', {**ScopedRateThrottle.THROTTLE_RATES, 'books': '3/min'}
+        )
+        timer.start()
+        rates.start()
+        self.addCleanup(timer.stop)
+        self.addCleanup(rates.stop)
+
+    def statuses(self, count, url=None):
+        url = url or reverse('book-list')
+        return [self.client.get(url).status_code for _ in range(count)]
+
+    def test_rate_is_enforced_per_endpoint_scope(self):
+        self.assertEqual(self.statuses(3), [status.HTTP_200_OK] * 3)
+        response = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # The next window, plus a third of it for the 3 requests to decay to 2.
+        self.assertEqual(response['Retry-After'], '80')
+        # Reviews are throttled separately.
+        self.assertEqual(self.statuses(1, reverse('book-reviews', args=[self.book.pk])), [status.HTTP_200_OK])
+
+    def test_previous_window_counts_in_proportion_to_overlap(self):
+        self.statuses(3)
+        # Half of the previous window still overlaps: 1.5 + 1 fits, 1.5 + 2 does not.
+        self.clock[0] += 90
+        self.assertEqual(self.statuses(2), [status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+        self.clock[0] += 60
+        self.assertEqual(self.statuses(3), [status.HTTP_200_OK] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_refused_requests_are_not_counted(self):
+        self.statuses(10)
+        self.assertEqual(caches['throttle'].get(f'throttle_books_{self.user.pk}:100'), 3)
+        self.clock[0] += 120
+        self.assertEqual(self.statuses(3), [status.HTTP_200_OK] * 3)
+
+    def test_refusal_survives_an_expired_counter(self):
+        self.statuses(3)
+        # The counter expires between the increment and the refusal.
+        with mock.patch.object(SlidingWindowRateThrottle.cache, 'decr', side_effect=ValueError):
+            self.assertEqual(self.statuses(1), [status.HTTP_429_TOO_MANY_REQUESTS])
@@ -0,0 +1,85 @@
+"""Constant-space rate limiting with sliding-window counters.
+
+DRF's throttles keep the timestamp of every request in the window under one
+cache key and rewrite the whole list on each request. These keep two
+counters per client instead, for the current and the previous fixed window,
+and estimate the requests in the sliding window as the current count plus
+the part of the previous count that still overlaps it. Counters are bumped
+with the cache's atomic ``incr``, so with a shared cache (``CACHE_URL``)
+every process enforces the same limit. With per-process caches
+(``LOCAL_CACHES``) each process counts on its own, and a client gets the
+rate once per process.
+"""
+from django.core.cache import caches
+from rest_framework import throttling
+
+THROTTLE_CACHE_ALIAS = 'throttle'
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    cache = caches[THROTTLE_CACHE_ALIAS]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, self.elapsed = divmod(self.now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        self.current = self.increment(current_key)
+        self.previous = self.cache.get(f'{self.key}:{int(window) - 1}', 0)
+        if self.estimate() > self.num_requests:
+            # Refused requests do not count against the client.
+            self.decrement(current_key)
+            self.current -= 1
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def increment(self, key):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Kept for two windows, while it is the current or previous one.
+            if self.cache.add(key, 1, timeout=2 * self.duration):
+                return 1
+            return self.cache.incr(key)
+
+    def decrement(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            # The counter expired or was evicted since; nothing to take back.
+            pass
+
+    def estimate(self):
+        return self.previous * (1 - self.elapsed / self.duration) + self.current
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        # Time until the estimate has room for one more request, assuming no
+        # other requests arrive meanwhile.
+        room = self.num_requests - 1 - self.current
+        if room < 0:
+            # Wait for the next window and for enough of this one to age out.
+            return self.duration - self.elapsed + self.duration * (1 - (self.num_requests - 1) / self.current)
+        if not self.previous:
+            return 0
+        return max(self.duration * (1 - room / self.previous) - self.elapsed, 0)
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class UserRateThrottle(throttling.UserRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle, SlidingWindowRateThrottle):
+    """Per-endpoint limits, from the rate of the view's ``throttle_scope``."""
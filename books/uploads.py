@@ -0,0 +1,125 @@
+import io
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, UnidentifiedImageError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+# Non-file form fields and multipart framing allowed on top of the files
+# when checking the announced Content-Length.
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# Most headers fit in the first chunk; JPEGs with large EXIF blocks may
+# need a few more before the frame size is known.
+IMAGE_HEADER_LIMIT = 512 * 1024
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The upload is too large.'
+    default_code = 'upload_too_large'
+
+
+class UploadLimits:
+    """Bounds applied to the files of one multipart request.
+
+    Views opt into their own limits with ``upload_max_size`` (bytes per
+    file), ``upload_max_pixels``, ``upload_max_files`` and
+    ``upload_image_formats`` attributes; the defaults come from settings.
+    """
+
+    def __init__(self, max_size=None, max_pixels=None, max_files=None, image_formats=None):
+        self.max_size = max_size or settings.UPLOAD_MAX_SIZE
+        self.max_pixels = max_pixels or settings.UPLOAD_MAX_PIXELS
+        self.max_files = max_files or settings.UPLOAD_MAX_FILES
+        self.image_formats = frozenset(image_formats or settings.UPLOAD_IMAGE_FORMATS)
+
+    @classmethod
+    def for_view(cls, view):
+        return cls(
+            max_size=getattr(view, 'upload_max_size', None),
+            max_pixels=getattr(view, 'upload_max_pixels', None),
+            max_files=getattr(view, 'upload_max_files', None),
+            image_formats=getattr(view, 'upload_image_formats', None),
+        )
+
+    @property
+    def max_request_size(self):
+        return self.max_size * self.max_files + UPLOAD_FORM_OVERHEAD
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploaded images to temporary files, rejecting bad ones early.
+
+    Nothing is buffered in memory beyond the image header. The request is
+    refused before its body is read when the announced Content-Length is
+    over the limits, and a file is abandoned as soon as it grows past
+    ``max_size`` or its header shows an unsupported format or too many
+    pixels, so oversized or malicious uploads never reach the disk in full
+    or get decoded.
+    """
+
+    def __init__(self, request=None, limits=None):
+        super().__init__(request)
+        self.limits = limits or UploadLimits()
+        self.file_count = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > self.limits.max_request_size:
+            raise UploadTooLarge(
+                f'The request body may not exceed {self.limits.max_request_size} bytes.'
+            )
+        return None
+
+    def new_file(self, field_name, *args, **kwargs):
+        self.file_count += 1
+        if self.file_count > self.limits.max_files:
+            raise ValidationError({field_name: [f'At most {self.limits.max_files} file(s) may be uploaded.']})
+        super().new_file(field_name, *args, **kwargs)
+        self.header = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.limits.max_size:
+            self.reject(UploadTooLarge(f'Files may not exceed {self.limits.max_size} bytes.'))
+        if self.header is not None:
+            self.header += raw_data
+            self.check_header(final=False)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.header is not None:
+            self.check_header(final=True)
+        return super().file_complete(file_size)
+
+    def check_header(self, final):
+        """Validate the format and dimensions once the image header has arrived.
+
+        Only the header is parsed; the pixel data is never decoded here.
+        """
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                with Image.open(io.BytesIO(self.header)) as image:
+                    image_format, (width, height) = image.format, image.size
+        except Image.DecompressionBombError:
+            width = height = None
+            image_format = None
+        except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+            if not final and len(self.header) < IMAGE_HEADER_LIMIT:
+                return
+            self.reject(self.invalid('Upload a valid image.'))
+        self.header = None
+        if image_format is not None and image_format not in self.limits.image_formats:
+            self.reject(self.invalid(
+                f"Unsupported image format {image_format}; use one of {', '.join(sorted(self.limits.image_formats))}."
+            ))
+        if width is None or width * height > self.limits.max_pixels:
+            self.reject(self.invalid(f'Images may not exceed {self.limits.max_pixels} pixels.'))
+
+    def invalid(self, message):
+        return ValidationError({self.field_name: [message]})
+
+    def reject(self, exc):
+        self.upload_interrupted()
+        raise exc
@@ -3,15 +3,24 @@ from django.urls import path
 from .views import (
     BookListCreateView,
     BookDetailView,
+    TopBooksView,
+    SimilarBooksView,
     ReviewListCreateView,
     ReviewDetailView,
     CommentListCreateView,
     CommentDetailView,
+    BookBulkView,
+    ReviewBulkView,
+    CommentBulkView,
+    ExportView,
 )
 
 urlpatterns = [
     path("books/", BookListCreateView.as_view(), name="book-list"),
+    path("books/bulk/", BookBulkView.as_view(), name="book-bulk"),
+    path("books/top/", TopBooksView.as_view(), name="book-top"),
     path("books/<int:pk>/", BookDetailView.as_view(), name="book-detail"),
+    path("books/<int:pk>/similar/", SimilarBooksView.as_view(), name="book-similar"),
     path(
         "books/<int:book_id>/reviews/",
         ReviewListCreateView.as_view(),
@@ -32,4 +41,7 @@ urlpatterns = [
         CommentDetailView.as_view(),
         name="comment-detail",
     ),
+    path("reviews/bulk/", ReviewBulkView.as_view(), name="review-bulk"),
+    path("comments/bulk/", CommentBulkView.as_view(), name="comment-bulk"),
+    path("export/<str:dataset>/", ExportView.as_view(), name="export"),
 ]
@@ -1,19 +1,161 @@
+import datetime
+
 from rest_framework import generics
-from .models import Book, Review, Comment
-from .serializers import BookSerializer, ReviewSerializer, CommentSerializer
-from .paginations import BookPagination, ReviewPagination, CommentPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser
+from rest_framework.views import APIView
+from .models import Book, BookSimilarity, Review, Comment
+from .serializers import (
+    BookSerializer, TopBookSerializer, SimilarBookSerializer, ReviewSerializer, CommentSerializer,
+)
+from .paginations import BookPagination, TopBookPagination, ReviewPagination, CommentPagination
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.negotiation import BaseContentNegotiation
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from .permissions import IsBookPublisherOrReadOnly, IsOwnerOrReadOnly
+from .search import search_books
+from .caching import BOOK_LIST_SCOPE, ConditionalGetMixin, VersionedCacheMixin, book_scope
+from .bulk import BookBulkWriter, ReviewBulkWriter, CommentBulkWriter, item_result
+from .parsers import NDJSONParser
+from .routing import ReplicaReadMixin
+from .fieldsets import SparseFieldsetViewMixin
+from .filtering import CREATED_AT_FILTER_PARAMS, FilterParam, IndexedFilterMixin, parse_number
+from .rows import BookRows, CommentRows, ReviewRows, RowListMixin
+from users.authentication import full_user
+from book_reviews.middleware import SerializerTimingMixin
+from .exporters import DATASETS, EXPORT_FORMATS, export, export_filename
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ParseError
 from rest_framework.validators import ValidationError
 
+# Columns rendered by ReviewSerializer/CommentSerializer, including the
+# related ``user.username`` and ``book.title`` pulled in by select_related().
+RELATED_LIST_FIELDS = ("book__id", "book__title", "user__id", "user__username")
+REVIEW_LIST_FIELDS = ("id", "book", "user", "rating", "content", "created_at", "updated_at", *RELATED_LIST_FIELDS)
+COMMENT_LIST_FIELDS = ("id", "book", "user", "content", "created_at", "updated_at", *RELATED_LIST_FIELDS)
+
+
+def save_unique_book(serializer, **kwargs):
+    # The unique (title, author) constraint is the duplicate check; the
+    # savepoint keeps an enclosing transaction usable after a violation.
+    try:
+        with transaction.atomic():
+            serializer.save(**kwargs)
+    except IntegrityError:
+        # Any other violation, e.g. of a foreign key, is not a duplicate.
+        book = serializer.instance
+        title = serializer.validated_data.get('title', book.title if book else None)
+        author = serializer.validated_data.get('author', book.author if book else None)
+        duplicates = Book.objects.filter(title=title, author=author)
+        if book is not None and book.pk is not None:
+            duplicates = duplicates.exclude(pk=book.pk)
+        if not duplicates.exists():
+            raise
+        raise ValidationError({"detail": "A book with this title and author already exists."})
+
+
+class IdListMixin:
+    """Serve ``?ids=3,1,2`` on a list view: those items only, in one query.
+
+    The response has the items in the order of the ids, without pagination,
+    and the ids that matched nothing (or nothing the other filters allow)
+    under ``missing``.
+    """
+    ids_query_param = 'ids'
+    max_ids = 100
+
+    def get_requested_ids(self):
+        """Return the ids of ``?ids=`` without duplicates, or ``None`` without the parameter."""
+        value = self.request.query_params.get(self.ids_query_param)
+        if value is None:
+            return None
+        try:
+            ids = list(dict.fromkeys(int(item) for item in value.split(',') if item.strip()))
+        except ValueError:
+            raise ValidationError({self.ids_query_param: ["Expected a comma-separated list of integer ids."]})
+        if len(ids) > self.max_ids:
+            raise ValidationError({self.ids_query_param: [f"At most {self.max_ids} ids can be requested at once."]})
+        return ids
+
+    def get_ids_queryset(self, ids):
+        """Return the queryset of the items, as rows when the view builds its list from rows."""
+        queryset = self.filter_queryset(self.get_queryset()).filter(pk__in=ids).order_by()
+        self.ids_rows = self.get_list_rows() if isinstance(self, RowListMixin) else None
+        return self.ids_rows.values(queryset) if self.ids_rows is not None else queryset
 
-class BookListCreateView(generics.ListCreateAPIView):
-    queryset = Book.objects.all()
+    def get_ids_response(self, ids, items):
+        if self.ids_rows is not None:
+            found = {row['id']: row for row in items}
+            data = self.build_rows(self.ids_rows, [found[pk] for pk in ids if pk in found])
+        else:
+            found = {item.pk: item for item in items}
+            data = self.get_serializer([found[pk] for pk in ids if pk in found], many=True).data
+        return Response({'results': data, 'missing': [pk for pk in ids if pk not in found]})
+
+    def list(self, request, *args, **kwargs):
+        ids = self.get_requested_ids()
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.get_ids_queryset(ids)
+        return self.get_ids_response(ids, list(queryset) if ids else [])
+
+
+class CoverUploadMixin:
+    # Limits of BoundedMultiPartParser for the cover_image upload.
+    upload_max_size = settings.COVER_UPLOAD_MAX_SIZE
+    upload_max_pixels = settings.COVER_UPLOAD_MAX_PIXELS
+    upload_max_files = 1
+
+
+class BookListCreateView(
+    SerializerTimingMixin, ReplicaReadMixin, CoverUploadMixin, ConditionalGetMixin, VersionedCacheMixin, IdListMixin,
+    RowListMixin, SparseFieldsetViewMixin, IndexedFilterMixin, generics.ListCreateAPIView,
+):
+    """Books, oldest first; filters and orderings are listed in ``filter_params`` and ``orderings``.
+
+    ``author`` and ``publisher`` combine with ``newest``/``oldest`` and a
+    ``created_after``/``created_before`` range; ``min_rating`` combines with
+    ``highest_rated`` only (see books.filtering).
+    """
+    queryset = Book.objects.select_related('publisher').defer('search_vector')
     serializer_class = BookSerializer
+    row_class = BookRows
     pagination_class = BookPagination
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'books'
+    search_query_param = 'q'
+    filter_params = {
+        'author': FilterParam('author'),
+        'publisher': FilterParam('publisher', parse=int, expected='a user id'),
+        **CREATED_AT_FILTER_PARAMS,
+        'min_rating': FilterParam('average_rating', 'gte', parse_number, 'a number'),
+    }
+    orderings = {**IndexedFilterMixin.orderings, 'highest_rated': ('-average_rating', 'id')}
+
+    def get_version_scopes(self):
+        return [BOOK_LIST_SCOPE]
+
+    def filter_queryset(self, queryset):
+        if self.request.query_params.get(self.search_query_param, '').strip():
+            # Search results come from the search index in rank order.
+            if self.has_filter_params():
+                raise ValidationError({"detail": "Search results cannot be filtered or ordered."})
+            # A cursor would re-sort them by date and lose the rank.
+            if self.paginator.cursor_query_param in self.request.query_params:
+                raise ValidationError({"detail": "Search results cannot be paged with a cursor."})
+            return queryset
+        return super().filter_queryset(queryset)
+
+    def get_queryset(self):
+        queryset = self.narrow_to_fields(super().get_queryset())
+        query = self.request.query_params.get(self.search_query_param)
+        if query:
+            queryset = search_books(queryset, query)
+        return queryset
 
     def perform_create(self, serializer):
         try:
@@ -24,15 +166,7 @@ class BookListCreateView(generics.ListCreateAPIView):
             if not self.request.data.get('author'):
                 raise ValidationError({"detail": "Author is required."})
 
-            if Book.objects.filter(
-                title=self.request.data['title'],
-                author=self.request.data['author']
-            ).exists():
-                raise ValidationError({
-                    "detail": "A book with this title and author already exists."
-                })
-
-            serializer.save(publisher=self.request.user)
+            save_unique_book(serializer, publisher=full_user(self.request.user))
 
         except ValidationError as e:
             raise e
@@ -42,25 +176,123 @@ class BookListCreateView(generics.ListCreateAPIView):
             })
 
 
-class BookDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Book.objects.all()
+class TopBooksView(
+    SerializerTimingMixin, ReplicaReadMixin, ConditionalGetMixin, VersionedCacheMixin, SparseFieldsetViewMixin,
+    generics.ListAPIView,
+):
+    """Books ranked by Bayesian rating, or by trending score with ``?ranking=trending``.
+
+    Both rankings are precomputed columns read through their own index, so a
+    page costs the same whatever the size of the catalog.
+    """
+    queryset = Book.objects.select_related('publisher').defer('search_vector')
+    serializer_class = TopBookSerializer
+    pagination_class = TopBookPagination
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'books'
+    ranking_query_param = 'ranking'
+    rankings = {
+        'rating': (('-weighted_rating', 'id'), {'review_count__gt': 0}),
+        'trending': (('-trending_score', 'id'), {'trending_score__gt': 0}),
+    }
+
+    def get_version_scopes(self):
+        return [BOOK_LIST_SCOPE]
+
+    def get_queryset(self):
+        ranking = self.request.query_params.get(self.ranking_query_param, 'rating')
+        if ranking not in self.rankings:
+            raise ValidationError({self.ranking_query_param: [f"Must be one of: {', '.join(self.rankings)}."]})
+        ordering, filters = self.rankings[ranking]
+        return self.narrow_to_fields(super().get_queryset()).filter(**filters).order_by(*ordering)
+
+
+class SimilarBooksView(
+    SerializerTimingMixin, ReplicaReadMixin, ConditionalGetMixin, VersionedCacheMixin, SparseFieldsetViewMixin,
+    generics.ListAPIView,
+):
+    """The books whose readers rated them most like this one, most similar first.
+
+    The neighbours are precomputed by the refresh_similar_books command (see
+    books.similarity); a book it has not processed yet has none.
+    """
+    serializer_class = SimilarBookSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'books'
+    pagination_class = None
+
+    def get_version_scopes(self):
+        # Neighbours are refreshed for many books at once, and embed other books.
+        return [BOOK_LIST_SCOPE]
+
+    def get_queryset(self):
+        book_id = self.kwargs['pk']
+        similarity = BookSimilarity.objects.filter(book_id=book_id).values_list('similar_ids', 'scores').first()
+        if similarity is None:
+            if not Book.objects.filter(pk=book_id).exists():
+                raise Http404
+            return []
+        similar_ids, scores = similarity
+        books = self.narrow_to_fields(
+            Book.objects.select_related('publisher').defer('search_vector')
+        ).in_bulk(similar_ids)
+        similar_books = []
+        for similar_id, score in zip(similar_ids, scores):
+            # Books deleted since the last refresh are skipped.
+            if similar_id in books:
+                books[similar_id].similarity = score
+                similar_books.append(books[similar_id])
+        return similar_books
+
+
+class BookDetailView(
+    SerializerTimingMixin, ReplicaReadMixin, CoverUploadMixin, ConditionalGetMixin, VersionedCacheMixin,
+    SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView,
+):
+    queryset = Book.objects.select_related('publisher').defer('search_vector')
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated, IsBookPublisherOrReadOnly]
+    throttle_scope = 'books'
+
+    def get_version_scopes(self):
+        return [book_scope(self.kwargs['pk'])]
+
+    def get_queryset(self):
+        return self.narrow_to_fields(super().get_queryset())
 
     def perform_update(self, serializer):
-        serializer.save(publisher=self.request.user)
+        save_unique_book(serializer, publisher=full_user(self.request.user))
 
     def perform_destroy(self, instance):
         instance.delete()
 
 
-class ReviewListCreateView(generics.ListCreateAPIView):
+class ReviewListCreateView(
+    SerializerTimingMixin, ReplicaReadMixin, ConditionalGetMixin, IdListMixin, RowListMixin, SparseFieldsetViewMixin,
+    IndexedFilterMixin, generics.ListCreateAPIView,
+):
+    """Reviews of a book, oldest first; ``rating`` combines with every ordering and a date range."""
     serializer_class = ReviewSerializer
+    row_class = ReviewRows
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'reviews'
     pagination_class = ReviewPagination
+    scope_fields = ('book',)
+    filter_params = {
+        'rating': FilterParam('rating', parse=int, expected='an integer'),
+        **CREATED_AT_FILTER_PARAMS,
+    }
+    orderings = {**IndexedFilterMixin.orderings, 'highest_rated': ('-rating', '-created_at', '-id')}
+
+    def get_version_scopes(self):
+        return [book_scope(self.kwargs.get("book_id"))]
 
     def get_queryset(self):
-        return Review.objects.filter(book_id=self.kwargs.get("book_id"))
+        return self.narrow_to_fields(
+            Review.objects.filter(book_id=self.kwargs.get("book_id"))
+            .select_related("user", "book")
+            .only(*REVIEW_LIST_FIELDS)
+        )
 
     def perform_create(self, serializer):
         try:
@@ -68,26 +300,49 @@ class ReviewListCreateView(generics.ListCreateAPIView):
         except Book.DoesNotExist:
             raise ValidationError({"detail": "Book does not exist."})
 
-        if book.publisher == self.request.user:
+        if book.publisher_id == self.request.user.pk:
             raise ValidationError({"detail": "You cannot review your own book."})
-        serializer.save(user=self.request.user, book=book)
+        serializer.save(user=full_user(self.request.user), book=book)
 
 
-class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ReviewDetailView(
+    SerializerTimingMixin, ReplicaReadMixin, ConditionalGetMixin, SparseFieldsetViewMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
+    throttle_scope = 'reviews'
+
+    def get_version_scopes(self):
+        return [book_scope(self.kwargs.get("book_id"))]
 
     def get_queryset(self):
-        return Review.objects.filter(book_id=self.kwargs.get("book_id"))
+        return self.narrow_to_fields(
+            Review.objects.filter(book_id=self.kwargs.get("book_id")).select_related("user", "book")
+        )
 
 
-class CommentListCreateView(generics.ListCreateAPIView):
+class CommentListCreateView(
+    SerializerTimingMixin, ReplicaReadMixin, ConditionalGetMixin, IdListMixin, RowListMixin, SparseFieldsetViewMixin,
+    IndexedFilterMixin, generics.ListCreateAPIView,
+):
     serializer_class = CommentSerializer
+    row_class = CommentRows
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'comments'
     pagination_class = CommentPagination
+    scope_fields = ('book',)
+    filter_params = CREATED_AT_FILTER_PARAMS
+
+    def get_version_scopes(self):
+        return [book_scope(self.kwargs.get("book_id"))]
 
     def get_queryset(self):
-        return Comment.objects.filter(book_id=self.kwargs.get("book_id"))
+        return self.narrow_to_fields(
+            Comment.objects.filter(book_id=self.kwargs.get("book_id"))
+            .select_related("user", "book")
+            .only(*COMMENT_LIST_FIELDS)
+        )
 
     def perform_create(self, serializer):
         try:
@@ -95,14 +350,145 @@ class CommentListCreateView(generics.ListCreateAPIView):
         except Book.DoesNotExist:
             raise ValidationError({"detail": "Book does not exist."})
 
-        if book.publisher == self.request.user:
+        if book.publisher_id == self.request.user.pk:
             raise ValidationError({"detail": "You cannot comment on your own book."})
-        serializer.save(user=self.request.user, book=book)
+        serializer.save(user=full_user(self.request.user), book=book)
 
 
-class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CommentDetailView(
+    SerializerTimingMixin, ReplicaReadMixin, ConditionalGetMixin, SparseFieldsetViewMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
+    throttle_scope = 'comments'
+
+    def get_version_scopes(self):
+        return [book_scope(self.kwargs.get("book_id"))]
 
     def get_queryset(self):
-        return Comment.objects.filter(book_id=self.kwargs.get("book_id"))
+        return self.narrow_to_fields(
+            Comment.objects.filter(book_id=self.kwargs.get("book_id")).select_related("user", "book")
+        )
+
+
+class BulkWriteView(ReplicaReadMixin, APIView):
+    """Create or update many items from a JSON array or an NDJSON stream.
+
+    Items are validated and written in chunks of ``chunk_size``, each chunk
+    in its own transaction, and the response lists one result per item in
+    input order. A stream that fails partway (a malformed NDJSON line, more
+    than ``max_items``) ends with a ``stopped`` result at the failing index,
+    after the results of the items already written.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+    writer_class = None
+    chunk_size = 500
+    max_items = 10000
+
+    def get_items(self, request):
+        items = request.data
+        if isinstance(items, dict) or not hasattr(items, '__iter__'):
+            raise ValidationError({"detail": "Expected a list of items."})
+        if isinstance(items, list) and len(items) > self.max_items:
+            raise ValidationError({"detail": f"At most {self.max_items} items can be sent at once."})
+        return self.limit_items(items)
+
+    def limit_items(self, items):
+        for count, item in enumerate(items, start=1):
+            if count > self.max_items:
+                raise ValidationError({"non_field_errors": [f"At most {self.max_items} items can be sent at once."]})
+            yield item
+
+    def read_items(self, items, failures):
+        """Yield ``items`` until the stream fails, recording the error in ``failures``.
+
+        NDJSON is parsed while the chunks are written, so a malformed line or
+        the item limit can only be found after earlier chunks are committed.
+        """
+        try:
+            yield from items
+        except ParseError as exc:
+            failures.append({"non_field_errors": [exc.detail]})
+        except ValidationError as exc:
+            failures.append(exc.detail)
+
+    def post(self, request, *args, **kwargs):
+        writer = self.writer_class(request.user, context={"request": request, "view": self})
+        failures = []
+        results = writer.write(self.read_items(self.get_items(request), failures), chunk_size=self.chunk_size)
+        if failures:
+            # Items after the failing one were never read.
+            results.append(item_result(len(results), 'stopped', errors=failures[0]))
+        summary = {"created": 0, "updated": 0, "failed": 0}
+        for result in results:
+            if result["status"] in ("created", "updated"):
+                summary[result["status"]] += 1
+            else:
+                summary["failed"] += 1
+        return Response({**summary, "results": results}, status=status.HTTP_200_OK)
+
+
+class BookBulkView(BulkWriteView):
+    writer_class = BookBulkWriter
+    throttle_scope = 'books'
+
+
+class ReviewBulkView(BulkWriteView):
+    writer_class = ReviewBulkWriter
+    throttle_scope = 'reviews'
+
+
+class CommentBulkView(BulkWriteView):
+    writer_class = CommentBulkWriter
+    throttle_scope = 'comments'
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+class ExportView(APIView):
+    """Stream a full dataset (books, reviews or comments) as NDJSON or CSV.
+
+    Query parameters: ``output`` (``ndjson`` or ``csv``), ``compress=gzip``
+    and ``since`` (ISO 8601) to only export rows updated after that moment;
+    deletions are not captured by ``since`` (see books.exporters.iter_rows).
+    """
+    permission_classes = [IsAdminUser]
+    content_negotiation_class = IgnoreClientContentNegotiation
+    content_types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+    def get(self, request, dataset):
+        if dataset not in DATASETS:
+            raise Http404
+        export_format = request.query_params.get("output", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({"output": f"Must be one of: {', '.join(EXPORT_FORMATS)}."})
+        compress = request.query_params.get("compress") == "gzip"
+        since = request.query_params.get("since")
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                # Well formed, but out of range (e.g. month 13).
+                since = None
+            if since is None:
+                raise ValidationError({"since": "Must be an ISO 8601 date and time."})
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, datetime.timezone.utc)
+        else:
+            since = None
+
+        response = StreamingHttpResponse(
+            export(dataset, export_format, compress=compress, since=since),
+            content_type="application/gzip" if compress else self.content_types[export_format],
+        )
+        filename = export_filename(dataset, export_format, compress=compress, since=since)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
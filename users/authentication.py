@@ -0,0 +1,150 @@
+"""Stateless JWT authentication.
+
+Tokens carry the user's id, username and staff status, so API requests are
+authenticated from the token alone, as a ``TokenUser``, without loading the
+user row. Views that need the row call ``full_user()``, which keeps the
+``CACHED_USER_FIELDS`` of users in the cache for ``USER_CACHE_TIMEOUT``
+seconds.
+
+A token is revoked when it was issued before its user's
+``tokens_revoked_at``, which ``User.save()`` sets when the password, the
+active flag or the staff flag changes, or before the ``TokenRevocation``
+written when the user is deleted (see users.signals). Each process keeps
+the revocations that can still match an unexpired token in memory and
+reloads them with one query every ``JWT_REVOCATION_REFRESH_SECONDS``;
+revocations made by the process itself apply as soon as they are
+committed.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .models import TokenRevocation
+
+USER_CACHE_ALIAS = 'default'
+# Never the password hash: the cache is shared with every process.
+CACHED_USER_FIELDS = ('id', 'username', 'email', 'is_staff', 'is_active')
+
+
+def _user_key(user_id):
+    return f'users:fields:{user_id}'
+
+
+class UserClaimsMixin:
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.username
+        token['is_staff'] = user.is_staff
+        return token
+
+
+class UserAccessToken(UserClaimsMixin, AccessToken):
+    pass
+
+
+class UserRefreshToken(UserClaimsMixin, RefreshToken):
+    # Access tokens copy the claims of the refresh token they come from.
+    access_token_class = UserAccessToken
+
+
+def revocation_horizon():
+    """Return the time before which revocations only match expired tokens."""
+    return timezone.now() - max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+
+
+class TokenRevocations:
+    """In-memory copy of the recent ``tokens_revoked_at`` of all users."""
+
+    def __init__(self):
+        self._revoked_at = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, token):
+        # Revocations are keyed by the integer pk; newer simplejwt releases
+        # encode the claim as a string.
+        revoked_at = self.get(int(token[api_settings.USER_ID_CLAIM]))
+        # ``iat`` has a resolution of one second, so tokens issued in the
+        # second of the revocation are kept.
+        return revoked_at is not None and token.get('iat', 0) < revoked_at
+
+    def get(self, user_id):
+        if self.is_stale():
+            with self._lock:
+                if self.is_stale():
+                    self.reload()
+        return self._revoked_at.get(user_id)
+
+    def is_stale(self):
+        return self._loaded_at is None or (
+            time.monotonic() - self._loaded_at >= settings.JWT_REVOCATION_REFRESH_SECONDS
+        )
+
+    def reload(self):
+        # Older revocations only match tokens that have expired anyway.
+        since = revocation_horizon()
+        rows = get_user_model().objects.filter(tokens_revoked_at__gte=since).values_list('pk', 'tokens_revoked_at')
+        deleted = TokenRevocation.objects.filter(revoked_at__gte=since).values_list('user_id', 'revoked_at')
+        self._revoked_at = {pk: int(revoked_at.timestamp()) for pk, revoked_at in rows.union(deleted, all=True)}
+        self._loaded_at = time.monotonic()
+
+    def add(self, user_id, revoked_at):
+        self._revoked_at = {**self._revoked_at, user_id: int(revoked_at.timestamp())}
+
+    def clear(self):
+        self._revoked_at = {}
+        self._loaded_at = None
+
+
+revocations = TokenRevocations()
+
+
+def check_revocation(token):
+    if revocations.is_revoked(token):
+        raise InvalidToken(_('Token has been revoked.'))
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """Authenticate as a ``TokenUser`` built from the token claims, without a query."""
+
+    def get_user(self, validated_token):
+        check_revocation(validated_token)
+        return super().get_user(validated_token)
+
+
+def full_user(user):
+    """Return the ``User`` behind ``user``, built from the cache for token users.
+
+    Only the ``CACHED_USER_FIELDS`` are loaded, other fields are deferred.
+    Meant for reading; load the row from the database to change it.
+    """
+    if not isinstance(user, TokenUser):
+        return user
+    User = get_user_model()
+    cache = caches[USER_CACHE_ALIAS]
+    values = cache.get(_user_key(user.pk))
+    if values is None:
+        try:
+            values = User.objects.values(*CACHED_USER_FIELDS).get(pk=user.pk)
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        cache.set(_user_key(user.pk), values, settings.USER_CACHE_TIMEOUT)
+    # from_db() takes the values in the order of the model fields.
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(None, names, [values[name] for name in names])
+
+
+def forget_user(user_id):
+    caches[USER_CACHE_ALIAS].delete(_user_key(user_id))
@@ -1,11 +1,48 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+
+# Changing any of these ends the user's sessions: the credentials are no
+# longer valid, or the claims in their tokens are stale.
+TOKEN_REVOKING_FIELDS = ('password', 'is_active', 'is_staff')
+
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
+    # Tokens issued before this time are rejected (see users.authentication).
+    tokens_revoked_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_username = instance.__dict__.get('username')
+        instance._loaded_credentials = {
+            name: getattr(instance, name) for name in TOKEN_REVOKING_FIELDS if name in field_names
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_credentials', {})
+        if any(getattr(self, name) != value for name, value in loaded.items()):
+            self.tokens_revoked_at = timezone.now()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'tokens_revoked_at'}
+        super().save(*args, **kwargs)
+        self._loaded_credentials = {name: getattr(self, name) for name in loaded}
+
     def __str__(self):
         return self.username
+
+
+class TokenRevocation(models.Model):
+    """Revocation of the tokens of a deleted user, whose row no longer holds it."""
+    # Not a foreign key: the user is gone.
+    user_id = models.BigIntegerField()
+    revoked_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.user_id} at {self.revoked_at}'
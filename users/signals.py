@@ -0,0 +1,45 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import forget_user, revocation_horizon, revocations
+from .models import TokenRevocation, User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def apply_token_revocation(sender, instance, created, update_fields=None, **kwargs):
+    if created or instance.tokens_revoked_at is None:
+        return
+    if update_fields is not None and 'tokens_revoked_at' not in update_fields:
+        return
+    transaction.on_commit(partial(revocations.add, instance.pk, instance.tokens_revoked_at))
+
+
+@receiver(post_save, sender=User)
+def revoke_inactive_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+    # User.save() only notices deactivations of users loaded from the
+    # database; revoke the tokens of users saved inactive otherwise.
+    if created or instance.is_active or 'is_active' in getattr(instance, '_loaded_credentials', {}):
+        return
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    instance.tokens_revoked_at = timezone.now()
+    User.objects.filter(pk=instance.pk).update(tokens_revoked_at=instance.tokens_revoked_at)
+    transaction.on_commit(partial(revocations.add, instance.pk, instance.tokens_revoked_at))
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revoked_at = timezone.now()
+    TokenRevocation.objects.filter(revoked_at__lt=revocation_horizon()).delete()
+    TokenRevocation.objects.create(user_id=instance.pk, revoked_at=revoked_at)
+    transaction.on_commit(partial(revocations.add, instance.pk, revoked_at))
@@ -1,3 +1,131 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .authentication import USER_CACHE_ALIAS, _user_key, revocations
+from .models import TokenRevocation
+
+User = get_user_model()
+PASSWORD = 'testpass123'
+
+
+class StatelessJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        revocations.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='reader', password=PASSWORD, email='reader@example.com')
+
+    def obtain_tokens(self, user):
+        response = self.client.post(
+            reverse('users:token_obtain_pair'), {'email': user.email, 'password': PASSWORD}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def get(self, url, access):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_tokens_carry_user_claims(self):
+        access = AccessToken(self.obtain_tokens(self.user)['access'])
+        self.assertEqual(str(access['user_id']), str(self.user.pk))
+        self.assertEqual(access['username'], 'reader')
+        self.assertIs(access['is_staff'], False)
+
+    def test_requests_do_not_load_the_user(self):
+        access = self.obtain_tokens(self.user)['access']
+        revocations.reload()
+        url = reverse('users:user_detail')
+        with self.assertNumQueries(1):
+            first = self.get(url, access)
+        # The user is cached now.
+        with self.assertNumQueries(0):
+            second = self.get(url, access)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second.data['email'], 'reader@example.com')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(reverse('book-list'), access).status_code, status.HTTP_200_OK)
+        self.assertFalse([q['sql'] for q in queries if 'FROM "users_user" WHERE' in q['sql']])
+
+    def test_staff_claim_grants_admin_endpoints(self):
+        self.user.is_staff = True
+        self.user.save()
+        access = self.obtain_tokens(self.user)['access']
+        self.assertEqual(
+            self.get(reverse('export', args=['books']), access).status_code, status.HTTP_200_OK
+        )
+
+    def test_credential_changes_revoke_earlier_tokens(self):
+        tokens = self.obtain_tokens(self.user)
+        url = reverse('users:user_detail')
+        self.assertEqual(self.get(url, tokens['access']).status_code, status.HTTP_200_OK)
+
+        user = User.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.set_password('another-pass-456')
+            user.save()
+        self.assertIsNotNone(user.tokens_revoked_at)
+        # Simulate the token having been issued in an earlier second.
+        revocations.add(user.pk, user.tokens_revoked_at.replace(year=user.tokens_revoked_at.year + 1))
+
+        self.assertEqual(self.get(url, tokens['access']).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('users:token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revocations_are_reloaded_in_one_query(self):
+        access = self.obtain_tokens(self.user)['access']
+        User.objects.filter(pk=self.user.pk).update(
+            tokens_revoked_at=self.user.date_joined.replace(year=self.user.date_joined.year + 1)
+        )
+        # Another process revoked the tokens; this one notices on its next reload.
+        revocations.reload()
+        with self.assertNumQueries(0):
+            response = self.get(reverse('users:user_detail'), access)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_username_change_keeps_tokens(self):
+        access = self.obtain_tokens(self.user)['access']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('users:user_detail'), {'username': 'renamed'}, HTTP_AUTHORIZATION=f'Bearer {access}'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.tokens_revoked_at)
+        self.assertEqual(self.get(reverse('users:user_detail'), access).data['username'], 'renamed')
+
+    def test_cache_holds_no_credentials(self):
+        access = self.obtain_tokens(self.user)['access']
+        self.get(reverse('users:user_detail'), access)
+        cached = caches[USER_CACHE_ALIAS].get(_user_key(self.user.pk))
+        self.assertEqual(
+            cached,
+            {'id': self.user.pk, 'username': 'reader', 'email': 'reader@example.com', 'is_staff': False, 'is_active': True},
+        )
+
+    def test_deleting_a_user_revokes_their_tokens(self):
+        access = self.obtain_tokens(self.user)['access']
+        user_id = self.user.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        revocation = TokenRevocation.objects.get(user_id=user_id)
+        # Simulate the token having been issued in an earlier second.
+        TokenRevocation.objects.filter(pk=revocation.pk).update(
+            revoked_at=revocation.revoked_at.replace(year=revocation.revoked_at.year + 1)
+        )
+        # Other processes see the revocation on their next reload.
+        revocations.reload()
+        self.assertEqual(self.get(reverse('book-list'), access).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saving_an_unloaded_user_inactive_revokes_their_tokens(self):
+        user = User(pk=self.user.pk, username='reader', email='reader@example.com', is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['is_active'])
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.tokens_revoked_at)
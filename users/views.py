@@ -1,16 +1,22 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, SAFE_METHODS
+from django.contrib.auth import get_user_model
+from book_reviews.middleware import SerializerTimingMixin
+from .authentication import full_user
 from .serializers import UserRegistrationSerializer, UserSerializer
 
 
-class RegisterView(generics.CreateAPIView):
+class RegisterView(SerializerTimingMixin, generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
     permission_classes = (AllowAny,)
 
 
-class UserDetailView(generics.RetrieveUpdateAPIView):
+class UserDetailView(SerializerTimingMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
 
     def get_object(self):
-        return self.request.user
+        if self.request.method in SAFE_METHODS:
+            return full_user(self.request.user)
+        # Never save a cached copy over the row.
+        return get_user_model().objects.get(pk=self.request.user.pk)